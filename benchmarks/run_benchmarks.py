@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from discrete_time_extrusion.Translocator import Translocator
+from discrete_time_extrusion.extruders import EngineFactory
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+# Allowed relative slowdown of a timing - repeated runs of the same code came out up to 21% apart in both the minimum
+# and the median of their repeats, so the floor sits above that, and timings whose repeats spread further get more room
+MIN_TOLERANCE = 0.25
+NOISE_FACTOR = 3
+
+EXTRUDERS = {'BaseExtruder': (BaseExtruder, 'extrusion_dict.json'),
+             'MultistateExtruder': (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json'),
+             'FusedExtruder': (FusedExtruder, 'extrusion_dict.json')}
+
+
+def make_translocator(extruder, monomers_per_replica, LEF_separation, number_of_replica, mode, backend, seed):
+
+    extrusion_engine, filename = EXTRUDERS[extruder]
+
+    with open(os.path.join(DATA_PATH, filename)) as param_file:
+        params = json.load(param_file)
+
+    params.update(monomers_per_replica=monomers_per_replica,
+                  LEF_separation=LEF_separation,
+                  number_of_replica=number_of_replica,
+                  mode=mode)
+
+    sites_per_replica = params['monomers_per_replica'] * params['sites_per_monomer']
+
+    # One barrier pair every 100 monomers, with all sites of a single type
+    site_types = np.zeros(sites_per_replica, dtype=int)
+    ctcf_positions = np.arange(0, sites_per_replica, 100 * params['sites_per_monomer'])
+
+    return Translocator(extrusion_engine, DynamicBoundary, ['A'], site_types, ctcf_positions, ctcf_positions,
+                        seed=seed, backend=backend, **params)
+
+
+def summarize(samples):
+
+    return {'min': float(np.min(samples)), 'median': float(np.median(samples)), 'samples': [float(x) for x in samples]}
+
+
+def set_threads(backend, threads):
+
+    # Thread counts only apply to the parallel numba backend, and are left to numba's default otherwise
+    if (threads is None) or (backend != 'numba_parallel'):
+        return None
+
+    import numba
+    numba.set_num_threads(threads)
+
+    return threads
+
+
+def run_case(extruder, monomers_per_replica, LEF_separation, number_of_replica, mode, backend, steps, seed, repeats=5,
+             threads=None):
+
+    threads = set_threads(backend, threads)
+    args = (extruder, monomers_per_replica, LEF_separation, number_of_replica, mode, backend, seed)
+
+    construction, trajectory, run = [], [], []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        translocator = make_translocator(*args)
+
+        construction.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        translocator.run_trajectory(steps=steps, period=1, dummy_steps=0)
+
+        trajectory.append(time.perf_counter() - start)
+
+    translocator = make_translocator(*args)
+
+    # Repeats run on from one another, so that later blocks are not biased by the start from a fresh lattice
+    for _ in range(repeats):
+        start = time.perf_counter()
+        translocator.run(steps)
+
+        run.append(time.perf_counter() - start)
+
+    # Phases are profiled over further blocks of steps, so that the instrumentation does not weigh on the timings above
+    profiler = translocator.enable_profiling()
+
+    for _ in range(repeats):
+        translocator.run(steps)
+
+    report = profiler.report()
+
+    phases = report['phases']
+
+    for phase, record in phases.items():
+        calls_per_block = record['calls'] / repeats
+        us_per_call = summarize(1e6 * report['blocks'][phase] / calls_per_block)
+
+        record['us_per_call'] = us_per_call['min']
+        record['us_per_call_median'] = us_per_call['median']
+
+    us_per_step = summarize(1e6 * np.asarray(run) / steps)
+
+    return {'extruder': extruder,
+            'backend': backend,
+            'mode': mode,
+            'monomers_per_replica': monomers_per_replica,
+            'LEF_separation': LEF_separation,
+            'number_of_replica': number_of_replica,
+            'threads': threads,
+            'lattice_size': int(translocator.extrusion_engine.lattice_size),
+            'number_of_LEFs': int(translocator.extrusion_engine.number),
+            'steps': steps,
+            'repeats': repeats,
+            'construction_seconds': summarize(construction)['min'],
+            'run_trajectory_seconds': summarize(trajectory)['min'],
+            'run_seconds': summarize(run)['min'],
+            'us_per_step': us_per_step['min'],
+            'us_per_step_median': us_per_step['median'],
+            'us_per_step_samples': us_per_step['samples'],
+            'phases': phases,
+            'events': report['events']}
+
+
+def case_key(result):
+
+    return tuple(result.get(key) for key in ['extruder', 'backend', 'mode',
+                                             'monomers_per_replica', 'LEF_separation', 'number_of_replica', 'threads'])
+
+
+def get_scaling(results):
+
+    single = {case_key(dict(result, threads=1)): result for result in results if result.get('threads') == 1}
+    scaling = []
+
+    # Speedups over the same case on a single thread, and the share of it each thread brings
+    for result in results:
+        reference = single.get(case_key(dict(result, threads=1)))
+
+        if (reference is None) or (result.get('threads') is None):
+            continue
+
+        speedup = reference['us_per_step'] / result['us_per_step']
+        scaling.append({'case': case_key(result), 'threads': result['threads'],
+                        'speedup': speedup, 'efficiency': speedup / result['threads']})
+
+    return scaling
+
+
+def get_tolerance(current, old, tolerance=None):
+
+    if tolerance is not None:
+        return tolerance
+
+    # Timings are only as good as their repeats agree, so the allowed slowdown widens with the spread of either run
+    noise = max(current[1] / current[0] - 1, old[1] / old[0] - 1)
+
+    return max(MIN_TOLERANCE, NOISE_FACTOR * noise)
+
+
+def compare(results, baseline, tolerance=None):
+
+    reference = {case_key(result): result for result in baseline['results']}
+    regressions = []
+
+    for result in results:
+        previous = reference.get(case_key(result))
+
+        if previous is None:
+            continue
+
+        # Minimum and median of the repeats, which baselines from single runs only have one value for
+        timing = lambda record, key: (record[key], record.get(key + '_median', record[key]))
+
+        timings = [('us_per_step', timing(result, 'us_per_step'), timing(previous, 'us_per_step'))]
+
+        for phase, record in result['phases'].items():
+            if phase in previous['phases']:
+                timings.append((phase, timing(record, 'us_per_call'), timing(previous['phases'][phase], 'us_per_call')))
+
+        for name, current, old in timings:
+            if min(old) <= 0:
+                continue
+
+            allowed = get_tolerance(current, old, tolerance)
+
+            # A slower minimum alone can be a single lucky baseline repeat, so the median has to agree
+            if all(current[i] > (1 + allowed) * old[i] for i in range(2)):
+                regressions.append({'case': case_key(result), 'timing': name, 'tolerance': allowed,
+                                    'baseline': old[0], 'current': current[0],
+                                    'baseline_median': old[1], 'current_median': current[1]})
+
+    return regressions
+
+
+def get_metadata():
+
+    metadata = {'python': platform.python_version(),
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpu_count': os.cpu_count(),
+                'numpy': np.__version__,
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    try:
+        import numba
+        metadata['numba'] = numba.__version__
+
+    except ImportError:
+        metadata['numba'] = None
+
+    try:
+        metadata['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                                     cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        metadata['commit'] = None
+
+    return metadata
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Time translocator construction, trajectories and engine phases")
+
+    parser.add_argument('--output', default='benchmarks.json')
+    parser.add_argument('--baseline', default=None, help="Previous output to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help="Allowed relative slowdown, by default set from the spread between repeats")
+
+    parser.add_argument('--extruders', nargs='+', default=list(EXTRUDERS), choices=list(EXTRUDERS))
+    parser.add_argument('--backends', nargs='+', default=['python', 'numba'])
+    parser.add_argument('--modes', nargs='+', default=['symmetric', 'asymmetric'])
+
+    parser.add_argument('--monomers', nargs='+', type=int, default=[1000, 10000])
+    parser.add_argument('--separations', nargs='+', type=int, default=[30, 100])
+    parser.add_argument('--replicas', nargs='+', type=int, default=[1, 10])
+
+    parser.add_argument('--threads', nargs='+', type=int, default=[None],
+                        help="Thread counts for the numba_parallel backend, compared against a single thread")
+
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=5, help="Timed blocks per case, reported by minimum and median")
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    output = {'metadata': get_metadata(), 'warmup': [], 'results': []}
+
+    for backend, mode in itertools.product(args.backends, args.modes):
+        # Compilation is timed on its own, so that it does not leak into the first case
+        start = time.perf_counter()
+        EngineFactory.warmup(backend, mode)
+
+        output['warmup'].append({'backend': backend, 'mode': mode, 'seconds': time.perf_counter() - start})
+
+    cases = itertools.product(args.extruders, args.monomers, args.separations, args.replicas, args.modes, args.backends)
+
+    for extruder, monomers, separation, replicas, mode, backend in cases:
+        for threads in (args.threads if backend == 'numba_parallel' else [None]):
+            result = run_case(extruder, monomers, separation, replicas, mode, backend, args.steps, args.seed,
+                              args.repeats, threads)
+            output['results'].append(result)
+
+            print("%-18s %-14s %-10s L=%-8d LEFs=%-6d threads=%-4s %10.1f us/step (median %.1f)" % (
+                  extruder, backend, mode, result['lattice_size'], result['number_of_LEFs'], result['threads'] or '-',
+                  result['us_per_step'], result['us_per_step_median']))
+
+    output['scaling'] = get_scaling(output['results'])
+
+    for record in output['scaling']:
+        print("Scaling of %s on %d threads: %.2fx, %.0f%% per thread" % (record['case'][:6], record['threads'],
+                                                                        record['speedup'], 100 * record['efficiency']))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            output['regressions'] = compare(output['results'], json.load(baseline_file), args.tolerance)
+
+        for regression in output['regressions']:
+            print("Regression in %s (%s): %.1f us -> %.1f us, above %d%%" % (regression['case'], regression['timing'],
+                                                                            regression['baseline'], regression['current'],
+                                                                            100 * regression['tolerance']))
+
+    with open(args.output, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+
+    return 1 if output.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
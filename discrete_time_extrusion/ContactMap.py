@@ -0,0 +1,123 @@
+import numpy as np
+import scipy.sparse
+
+
+class ContactMap():
+
+    def __init__(self,
+                 sites_per_replica,
+                 bin_size=1,
+                 sparse=False,
+                 buffer_size=1000000,
+                 xp=np):
+
+        self.xp = xp
+        self.sparse = sparse
+
+        self.bin_size = int(bin_size)
+        self.sites_per_replica = sites_per_replica
+
+        self.number_of_bins = (sites_per_replica + self.bin_size - 1) // self.bin_size
+        self.buffer_size = buffer_size
+
+        self.reset()
+
+
+    def reset(self):
+
+        self.samples = 0
+
+        if self.sparse:
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.counts = np.zeros(0, dtype=np.int64)
+
+            self.buffer = []
+            self.buffered = 0
+
+        else:
+            self.counts = self.xp.zeros(self.number_of_bins**2, dtype=self.xp.int64)
+
+
+    def update(self, translocator):
+
+        positions = translocator.extrusion_engine.positions
+        bound_positions = positions[self.xp.greater_equal(positions, 0).all(axis=1)]
+
+        ll = self.xp.mod(bound_positions, self.sites_per_replica)
+        ll = ll[ll[:, 1] > ll[:, 0]] // self.bin_size
+
+        keys = ll[:, 0].astype(self.xp.int64) * self.number_of_bins + ll[:, 1]
+
+        if self.sparse:
+            keys = keys.get() if self.xp.__name__ == 'cupy' else keys
+
+            self.buffer.append(keys)
+            self.buffered += len(keys)
+
+            if self.buffered > self.buffer_size:
+                self.flush()
+
+        else:
+            self.xp.add.at(self.counts, keys, 1)
+
+        self.samples += 1
+
+
+    def flush(self):
+
+        if self.sparse and self.buffered > 0:
+            keys, counts = np.unique(np.concatenate(self.buffer), return_counts=True)
+
+            all_keys = np.concatenate([self.keys, keys])
+            all_counts = np.concatenate([self.counts, counts])
+
+            self.keys, ids = np.unique(all_keys, return_inverse=True)
+            self.counts = np.bincount(ids, weights=all_counts).astype(np.int64)
+
+            self.buffer = []
+            self.buffered = 0
+
+
+    def get_map(self):
+
+        shape = (self.number_of_bins, self.number_of_bins)
+
+        if self.sparse:
+            self.flush()
+
+            lmap = scipy.sparse.coo_matrix((self.counts, np.divmod(self.keys, self.number_of_bins)), shape=shape)
+            lmap = lmap.tocsr()
+
+        else:
+            counts = self.counts.get() if self.xp.__name__ == 'cupy' else self.counts
+            lmap = counts.reshape(shape)
+
+        # Both maps equal h + h.T, with h the 2D histogram of the folded leg pairs over bin edges spanning the whole
+        # replica - pairs within a single bin fall on the diagonal, which is therefore counted twice
+        return lmap + lmap.T
+
+
+    def get_checkpoint(self):
+
+        self.flush()
+
+        counts = self.counts.get() if self.xp.__name__ == 'cupy' else self.counts
+        checkpoint = {'counts': counts, 'samples': self.samples}
+
+        if self.sparse:
+            checkpoint['keys'] = self.keys
+
+        return checkpoint
+
+
+    def set_checkpoint(self, checkpoint):
+
+        self.reset()
+        self.samples = int(checkpoint['samples'])
+
+        if self.sparse:
+            self.keys = np.asarray(checkpoint['keys'])
+            self.counts = np.asarray(checkpoint['counts'])
+
+        else:
+            self.counts[...] = self.xp.asarray(checkpoint['counts'])
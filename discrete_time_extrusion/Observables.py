@@ -0,0 +1,243 @@
+import numpy as np
+
+
+class Observable():
+
+    def __init__(self, xp=np, capacity=1024, per_group=False):
+
+        self.xp = xp
+        self.capacity = int(capacity)
+        self.per_group = per_group
+
+        self.reset()
+
+
+    def reset(self):
+
+        self.samples = 0
+        self.values = None
+
+
+    def evaluate(self, translocator):
+
+        raise NotImplementedError
+
+
+    def get_groups(self, translocator, sites=None):
+
+        extruder = translocator.extrusion_engine
+        
+        # All values are pooled into a single group, unless they are asked for per replica group
+        if not self.per_group:
+            number = len(extruder.states) if sites is None else len(sites)
+            return self.xp.zeros(number, dtype=self.xp.int64), 1
+
+        number_of_groups = len(extruder.group_bounds) - 1
+
+        if sites is None:
+            return extruder.LEF_groups.astype(self.xp.int64), number_of_groups
+
+        return self.xp.searchsorted(extruder.group_bounds, sites, side='right') - 1, number_of_groups
+
+
+    def squeeze(self, value):
+
+        return value if self.per_group else value[0]
+
+
+    def update(self, translocator):
+
+        value = self.xp.asarray(self.evaluate(translocator))
+
+        # Samples are written into a device buffer that doubles when full, so that nothing is copied back per sample
+        if self.values is None:
+            self.values = self.xp.zeros((self.capacity,) + value.shape, dtype=value.dtype)
+
+        elif self.samples == len(self.values):
+            self.values = self.xp.concatenate([self.values, self.xp.zeros_like(self.values)])
+
+        self.values[self.samples] = value
+        self.samples += 1
+
+
+    def get_values(self):
+
+        if self.values is None:
+            return np.zeros(0)
+
+        values = self.values[:self.samples]
+
+        return values.get() if self.xp.__name__ == 'cupy' else values.copy()
+
+
+    def get_checkpoint(self):
+
+        return {'values': self.get_values(), 'samples': self.samples}
+
+
+    def set_checkpoint(self, checkpoint):
+
+        self.reset()
+        self.samples = int(checkpoint['samples'])
+
+        if self.samples > 0:
+            values = self.xp.asarray(checkpoint['values'])
+
+            self.values = self.xp.zeros((max(self.samples, self.capacity),) + values.shape[1:], dtype=values.dtype)
+            self.values[:self.samples] = values
+
+
+class BoundFraction(Observable):
+
+    def evaluate(self, translocator):
+
+        extruder = translocator.extrusion_engine
+        state_dict = getattr(extruder, 'state_dict', {'bound': 1})
+
+        # Fraction of LEFs in each state, with the unbound state at index 0
+        number_of_states = max(state_dict.values()) + 1
+        groups, number_of_groups = self.get_groups(translocator)
+
+        counts = self.xp.bincount(groups*number_of_states + extruder.states, minlength=number_of_groups*number_of_states)
+        counts = counts.reshape(number_of_groups, number_of_states)
+
+        return self.squeeze(counts / self.xp.maximum(counts.sum(axis=1, keepdims=True), 1))
+
+
+class StalledFraction(Observable):
+
+    def evaluate(self, translocator):
+
+        extruder = translocator.extrusion_engine
+        is_bound = self.xp.greater_equal(extruder.positions, 0).all(axis=1)
+
+        # Fraction of bound left and right legs currently stalled
+        stalled = extruder.stalled.astype(bool) & is_bound[:, None]
+        groups, number_of_groups = self.get_groups(translocator)
+
+        counts = self.xp.stack([self.xp.bincount(groups, weights=stalled[:, k], minlength=number_of_groups) for k in range(2)],
+                               axis=1)
+        bound = self.xp.bincount(groups, weights=is_bound, minlength=number_of_groups)
+
+        return self.squeeze(counts / self.xp.maximum(bound, 1)[:, None])
+
+
+class CTCFOccupancy(Observable):
+
+    def evaluate(self, translocator):
+
+        barrier = translocator.barrier_engine
+
+        if not self.per_group:
+            bound = self.xp.count_nonzero(barrier.stall_left) + self.xp.count_nonzero(barrier.stall_right)
+
+            return bound / max(barrier.number, 1)
+
+        # Sites able to hold a CTCF, which dynamic barriers keep track of and static barriers always occupy
+        if hasattr(barrier, 'sites_left'):
+            sites = self.xp.concatenate([barrier.sites_left, barrier.sites_right])
+
+        else:
+            sites = self.xp.concatenate([self.xp.flatnonzero(barrier.stall_left), self.xp.flatnonzero(barrier.stall_right)])
+
+        groups, number_of_groups = self.get_groups(translocator, sites)
+
+        bound_sites = barrier.get_bound_positions(as_array=True)
+        bound_groups, _ = self.get_groups(translocator, self.xp.asarray(bound_sites, dtype=self.xp.int64))
+
+        bound = self.xp.bincount(bound_groups, minlength=number_of_groups)
+
+        return bound / self.xp.maximum(self.xp.bincount(groups, minlength=number_of_groups), 1)
+
+
+class LoopCoverage(Observable):
+
+    def evaluate(self, translocator):
+
+        sites_per_replica = translocator.params['monomers_per_replica'] * translocator.params['sites_per_monomer']
+        lattice_size = sites_per_replica * translocator.params['number_of_replica']
+
+        positions = translocator.extrusion_engine.positions
+        bound_positions = positions[self.xp.greater_equal(positions, 0).all(axis=1)]
+
+        # Sites between the legs of at least one LEF, counted from the running sum of loop starts and ends
+        edges = self.xp.zeros(lattice_size+1, dtype=self.xp.int32)
+
+        self.xp.add.at(edges, bound_positions[:, 0], 1)
+        self.xp.add.at(edges, bound_positions[:, 1] + 1, -1)
+
+        is_covered = self.xp.greater(self.xp.cumsum(edges[:lattice_size]), 0)
+
+        return is_covered.reshape(-1, sites_per_replica).mean(axis=1)
+
+
+class LoopSizeHistogram(Observable):
+
+    def __init__(self, bin_size=1, max_size=None, xp=np, per_group=False):
+
+        self.bin_size = int(bin_size)
+        self.max_size = max_size
+
+        super().__init__(xp=xp, per_group=per_group)
+
+
+    def reset(self):
+
+        self.samples = 0
+        self.counts = None
+
+
+    def update(self, translocator):
+
+        if self.max_size is None:
+            self.max_size = translocator.params['monomers_per_replica'] * translocator.params['sites_per_monomer']
+
+        number_of_bins = int(self.max_size) // self.bin_size + 1
+
+        positions = translocator.extrusion_engine.positions
+        is_bound = self.xp.greater_equal(positions, 0).all(axis=1)
+
+        groups, number_of_groups = self.get_groups(translocator)
+
+        if self.counts is None:
+            self.counts = self.xp.zeros((number_of_groups, number_of_bins), dtype=self.xp.int64)
+
+        bound_positions = positions[is_bound]
+
+        # Loops larger than max_size are gathered in the last bin
+        bins = self.xp.minimum((bound_positions[:, 1] - bound_positions[:, 0]) // self.bin_size, number_of_bins-1)
+        bins = groups[is_bound]*number_of_bins + bins
+
+        self.counts += self.xp.bincount(bins, minlength=number_of_groups*number_of_bins).reshape(number_of_groups, number_of_bins)
+        self.samples += 1
+
+
+    def get_values(self):
+
+        if self.counts is None:
+            return np.zeros(0, dtype=np.int64)
+
+        counts = self.squeeze(self.counts)
+
+        return counts.get() if self.xp.__name__ == 'cupy' else counts.copy()
+
+
+    def get_bin_edges(self):
+
+        return np.arange(self.get_values().shape[-1] + 1) * self.bin_size
+
+
+    def get_checkpoint(self):
+
+        return {'counts': self.get_values(), 'samples': self.samples, 'max_size': self.max_size or 0}
+
+
+    def set_checkpoint(self, checkpoint):
+
+        self.reset()
+
+        self.samples = int(checkpoint['samples'])
+        self.max_size = int(checkpoint['max_size']) or self.max_size
+
+        if len(checkpoint['counts']) > 0:
+            self.counts = self.xp.asarray(checkpoint['counts'], dtype=self.xp.int64).reshape(-1, checkpoint['counts'].shape[-1])
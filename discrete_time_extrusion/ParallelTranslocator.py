@@ -0,0 +1,337 @@
+import os
+import traceback
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .Translocator import Translocator
+from .ensemble import get_context
+from .boundaries.NullBoundary import NullBoundary
+from .extruders.NullExtruder import NullExtruder
+
+
+def share_engine_arrays(engine, keys, blocks):
+
+    layout = {}
+
+    for key in keys:
+        array = engine.get_array(getattr(engine, key))
+
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+
+        shared_array[...] = array
+        setattr(engine, key, shared_array)
+
+        blocks.append(block)
+        layout[key] = (block.name, array.shape, array.dtype.str)
+
+    return layout
+
+
+def attach_engine_arrays(layout, blocks):
+
+    arrays = {}
+
+    for key, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    return arrays
+
+
+def run_worker(connection, args, kwargs):
+
+    blocks = []
+
+    try:
+        translocator = Translocator(*args, **kwargs)
+
+        if translocator.extrusion_engine.xp.__name__ != 'numpy':
+            raise RuntimeError("Replica decomposition is only supported on the CPU")
+
+        extruder = translocator.extrusion_engine
+        barrier = translocator.barrier_engine
+
+        # Dynamic arrays are moved to shared memory in place, so that the parent process can read them directly
+        extruder_layout = share_engine_arrays(extruder, extruder.checkpoint_keys, blocks)
+        barrier_keys = ('stall_left', 'stall_right') + tuple(key for key in getattr(barrier, 'state_keys', ())
+                                                             if key not in ('stall_left', 'stall_right'))
+        barrier_layout = share_engine_arrays(barrier, barrier_keys, blocks)
+
+        connection.send(('ready', (extruder_layout, barrier_layout, extruder.number, barrier.number)))
+
+        while True:
+            command, argument = connection.recv()
+
+            if command == 'close':
+                break
+
+            connection.send(('done', getattr(translocator, command)(argument)))
+
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+
+    finally:
+        # Blocks are unlinked by the parent, which shares this process's resource tracker
+        for block in blocks:
+            block.close()
+
+        connection.close()
+
+
+class ExtruderView(NullExtruder):
+
+    def __init__(self, block_arrays, block_offsets, barrier_engine):
+
+        self.xp = np
+        self.barrier_engine = barrier_engine
+
+        self.get_list = barrier_engine.get_list
+        self.get_array = barrier_engine.get_array
+
+        self.block_arrays = block_arrays
+        self.block_offsets = block_offsets
+
+        # Concatenated arrays are kept until the workers next change their state, so repeated reads are free
+        self.cache = {}
+
+        self.number = sum(len(arrays['states']) for arrays in block_arrays)
+        self.lattice_size = barrier_engine.lattice_size
+
+        # Replica groups are not supported across processes, so all blocks together form a single group
+        self.group_bounds = np.asarray([0, self.lattice_size], dtype=np.int64)
+        self.LEF_groups = np.zeros(self.number, dtype=np.int32)
+
+
+    def __getattr__(self, name):
+
+        if name in ['block_arrays', 'block_offsets', 'cache'] or name not in self.block_arrays[0]:
+            raise AttributeError(name)
+
+        if name not in self.cache:
+            if name == 'positions':
+                # Block-local positions are shifted to global lattice coordinates, keeping unbound legs at -1
+                self.cache[name] = np.concatenate([np.where(arrays['positions'] >= 0, arrays['positions'] + offset, -1)
+                                                   for arrays, offset in zip(self.block_arrays, self.block_offsets)])
+
+            else:
+                self.cache[name] = np.concatenate([arrays[name] for arrays in self.block_arrays])
+
+        return self.cache[name]
+
+
+class BarrierView(NullBoundary):
+
+    def __init__(self, block_arrays, number):
+
+        self.xp = np
+
+        self.get_list = lambda x: x.tolist()
+        self.get_array = lambda x: x
+
+        self.block_arrays = block_arrays
+        self.cache = {}
+
+        self.number = number
+        self.lattice_size = sum(len(arrays['stall_left']) for arrays in block_arrays)
+
+
+    def __getattr__(self, name):
+
+        if name in ['block_arrays', 'cache'] or name not in self.block_arrays[0]:
+            raise AttributeError(name)
+
+        if name not in self.cache:
+            self.cache[name] = np.concatenate([arrays[name] for arrays in self.block_arrays])
+
+        return self.cache[name]
+
+
+class ParallelTranslocator(Translocator):
+
+    def __init__(self,
+                 extrusion_engine,
+                 barrier_engine,
+                 type_list,
+                 site_types,
+                 ctcf_left_positions,
+                 ctcf_right_positions,
+                 chromosome_bounds=[0,-1],
+                 processes=None,
+                 seed=None,
+                 backend=None,
+                 start_method=None,
+                 **kwargs):
+
+        if kwargs.get('replica_groups') is not None:
+            raise RuntimeError("Replica groups are only supported on single-process translocators")
+
+        processes = min(processes or os.cpu_count(), kwargs['number_of_replica'])
+
+        sites_per_replica = kwargs['monomers_per_replica'] * kwargs['sites_per_monomer']
+        replica_blocks = np.array_split(np.arange(kwargs['number_of_replica']), processes)
+
+        context = get_context(start_method)
+        seeds = np.random.SeedSequence(seed).spawn(processes)
+
+        self.connections = []
+        self.workers = []
+
+        self.blocks = []
+
+        # Forked workers must inherit the parent's resource tracker, or their shared blocks are removed on exit
+        resource_tracker.ensure_running()
+
+        for replicas, block_seed in zip(replica_blocks, seeds):
+            args = (extrusion_engine, barrier_engine, type_list, site_types, ctcf_left_positions, ctcf_right_positions)
+            block_kwargs = dict(kwargs, number_of_replica=len(replicas), chromosome_bounds=chromosome_bounds,
+                                seed=block_seed, backend=backend)
+
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=run_worker, args=(worker_connection, args, block_kwargs), daemon=True)
+
+            worker.start()
+
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+        replies = self.receive()
+
+        extruder_arrays = [attach_engine_arrays(reply[0], self.blocks) for reply in replies]
+        barrier_arrays = [attach_engine_arrays(reply[1], self.blocks) for reply in replies]
+
+        # Each block is its own lattice, so its ends act as walls that LEFs cannot step across
+        block_offsets = [replicas[0] * sites_per_replica for replicas in replica_blocks]
+
+        self.barrier_engine = BarrierView(barrier_arrays, sum(reply[3] for reply in replies))
+        self.extrusion_engine = ExtruderView(extruder_arrays, block_offsets, self.barrier_engine)
+
+        self.set_params(**kwargs)
+
+
+    def receive(self):
+
+        replies = []
+
+        for connection in self.connections:
+            status, reply = connection.recv()
+
+            if status == 'error':
+                self.close()
+                raise RuntimeError("Replica worker failed:\n%s" % reply)
+
+            replies.append(reply)
+
+        return replies
+
+
+    def broadcast(self, command, argument=None):
+
+        for connection in self.connections:
+            connection.send((command, argument))
+
+        return self.receive()
+
+
+    def clear_views(self):
+
+        self.extrusion_engine.cache.clear()
+        self.barrier_engine.cache.clear()
+
+
+    def run(self, N, **kwargs):
+
+        if N > 0:
+            self.broadcast('run', N)
+            self.clear_views()
+
+        self.step_count += N
+
+
+    def initialize_steady_state(self, max_attempts=64):
+
+        self.broadcast('initialize_steady_state', max_attempts)
+        self.clear_views()
+
+
+    def get_relaxation_steps(self, period=1):
+
+        return max(self.broadcast('get_relaxation_steps', period))
+
+
+    def enable_profiling(self, record_blocks=True):
+
+        raise RuntimeError("Profiling is only supported on single-process translocators")
+
+
+    def save_checkpoint(self, filename):
+
+        for i, connection in enumerate(self.connections):
+            connection.send(('save_checkpoint', '%s.%d' % (filename, i)))
+
+        self.receive()
+
+        checkpoint = {'step_count': self.step_count, 'sample_count': self.sample_count}
+
+        for i, observer in enumerate(self.observers):
+            for key, array in observer.get_checkpoint().items():
+                checkpoint['observer%d/%s' % (i, key)] = array
+
+        with open(filename + '.tmp', 'wb') as checkpoint_file:
+            np.savez(checkpoint_file, **checkpoint)
+
+        os.replace(filename + '.tmp', filename)
+
+
+    def load_checkpoint(self, filename):
+
+        for i, connection in enumerate(self.connections):
+            connection.send(('load_checkpoint', '%s.%d' % (filename, i)))
+
+        self.receive()
+        self.clear_views()
+
+        with np.load(filename) as checkpoint:
+            for i, observer in enumerate(self.observers):
+                prefix = 'observer%d/' % i
+                observer.set_checkpoint({key[len(prefix):]: checkpoint[key] for key in checkpoint.files
+                                         if key.startswith(prefix)})
+
+            self.step_count = int(checkpoint['step_count'])
+            self.sample_count = int(checkpoint['sample_count'])
+
+
+    def close(self):
+
+        for connection, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                try:
+                    connection.send(('close', None))
+                except (BrokenPipeError, OSError):
+                    pass
+
+            worker.join()
+            connection.close()
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+        self.connections = []
+        self.workers = []
+
+        self.blocks = []
+
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *args):
+
+        self.close()
@@ -0,0 +1,217 @@
+import time
+
+import numpy as np
+
+
+class Profiler():
+
+    events = ('loaded', 'unloaded', 'state_changes', 'stalls', 'blocked', 'collisions', 'ctcf_births', 'ctcf_deaths')
+
+    def __init__(self, translocator, record_blocks=True):
+
+        self.translocator = translocator
+        self.record_blocks = record_blocks
+
+        self.xp = translocator.extrusion_engine.xp
+        self.wrapped = []
+
+        self.reset()
+        self.attach()
+
+
+    def reset(self):
+
+        self.seconds = {}
+        self.calls = {}
+
+        self.counts = {event: 0 for event in self.events}
+
+        self.steps = 0
+        self.blocks = []
+
+        # Time spent in nested phases, which is subtracted from the calling phase
+        self.stack = []
+
+
+    def attach(self):
+
+        extruder = self.translocator.extrusion_engine
+        barrier = self.translocator.barrier_engine
+
+        targets = [(self.translocator, 'run', 'other', self.before_run, self.after_run),
+                   (barrier, 'step', 'boundary', None, None),
+                   (barrier, 'birth', 'boundary', None, self.after_ctcf_birth),
+                   (barrier, 'death', 'boundary', None, self.after_ctcf_death),
+                   (extruder, 'birth', 'birth', None, self.after_birth),
+                   (extruder, 'death', 'death', None, None),
+                   (extruder, 'unload', 'unload', self.before_unload, None),
+                   (extruder, 'loading_engine', 'loading', None, None),
+                   (extruder, 'site_index_engine', 'site_index', None, None),
+                   (extruder, 'transition_engine', 'transitions', None, self.after_transitions),
+                   (extruder, 'diffusion_engine', 'diffusion', None, None),
+                   (extruder, 'stepping_engine', 'stepping', self.before_stepping, self.after_stepping),
+                   (extruder, 'update_occupancies', 'occupancies', None, None),
+                   (extruder, 'resolve_overlaps', 'occupancies', None, self.after_overlaps),
+                   (extruder, 'fused_engine', 'fused', None, self.after_fused)]
+
+        for target, name, phase, before, after in targets:
+            method = getattr(target, name, None)
+
+            if method is not None:
+                self.seconds.setdefault(phase, 0.)
+                self.calls.setdefault(phase, 0)
+
+                self.wrapped.append((target, name, target.__dict__.get(name)))
+                setattr(target, name, self.wrap(method, phase, before, after))
+
+
+    def detach(self):
+
+        # Engines stored on the instance get their original back, wrapped class methods are simply uncovered
+        for target, name, original in reversed(self.wrapped):
+            if original is None:
+                delattr(target, name)
+
+            else:
+                setattr(target, name, original)
+
+        self.wrapped = []
+
+
+    def synchronize(self):
+
+        if self.xp.__name__ == 'cupy':
+            self.xp.cuda.Stream.null.synchronize()
+
+
+    def wrap(self, method, phase, before=None, after=None):
+
+        def wrapper(*args, **kwargs):
+
+            context = before(*args, **kwargs) if before else None
+
+            self.synchronize()
+            self.stack.append(0.)
+
+            start = time.perf_counter()
+
+            try:
+                result = method(*args, **kwargs)
+
+            finally:
+                self.synchronize()
+
+                elapsed = time.perf_counter() - start
+                nested = self.stack.pop()
+
+                self.seconds[phase] += elapsed - nested
+                self.calls[phase] += 1
+
+                if self.stack:
+                    self.stack[-1] += elapsed
+
+            if after:
+                after(context, result, *args, **kwargs)
+
+            return result
+
+        return wrapper
+
+
+    def before_run(self, N, **kwargs):
+
+        return dict(self.seconds)
+
+
+    def after_run(self, seconds, result, N, **kwargs):
+
+        self.steps += N
+
+        if self.record_blocks:
+            self.blocks.append((N, {phase: self.seconds[phase] - seconds.get(phase, 0.) for phase in self.seconds}))
+
+
+    def after_birth(self, context, ids, *args, **kwargs):
+
+        self.counts['loaded'] += len(ids)
+
+
+    def before_unload(self, ids, *args, **kwargs):
+
+        self.counts['unloaded'] += len(ids)
+
+
+    def after_transitions(self, context, new_states, *args, **kwargs):
+
+        self.counts['state_changes'] += int(self.xp.count_nonzero(self.xp.greater_equal(new_states, 0)))
+
+
+    def after_overlaps(self, context, is_kept, *args, **kwargs):
+
+        self.counts['collisions'] += int(self.xp.count_nonzero(~is_kept))
+
+
+    def after_ctcf_birth(self, context, ids, *args, **kwargs):
+
+        self.counts['ctcf_births'] += len(ids[0]) + len(ids[1])
+
+
+    def after_ctcf_death(self, context, ids, *args, **kwargs):
+
+        self.counts['ctcf_deaths'] += len(ids[0]) + len(ids[1])
+
+
+    def after_fused(self, context, counts, *args, **kwargs):
+
+        for event, count in counts.items():
+            self.counts[event] += count
+
+
+    def before_stepping(self, sim, mode, active_state_id, *args, **kwargs):
+
+        return sim.occupied.copy(), sim.positions.copy(), sim.stalled.astype(bool)
+
+
+    def after_stepping(self, context, result, sim, mode, active_state_id, *args, **kwargs):
+
+        occupied, positions, was_stalled = context
+        is_stalled = sim.stalled.astype(bool)
+
+        self.counts['stalls'] += int(self.xp.count_nonzero(is_stalled & ~was_stalled))
+
+        # Legs free to move this step, whose target site was already taken before the step
+        is_moving = self.xp.equal(sim.states, active_state_id)[:, None] & ~is_stalled
+
+        if mode == "asymmetric":
+            is_moving &= self.xp.equal(sim.directions[:, None], self.xp.arange(2))
+
+        targets = self.xp.clip(positions + self.xp.asarray([-1, 1]), 0, sim.lattice_size-1)
+
+        self.counts['blocked'] += int(self.xp.count_nonzero(is_moving & occupied[targets]))
+
+
+    def report(self):
+
+        total = sum(self.seconds.values())
+        phases = {}
+
+        for phase, seconds in self.seconds.items():
+            if self.calls[phase] > 0:
+                phases[phase] = {'seconds': seconds,
+                                 'calls': self.calls[phase],
+                                 'fraction': seconds / total if total > 0 else 0.}
+
+        report = {'steps': self.steps,
+                  'seconds': total,
+                  'seconds_per_step': total / self.steps if self.steps > 0 else 0.,
+                  'phases': phases,
+                  'events': dict(self.counts)}
+
+        if self.record_blocks:
+            report['blocks'] = {'steps': np.asarray([steps for steps, _ in self.blocks], dtype=np.int64),
+                                'seconds': np.asarray([sum(seconds.values()) for _, seconds in self.blocks])}
+
+            for phase in phases:
+                report['blocks'][phase] = np.asarray([seconds.get(phase, 0.) for _, seconds in self.blocks])
+
+        return report
@@ -0,0 +1,83 @@
+import json
+
+
+class RandomStream():
+
+    # CUDA kernels read the numbers of each LEF as vectors of up to 4 values, so draws start on 4-value boundaries
+    alignment = 4
+
+    def __init__(self, xp, seed=None, block_size=2**16, dtype=None):
+
+        self.xp = xp
+        self.generator = seed if isinstance(seed, xp.random.Generator) else xp.random.default_rng(seed)
+
+        self.dtype = dtype or self.xp.float64
+        self.block = self.xp.empty(int(block_size), dtype=self.dtype)
+        self.reset()
+
+
+    def reset(self):
+
+        # Discard the unused part of the current block, so that the stream only depends on the generator state
+        self.index = len(self.block)
+        self.block_state = None
+
+
+    def random(self, *shape):
+
+        # Draws are views into the current block, valid until the next draw - callers keeping one across another copy it
+        size = 1
+
+        for length in shape:
+            size *= int(length)
+
+        start = -(-self.index // self.alignment) * self.alignment
+
+        if start + size > len(self.block):
+            if size > len(self.block):
+                self.block = self.xp.empty(size, dtype=self.dtype)
+
+            # The generator state the block is drawn from is kept, so that checkpoints can redraw the block
+            self.block_state = self.generator.bit_generator.state
+            self.generator.random(dtype=self.dtype, out=self.block)
+
+            start = 0
+
+        values = self.block[start:start+size].reshape(shape)
+        self.index = start + size
+
+        return values
+
+
+    def choice(self, population, size):
+
+        if size >= len(population):
+            return population[self.xp.argsort(self.random(len(population)))]
+
+        if self.xp.__name__ == 'numpy':
+            return self.generator.choice(population, size=size, replace=False)
+
+        return population[self.xp.argpartition(self.random(len(population)), size)[:size]]
+
+
+    def get_state(self):
+
+        return json.dumps({'state': self.generator.bit_generator.state,
+                           'block_state': self.block_state,
+                           'block_size': len(self.block),
+                           'index': self.index})
+
+
+    def set_state(self, state):
+
+        state = json.loads(state)
+
+        self.block = self.xp.empty(state['block_size'], dtype=self.dtype)
+        self.block_state = state['block_state']
+
+        if self.block_state is not None:
+            self.generator.bit_generator.state = self.block_state
+            self.generator.random(dtype=self.dtype, out=self.block)
+
+        self.generator.bit_generator.state = state['state']
+        self.index = state['index']
@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class Trajectory():
+
+    def __init__(self, shape, dtype, length=0):
+
+        self.shape = tuple(shape)
+        self.length = 0
+
+        self.buffer = np.empty((int(length),) + self.shape, dtype=dtype)
+
+
+    def reserve(self, length):
+
+        if length > len(self.buffer):
+            buffer = np.empty((max(length, 2*len(self.buffer)),) + self.shape, dtype=self.buffer.dtype)
+            buffer[:self.length] = self.buffer[:self.length]
+
+            self.buffer = buffer
+
+
+    def append(self, values):
+
+        self.reserve(self.length+1)
+
+        self.buffer[self.length] = values
+        self.length += 1
+
+
+    def clear(self):
+
+        self.length = 0
+
+
+    @property
+    def data(self):
+
+        return self.buffer[:self.length]
+
+
+    def __len__(self):
+
+        return self.length
+
+
+    def __getitem__(self, index):
+
+        return self.data[index]
+
+
+    def __iter__(self):
+
+        return iter(self.data)
+
+
+    def __array__(self, dtype=None, copy=None):
+
+        data = self.data if dtype is None else self.data.astype(dtype)
+
+        return data.copy() if copy else data
+
+
+class RaggedTrajectory():
+
+    def __init__(self, shape, dtype, length=0, capacity=0):
+
+        self.rows = Trajectory(shape, dtype, capacity)
+        self.offsets = Trajectory((), np.int64, int(length)+1)
+
+        self.offsets.append(0)
+
+
+    def append(self, values):
+
+        start = self.offsets.buffer[self.offsets.length-1]
+        stop = start + len(values)
+
+        if (self.rows.length == 0) and (len(self.rows.buffer) == 0):
+            # Size the row buffer from the first sample so that steady-state runs never reallocate
+            self.rows.reserve(int(1.25 * len(values) * (len(self.offsets.buffer)-1)))
+
+        self.rows.reserve(stop)
+        self.rows.buffer[start:stop] = values
+
+        self.rows.length = stop
+        self.offsets.append(stop)
+
+
+    def clear(self):
+
+        self.rows.clear()
+        self.offsets.clear()
+
+        self.offsets.append(0)
+
+
+    @property
+    def data(self):
+
+        return self.rows.data
+
+
+    def __len__(self):
+
+        return self.offsets.length - 1
+
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Trajectory index %d out of range" % index)
+
+        start, stop = self.offsets.buffer[index:index+2]
+
+        return self.rows.buffer[start:stop]
+
+
+    def __iter__(self):
+
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,260 @@
+import os
+import json
+import queue
+import threading
+
+import numpy as np
+
+from .Trajectory import Trajectory, RaggedTrajectory
+
+
+class TrajectoryWriter():
+
+    def __init__(self,
+                 path,
+                 number_of_LEFs,
+                 prune_unbound_LEFs=True,
+                 chunk_size=1000,
+                 max_pending_chunks=2,
+                 samples=0,
+                 **metadata):
+
+        self.path = path
+        self.chunk_size = int(chunk_size)
+
+        self.number_of_LEFs = number_of_LEFs
+        self.prune_unbound_LEFs = prune_unbound_LEFs
+
+        os.makedirs(self.path, exist_ok=True)
+
+        self.manifest = {'number_of_LEFs': number_of_LEFs,
+                         'prune_unbound_LEFs': prune_unbound_LEFs,
+                         'chunk_size': self.chunk_size,
+                         'metadata': metadata,
+                         'chunks': []}
+
+        if samples > 0:
+            self.resume(samples)
+
+        self.error = None
+        self.queue = queue.Queue(maxsize=max_pending_chunks)
+
+        self.thread = threading.Thread(target=self.write_chunks, daemon=True)
+        self.thread.start()
+
+        self.new_chunk()
+
+
+    def resume(self, samples):
+
+        with open(os.path.join(self.path, 'manifest.json'), 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+
+        written = 0
+
+        for chunk in manifest['chunks']:
+            if written + chunk['samples'] > samples:
+                break
+
+            self.manifest['chunks'].append(chunk)
+            written += chunk['samples']
+
+        if written != samples:
+            raise RuntimeError("Trajectory at %s holds %d samples, cannot resume from sample %d"
+                               % (self.path, written, samples))
+
+
+    def new_chunk(self):
+
+        self.state_trajectory = Trajectory((self.number_of_LEFs,), 'int32', self.chunk_size)
+
+        if self.prune_unbound_LEFs:
+            self.lef_trajectory = RaggedTrajectory((2,), 'int32', self.chunk_size)
+        else:
+            self.lef_trajectory = Trajectory((self.number_of_LEFs, 2), 'int32', self.chunk_size)
+
+        self.ctcf_trajectory = RaggedTrajectory((), 'int32', self.chunk_size)
+
+
+    def append(self, LEF_states, LEF_positions, CTCF_positions):
+
+        self.state_trajectory.append(LEF_states)
+
+        self.lef_trajectory.append(LEF_positions)
+        self.ctcf_trajectory.append(CTCF_positions)
+
+        if len(self.state_trajectory) == self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+
+        if self.error:
+            raise self.error
+
+        if len(self.state_trajectory) > 0:
+            # Blocks whenever max_pending_chunks are already queued, which bounds memory usage
+            self.queue.put((self.state_trajectory, self.lef_trajectory, self.ctcf_trajectory))
+            self.new_chunk()
+
+
+    def sync(self):
+
+        self.flush()
+        self.queue.join()
+
+        if self.error:
+            raise self.error
+
+
+    def close(self):
+
+        self.flush()
+
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error:
+            raise self.error
+
+
+    def write_chunks(self):
+
+        while True:
+            chunk = self.queue.get()
+
+            if chunk is None:
+                self.queue.task_done()
+                break
+
+            try:
+                if not self.error:
+                    self.write_chunk(*chunk)
+
+            except Exception as error:
+                self.error = error
+
+            finally:
+                self.queue.task_done()
+
+
+    def write_chunk(self, state_trajectory, lef_trajectory, ctcf_trajectory):
+
+        chunk_id = len(self.manifest['chunks'])
+        files = {}
+
+        arrays = {'states': state_trajectory.data,
+                  'lef_positions': lef_trajectory.data,
+                  'ctcf_positions': ctcf_trajectory.data,
+                  'ctcf_offsets': ctcf_trajectory.offsets.data}
+
+        if self.prune_unbound_LEFs:
+            arrays['lef_offsets'] = lef_trajectory.offsets.data
+
+        for name, array in arrays.items():
+            files[name] = "%s_%05d.npy" % (name, chunk_id)
+            np.save(os.path.join(self.path, files[name]), array)
+
+        self.manifest['chunks'].append({'samples': len(state_trajectory), 'files': files})
+        self.write_manifest()
+
+
+    def write_manifest(self):
+
+        manifest_path = os.path.join(self.path, 'manifest.json')
+
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=4)
+
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+
+class ChunkedTrajectory():
+
+    def __init__(self, chunks):
+
+        self.chunks = chunks
+        self.bounds = np.cumsum([0] + [len(chunk) for chunk in chunks])
+
+
+    @property
+    def data(self):
+
+        if len(self.chunks) == 1:
+            return self.chunks[0].data
+
+        return np.concatenate([chunk.data for chunk in self.chunks])
+
+
+    def __len__(self):
+
+        return int(self.bounds[-1])
+
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Trajectory index %d out of range" % index)
+
+        chunk_id = np.searchsorted(self.bounds, index, side='right') - 1
+
+        return self.chunks[chunk_id][index-self.bounds[chunk_id]]
+
+
+    def __iter__(self):
+
+        for chunk in self.chunks:
+            yield from chunk
+
+
+    def __array__(self, dtype=None, copy=None):
+
+        data = self.data if dtype is None else self.data.astype(dtype)
+
+        return data.copy() if copy else data
+
+
+def load_chunk(path, files, name, shape, mmap_mode):
+
+    rows_name = 'states' if name == 'states' else "%s_positions" % name
+    offsets_name = "%s_offsets" % name
+
+    rows = np.load(os.path.join(path, files[rows_name]), mmap_mode=mmap_mode)
+
+    if offsets_name in files:
+        trajectory = RaggedTrajectory(shape, rows.dtype)
+        row_trajectory = trajectory.rows
+
+        trajectory.offsets.buffer = np.load(os.path.join(path, files[offsets_name]))
+        trajectory.offsets.length = len(trajectory.offsets.buffer)
+
+    else:
+        trajectory = row_trajectory = Trajectory(shape, rows.dtype)
+
+    row_trajectory.buffer = rows
+    row_trajectory.length = len(rows)
+
+    return trajectory
+
+
+def load_trajectory(path, mmap_mode='r'):
+
+    with open(os.path.join(path, 'manifest.json'), 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    trajectories = []
+    number_of_LEFs = manifest['number_of_LEFs']
+
+    lef_shape = (2,) if manifest['prune_unbound_LEFs'] else (number_of_LEFs, 2)
+
+    for name, shape in zip(['states', 'lef', 'ctcf'], [(number_of_LEFs,), lef_shape, ()]):
+        chunks = [load_chunk(path, chunk['files'], name, shape, mmap_mode) for chunk in manifest['chunks']]
+        trajectories.append(ChunkedTrajectory(chunks))
+
+    return trajectories
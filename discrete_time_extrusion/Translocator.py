@@ -1,8 +1,19 @@
-from . import arrays
+import os
+
+import numpy as np
+
+from . import arrays, cache
+from .ContactMap import ContactMap
+from .Profiler import Profiler
+from .RandomStream import RandomStream
+from .Trajectory import Trajectory, RaggedTrajectory
+from .TrajectoryWriter import TrajectoryWriter, load_trajectory
 
 
 class Translocator():
 
+    profiler = None
+
     def __init__(self,
                  extrusion_engine,
                  barrier_engine,
@@ -12,6 +23,11 @@ class Translocator():
                  ctcf_right_positions,
                  chromosome_bounds=[0,-1],
                  device='CPU',
+                 site_arrays=None,
+                 cache_dir=None,
+                 seed=None,
+                 backend=None,
+                 compact=False,
                  **kwargs):
 
         if device == 'CPU':
@@ -32,64 +48,256 @@ class Translocator():
             raise RuntimeError("Unrecognized device %s - use either 'CPU' or 'GPU'" % device)
     
         sites_per_replica = kwargs['monomers_per_replica'] * kwargs['sites_per_monomer']
-        number_of_LEFs = (kwargs['number_of_replica'] * kwargs['monomers_per_replica']) // kwargs['LEF_separation']
         
         assert len(site_types) == sites_per_replica, ("Site type array (%d) doesn't match replica lattice size (%d)"
                                                       % (len(site_types), sites_per_replica))
 
-        self.time_unit = 1. / (kwargs['sites_per_monomer'] * kwargs['velocity_multiplier'])
+        if site_arrays is None and cache_dir is not None:
+            site_arrays = cache.make_cached_translocator_arrays(xp, cache_dir, type_list, site_types,
+                                                                ctcf_left_positions, ctcf_right_positions,
+                                                                compact=compact, **kwargs)
+            
+        elif site_arrays is None:
+            site_arrays = arrays.make_translocator_arrays(xp, type_list, site_types,
+                                                          ctcf_left_positions, ctcf_right_positions,
+                                                          compact=compact, **kwargs)
+            
+        # Replica groups stack their own replicas, so that the lattice spans all of them
+        kwargs['number_of_replica'] = sum(params['number_of_replica'] for params in arrays.make_group_params(**kwargs))
+        number_of_LEFs = sum(site_arrays["LEF_groups"]["group_LEFs"])
+
+        # Group edges are walled off like the ends of the lattice, so that no LEF extrudes into a neighbouring group
+        group_edges = site_arrays["LEF_groups"]["group_bounds"][1:-1]
+        chromosome_bounds = list(chromosome_bounds) + [edge + offset for edge in group_edges for offset in [-1, 0]]
 
-        lef_arrays = arrays.make_LEF_arrays(xp, type_list, site_types, **kwargs)
-        lef_transition_dict = arrays.make_LEF_transition_dict(xp, type_list, site_types, **kwargs)
+        # Compact runs draw single precision random numbers, and keep per-LEF flags in single bytes
+        self.rng = RandomStream(xp, seed, dtype=xp.float32 if compact else xp.float64)
 
-        ctcf_dynamic_arrays = arrays.make_CTCF_dynamic_arrays(xp, type_list, site_types, **kwargs)
-        ctcf_arrays = arrays.make_CTCF_arrays(xp, type_list, site_types,
-                                              ctcf_left_positions, ctcf_right_positions, **kwargs)
-                                              
-        self.barrier_engine = barrier_engine(*ctcf_arrays, *ctcf_dynamic_arrays)
+        self.barrier_engine = barrier_engine(*site_arrays["CTCF_arrays"], *site_arrays["CTCF_dynamic_arrays"],
+                                             site_types=site_arrays["site_types"], rng=self.rng)
         self.extrusion_engine = extrusion_engine(number_of_LEFs, self.barrier_engine, chromosome_bounds,
-												 *lef_arrays, **lef_transition_dict)
+                                                 *site_arrays["LEF_arrays"], **site_arrays["LEF_transition_dict"],
+                                                 LEF_groups=site_arrays["LEF_groups"], backend=backend, compact=compact)
+        
+        self.set_params(**kwargs)
+        
+        
+    def set_params(self, **kwargs):
+
+        self.time_unit = 1. / (kwargs['sites_per_monomer'] * kwargs['velocity_multiplier'])
                 
         kwargs['steps'] = int(kwargs['steps'] / self.time_unit)
         kwargs['dummy_steps'] = int(kwargs['dummy_steps'] / self.time_unit)
         
         self.params = kwargs
+        
+        self.step_count = 0
+        self.sample_count = 0
+        
+        self.observers = []
                 
 
     def run(self, N, **kwargs):
             
         self.extrusion_engine.steps(N, self.params['mode'], **kwargs)
+        self.step_count += N
         
         
-    def run_trajectory(self, period=None, steps=None, prune_unbound_LEFs=True, **kwargs):
-
-        self.clear_trajectory()
+    def initialize_steady_state(self, max_attempts=64):
+    
+        self.extrusion_engine.initialize_steady_state(self.params['mode'], max_attempts=max_attempts)
+        
+        
+    def get_relaxation_steps(self, period=1):
+    
+        # Burn-in after a steady-state start, counted in periods of the given number of steps
+        return -(-self.extrusion_engine.get_relaxation_steps() // period)
+        
+        
+    def add_contact_map(self, bin_size=1, sparse=False, **kwargs):
+    
+        sites_per_replica = self.params['monomers_per_replica'] * self.params['sites_per_monomer']
+        contact_map = ContactMap(sites_per_replica, bin_size, sparse, xp=self.extrusion_engine.xp, **kwargs)
+        
+        self.observers.append(contact_map)
+        
+        return contact_map
+        
+        
+    def add_observable(self, observable, *args, **kwargs):
+    
+        observer = observable(*args, xp=self.extrusion_engine.xp, **kwargs)
+        self.observers.append(observer)
+        
+        return observer
+        
+        
+    def enable_profiling(self, record_blocks=True):
+    
+        # Engine methods are only wrapped while profiling, so that disabled runs carry no instrumentation at all
+        if self.profiler is None:
+            self.profiler = Profiler(self, record_blocks)
+            
+        return self.profiler
+        
+        
+    def disable_profiling(self):
+    
+        profiler = self.profiler
+        
+        if profiler is not None:
+            profiler.detach()
+            self.profiler = None
+            
+        return profiler
+        
+        
+    def run_trajectory(self,
+                       period=None,
+                       steps=None,
+                       prune_unbound_LEFs=True,
+                       path=None,
+                       chunk_size=1000,
+                       dummy_steps=None,
+                       checkpoint_path=None,
+                       checkpoint_interval=None,
+                       resume=False,
+                       store_trajectory=True,
+                       steady_state=False,
+                       **kwargs):
 
         steps = int(steps) if steps else self.params['steps']
         period = int(period) if period else self.params['sites_per_monomer']
         
-        self.run(self.params['dummy_steps']*period, **kwargs)
+        # Starting from steady state, the burn-in by default only relaxes the arrangement of loops, for about one LEF
+        # lifetime
+        if dummy_steps is not None:
+            dummy_steps = int(dummy_steps)
+            
+        elif steady_state:
+            dummy_steps = self.get_relaxation_steps(period)
+            
+        else:
+            dummy_steps = self.params['dummy_steps']
+            
+        checkpoint_interval = int(checkpoint_interval) if checkpoint_interval else chunk_size
+        
+        if not resume:
+            self.sample_count = 0
+            
+            for observer in self.observers:
+                observer.reset()
+
+        if not store_trajectory:
+            self.clear_trajectory()
+            writer = None
+            
+        elif path:
+            self.clear_trajectory()
+            writer = TrajectoryWriter(path, self.extrusion_engine.number, prune_unbound_LEFs, chunk_size,
+                                      samples=self.sample_count, period=period, time_unit=self.time_unit)
+        else:
+            self.clear_trajectory(steps-self.sample_count, prune_unbound_LEFs)
+            writer = self
+
+        if not resume:
+            if steady_state:
+                self.initialize_steady_state()
+                
+            self.run(dummy_steps*period, **kwargs)
     
-        for _ in range(steps):
-            self.run(period, **kwargs)
+        try:
+            while self.sample_count < steps:
+                self.run(period, **kwargs)
+                
+                for observer in self.observers:
+                    observer.update(self)
             
-            LEF_states = self.extrusion_engine.get_states()
-            CTCF_positions = self.barrier_engine.get_bound_positions()
+                if writer is not None:
+                    self.record_sample(writer, prune_unbound_LEFs)
+                    
+                self.sample_count += 1
+                
+                if checkpoint_path and (self.sample_count % checkpoint_interval == 0):
+                    if path and (writer is not None):
+                        writer.sync()
+                        
+                    self.save_checkpoint(checkpoint_path)
+                
+        finally:
+            if path and (writer is not None):
+                writer.close()
+                self.state_trajectory, self.lef_trajectory, self.ctcf_trajectory = load_trajectory(path)
+
+
+    def record_sample(self, writer, prune_unbound_LEFs):
     
-            if prune_unbound_LEFs:
-                LEF_positions = self.extrusion_engine.get_bound_positions()
-            else:
-                LEF_positions = self.extrusion_engine.get_positions()
+        LEF_states = self.extrusion_engine.get_states(as_array=True)
+        CTCF_positions = self.barrier_engine.get_bound_positions(as_array=True)
+    
+        if prune_unbound_LEFs:
+            LEF_positions = self.extrusion_engine.get_bound_positions(as_array=True)
+        else:
+            LEF_positions = self.extrusion_engine.get_positions(as_array=True)
                 
-            self.state_trajectory.append(LEF_states)
+        writer.append(LEF_states, LEF_positions, CTCF_positions)
+
+
+    def append(self, LEF_states, LEF_positions, CTCF_positions):
+    
+        self.state_trajectory.append(LEF_states)
     
-            self.lef_trajectory.append(LEF_positions)
-            self.ctcf_trajectory.append(CTCF_positions)
+        self.lef_trajectory.append(LEF_positions)
+        self.ctcf_trajectory.append(CTCF_positions)
+
+
+    def clear_trajectory(self, steps=0, prune_unbound_LEFs=True):
 
+        number_of_LEFs = self.extrusion_engine.number
+        
+        self.state_trajectory = Trajectory((number_of_LEFs,), 'int32', steps)
 
-    def clear_trajectory(self):
+        if prune_unbound_LEFs:
+            self.lef_trajectory = RaggedTrajectory((2,), 'int32', steps)
+        else:
+            self.lef_trajectory = Trajectory((number_of_LEFs, 2), 'int32', steps)
+            
+        self.ctcf_trajectory = RaggedTrajectory((), 'int32', steps)
 
-        self.state_trajectory = []
 
-        self.lef_trajectory = []
-        self.ctcf_trajectory = []
+    def save_checkpoint(self, filename):
+    
+        checkpoint = {'step_count': self.step_count, 'sample_count': self.sample_count}
+        
+        for prefix, engine in zip(['extruder', 'barrier'], [self.extrusion_engine, self.barrier_engine]):
+            for key, array in engine.get_checkpoint().items():
+                checkpoint['%s/%s' % (prefix, key)] = array
+                
+        for i, observer in enumerate(self.observers):
+            for key, array in observer.get_checkpoint().items():
+                checkpoint['observer%d/%s' % (i, key)] = array
+                
+        checkpoint['rng_state'] = self.rng.get_state()
+        
+        # Write to a temporary file first so that a job killed mid-write leaves the last checkpoint intact
+        with open(filename + '.tmp', 'wb') as checkpoint_file:
+            np.savez(checkpoint_file, **checkpoint)
+            
+        os.replace(filename + '.tmp', filename)
+        
+        
+    def load_checkpoint(self, filename):
+    
+        with np.load(filename) as checkpoint:
+            for prefix, engine in zip(['extruder', 'barrier'], [self.extrusion_engine, self.barrier_engine]):
+                engine.set_checkpoint({key: checkpoint['%s/%s' % (prefix, key)] for key in engine.checkpoint_keys})
+                
+            for i, observer in enumerate(self.observers):
+                prefix = 'observer%d/' % i
+                observer.set_checkpoint({key[len(prefix):]: checkpoint[key] for key in checkpoint.files
+                                         if key.startswith(prefix)})
+                
+            self.rng.set_state(str(checkpoint['rng_state']))
+                                 
+            self.step_count = int(checkpoint['step_count'])
+            self.sample_count = int(checkpoint['sample_count'])
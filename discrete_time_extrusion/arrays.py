@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def make_site_array(xp,
                     type_list,
                     site_types,
@@ -9,10 +12,8 @@ def make_site_array(xp,
     assert len(type_list) == len(value_dict), ('Number of values (%d) incompatible with number of site types (%d)'
                                             % (len(value_dict), len(type_list)))
     
-    prop_array = xp.zeros(len(site_types), dtype=xp.float64)
-    
-    for i, name in enumerate(type_list):
-        prop_array[site_types == i] = value_dict[name]
+    # A single gather from the type table, rather than one mask over the lattice per type
+    prop_array = make_type_table(xp, type_list, value_dict)[make_type_array(xp, type_list, site_types)]
         
     try:
         ids = xp.array(at_ids, dtype=xp.uint32)
@@ -28,6 +29,33 @@ def make_site_array(xp,
     return xp.tile(prop_array, number_of_replica)
 
 
+def make_type_array(xp,
+                    type_list,
+                    site_types,
+                    **kwargs):
+    
+    assert len(type_list) < 255, ('Number of site types (%d) exceeds the 254 supported by the type array'
+                                  % len(type_list))
+    
+    type_array = xp.asarray(site_types)
+    is_known = xp.logical_and(xp.greater_equal(type_array, 0), xp.less(type_array, len(type_list)))
+    
+    # Sites of unlisted types map onto an extra type whose properties are all zero - the array covers a single
+    # replica, and the kernels index it modulo its length
+    return xp.where(is_known, type_array, len(type_list)).astype(xp.uint8)
+
+
+def make_type_table(xp,
+                    type_list,
+                    value_dict,
+                    **kwargs):
+    
+    assert len(type_list) == len(value_dict), ('Number of values (%d) incompatible with number of site types (%d)'
+                                            % (len(value_dict), len(type_list)))
+    
+    return xp.asarray([value_dict[name] for name in type_list] + [0], dtype=xp.float64)
+
+
 def make_CTCF_arrays(xp,
                      type_list,
                      site_types,
@@ -36,6 +64,7 @@ def make_CTCF_arrays(xp,
                      CTCF_facestall,
                      CTCF_backstall,
                      velocity_multiplier,
+                     number_of_replica=1,
                      **kwargs):
     
     stall_left_array = make_site_array(xp, type_list, site_types, CTCF_facestall,
@@ -51,7 +80,10 @@ def make_CTCF_arrays(xp,
     stall_left_array = 1 - (1-stall_left_array) ** velocity_multiplier
     stall_right_array = 1 - (1-stall_right_array) ** velocity_multiplier
 
-    return [stall_left_array, stall_right_array]
+    # Stall probabilities are the only site properties that cannot be shared across replicas, as barriers change
+    # them in place, so they are stored in single precision
+    return [xp.tile(stall_left_array.astype(xp.float32), number_of_replica),
+            xp.tile(stall_right_array.astype(xp.float32), number_of_replica)]
 
 
 def make_CTCF_dynamic_arrays(xp,
@@ -63,13 +95,13 @@ def make_CTCF_dynamic_arrays(xp,
                              velocity_multiplier,
                              **kwargs):
     
-    on_rate_array = make_site_array(xp, type_list, site_types, CTCF_on_rate, **kwargs)
-    off_rate_array = make_site_array(xp, type_list, site_types, CTCF_off_rate, **kwargs)
+    on_rate_table = make_type_table(xp, type_list, CTCF_on_rate)
+    off_rate_table = make_type_table(xp, type_list, CTCF_off_rate)
     
-    birth_array = on_rate_array / (velocity_multiplier * sites_per_monomer)
-    death_array = off_rate_array / (velocity_multiplier * sites_per_monomer)
+    birth_table = on_rate_table / (velocity_multiplier * sites_per_monomer)
+    death_table = off_rate_table / (velocity_multiplier * sites_per_monomer)
 
-    return [birth_array, death_array]
+    return [birth_table, death_table]
     
 
 def make_LEF_arrays(xp,
@@ -84,21 +116,21 @@ def make_LEF_arrays(xp,
                     velocity_multiplier,
                     **kwargs):
     
-    on_rate_array = make_site_array(xp, type_list, site_types, LEF_on_rate, **kwargs)
-    off_rate_array = make_site_array(xp, type_list, site_types, LEF_off_rate, **kwargs)
+    on_rate_table = make_type_table(xp, type_list, LEF_on_rate)
+    off_rate_table = make_type_table(xp, type_list, LEF_off_rate)
     
-    stalled_off_rate_array = make_site_array(xp, type_list, site_types, LEF_stalled_off_rate, **kwargs)
-    diffusion_rate_array = make_site_array(xp, type_list, site_types, LEF_diffusion_rate, **kwargs)
+    stalled_off_rate_table = make_type_table(xp, type_list, LEF_stalled_off_rate)
+    diffusion_rate_table = make_type_table(xp, type_list, LEF_diffusion_rate)
 
-    birth_array = on_rate_array / (velocity_multiplier * sites_per_monomer)
-    death_array = off_rate_array / (velocity_multiplier * sites_per_monomer)
+    birth_table = on_rate_table / (velocity_multiplier * sites_per_monomer)
+    death_table = off_rate_table / (velocity_multiplier * sites_per_monomer)
     
-    stalled_death_array = stalled_off_rate_array / (velocity_multiplier * sites_per_monomer)
-    diffusion_array = diffusion_rate_array / (velocity_multiplier * sites_per_monomer)
+    stalled_death_table = stalled_off_rate_table / (velocity_multiplier * sites_per_monomer)
+    diffusion_table = diffusion_rate_table / (velocity_multiplier * sites_per_monomer)
     
-    pause_array = make_site_array(xp, type_list, site_types, LEF_pause, **kwargs)
+    pause_table = make_type_table(xp, type_list, LEF_pause)
 
-    return [birth_array, death_array, stalled_death_array, diffusion_array, pause_array]
+    return [birth_table, death_table, stalled_death_table, diffusion_table, pause_table]
 
 
 def make_LEF_transition_dict(xp,
@@ -116,7 +148,150 @@ def make_LEF_transition_dict(xp,
     transition_dict["LEF_transitions"] = {}
 
     for ids, LEF_rate in LEF_transition_rates.items():
-        rate_array = make_site_array(xp, type_list, site_types, LEF_rate, **kwargs)
-        transition_dict["LEF_transitions"][ids] = rate_array / (velocity_multiplier * sites_per_monomer)
+        rate_table = make_type_table(xp, type_list, LEF_rate)
+        transition_dict["LEF_transitions"][ids] = rate_table / (velocity_multiplier * sites_per_monomer)
 
     return transition_dict
+
+
+def make_group_params(replica_groups=None, **kwargs):
+
+    if replica_groups is None:
+        return [kwargs]
+        
+    # Each group overrides the base parameters over its own block of consecutive replicas, one replica by default
+    group_params = [{**kwargs, 'number_of_replica': 1, **group} for group in replica_groups]
+    
+    for key in ['monomers_per_replica', 'sites_per_monomer', 'velocity_multiplier', 'mode', 'LEF_states']:
+        assert all(params.get(key) == kwargs.get(key) for params in group_params), ("Parameter '%s' must be shared by all replica groups"
+                                                                                    % key)
+        
+    return group_params
+
+
+def make_group_arrays(xp,
+                      type_list,
+                      site_types,
+                      left_positions,
+                      right_positions,
+                      **kwargs):
+    
+    site_arrays = {}
+    
+    site_arrays["site_types"] = make_type_array(xp, type_list, site_types, **kwargs)
+    
+    site_arrays["LEF_arrays"] = make_LEF_arrays(xp, type_list, site_types, **kwargs)
+    site_arrays["LEF_transition_dict"] = make_LEF_transition_dict(xp, type_list, site_types, **kwargs)
+    
+    site_arrays["CTCF_arrays"] = make_CTCF_arrays(xp, type_list, site_types, left_positions, right_positions, **kwargs)
+    site_arrays["CTCF_dynamic_arrays"] = make_CTCF_dynamic_arrays(xp, type_list, site_types, **kwargs)
+    
+    number_of_sites = kwargs['number_of_replica'] * len(site_types)
+    number_of_LEFs = (kwargs['number_of_replica'] * kwargs['monomers_per_replica']) // kwargs['LEF_separation']
+    
+    site_arrays["LEF_groups"] = {"group_bounds": [0, number_of_sites], "group_LEFs": [number_of_LEFs]}
+    
+    return site_arrays
+    
+    
+def merge_group_arrays(xp, type_list, group_arrays):
+
+    number_of_types = len(type_list) + 1
+    
+    assert len(group_arrays) * number_of_types <= 256, ('Replica groups (%d) with %d site types exceed the type array capacity'
+                                                        % (len(group_arrays), len(type_list)))
+    
+    site_arrays = {}
+    
+    group_sizes = [arrays["LEF_groups"]["group_bounds"][1] for arrays in group_arrays]
+    
+    # Every group gets its own copy of the type tables, so that the kernels see each group as a distinct set of
+    # site types - the merged type array then spans the whole lattice, which the modulo indexing leaves unchanged
+    type_arrays = [xp.tile(arrays["site_types"] + i*number_of_types, size // len(arrays["site_types"]))
+                   for i, (arrays, size) in enumerate(zip(group_arrays, group_sizes))]
+    
+    site_arrays["site_types"] = xp.concatenate(type_arrays).astype(xp.uint8)
+    
+    for key in ["LEF_arrays", "CTCF_arrays", "CTCF_dynamic_arrays"]:
+        site_arrays[key] = [xp.concatenate(arrays) for arrays in zip(*[group[key] for group in group_arrays])]
+        
+    transition_dicts = [arrays["LEF_transition_dict"] for arrays in group_arrays]
+    
+    assert all(transitions["LEF_transitions"].keys() == transition_dicts[0]["LEF_transitions"].keys()
+               for transitions in transition_dicts), "LEF transitions must be shared by all replica groups"
+    
+    site_arrays["LEF_transition_dict"] = {"LEF_states": transition_dicts[0]["LEF_states"], "LEF_transitions": {}}
+    
+    for ids in transition_dicts[0]["LEF_transitions"]:
+        site_arrays["LEF_transition_dict"]["LEF_transitions"][ids] = xp.concatenate([transitions["LEF_transitions"][ids]
+                                                                                     for transitions in transition_dicts])
+    
+    site_arrays["LEF_groups"] = {"group_bounds": [0] + [int(bound) for bound in np.cumsum(group_sizes)],
+                                 "group_LEFs": [arrays["LEF_groups"]["group_LEFs"][0] for arrays in group_arrays]}
+    
+    return site_arrays
+
+
+def make_translocator_arrays(xp,
+                             type_list,
+                             site_types,
+                             left_positions,
+                             right_positions,
+                             compact=False,
+                             **kwargs):
+    
+    group_arrays = [make_group_arrays(xp, type_list, site_types, left_positions, right_positions, **params)
+                    for params in make_group_params(**kwargs)]
+    
+    if len(group_arrays) == 1:
+        site_arrays = group_arrays[0]
+        
+    else:
+        site_arrays = merge_group_arrays(xp, type_list, group_arrays)
+    
+    if compact:
+        # Probabilities are computed in double precision, and only stored in single precision
+        for key in ["LEF_arrays", "CTCF_arrays", "CTCF_dynamic_arrays"]:
+            site_arrays[key] = [array.astype(xp.float32) for array in site_arrays[key]]
+            
+        transitions = site_arrays["LEF_transition_dict"]["LEF_transitions"]
+        
+        for ids, array in transitions.items():
+            transitions[ids] = array.astype(xp.float32)
+    
+    return site_arrays
+
+
+def flatten_site_arrays(site_arrays):
+
+    layout = {"LEF_states": site_arrays["LEF_transition_dict"]["LEF_states"],
+              "LEF_groups": site_arrays["LEF_groups"]}
+    flat_arrays = {"site_types": site_arrays["site_types"]}
+
+    for key in ["LEF_arrays", "CTCF_arrays", "CTCF_dynamic_arrays"]:
+        for i, array in enumerate(site_arrays[key]):
+            flat_arrays["%s/%d" % (key, i)] = array
+
+    for ids, array in site_arrays["LEF_transition_dict"]["LEF_transitions"].items():
+        flat_arrays["LEF_transitions/%s" % ids] = array
+
+    return layout, flat_arrays
+
+
+def unflatten_site_arrays(layout, flat_arrays):
+
+    site_arrays = {"LEF_arrays": [], "CTCF_arrays": [], "CTCF_dynamic_arrays": [], "LEF_groups": layout["LEF_groups"],
+                   "LEF_transition_dict": {"LEF_states": layout["LEF_states"], "LEF_transitions": {}}}
+
+    # Lists are rebuilt in the order they were flattened in
+    for name, array in flat_arrays.items():
+        key, _, index = name.partition('/')
+
+        if key == "site_types":
+            site_arrays[key] = array
+        elif key == "LEF_transitions":
+            site_arrays["LEF_transition_dict"]["LEF_transitions"][index] = array
+        else:
+            site_arrays[key].append(array)
+
+    return site_arrays
@@ -1,7 +1,12 @@
+import heapq
+
 from . import StaticBoundary
 
 
 class DynamicBoundary(StaticBoundary.StaticBoundary):
+
+    state_keys = ('stall_left', 'stall_right', 'states_left', 'states_right')
+    checkpoint_keys = state_keys + ('waiting_left', 'waiting_right')
      
     def __init__(self,
                  stall_left,
@@ -10,71 +15,158 @@ class DynamicBoundary(StaticBoundary.StaticBoundary):
                  death_prob,
                  *args, **kwargs):
         
-        super().__init__(stall_left, stall_right)
+        super().__init__(stall_left, stall_right, **kwargs)
         
         self.birth_prob = birth_prob
         self.death_prob = death_prob
-            
-        occupancy = birth_prob / (birth_prob + death_prob)
 
-        self.states_left = self.xp.greater(stall_left, 0)
-        self.states_right = self.xp.greater(stall_right, 0)
+        # Barrier dynamics are only tracked at the sites able to hold a CTCF
+        self.sites_left = self.xp.flatnonzero(self.xp.greater(stall_left, 0))
+        self.sites_right = self.xp.flatnonzero(self.xp.greater(stall_right, 0))
                 
-        rng_left = self.xp.less(self.xp.random.random(self.lattice_size), occupancy)
-        rng_right = self.xp.less(self.xp.random.random(self.lattice_size), occupancy)
-        
-        self.states_left = self.xp.where(self.states_left,
-                                         self.states_left*rng_left,
-                                         -1)
-        self.states_right = self.xp.where(self.states_right,
-                                          self.states_right*rng_right,
-                                          -1)
+        rng_left = self.xp.less(self.rng.random(len(self.sites_left)), self.occupancy(self.sites_left))
+        rng_right = self.xp.less(self.rng.random(len(self.sites_right)), self.occupancy(self.sites_right))
+        
+        # States are kept per barrier site, in the order of the site arrays
+        self.states_left = rng_left.astype(self.xp.int8)
+        self.states_right = rng_right.astype(self.xp.int8)
 
-        self.stall_left = self.xp.equal(self.states_left, 1).astype(self.xp.float64)
-        self.stall_right = self.xp.equal(self.states_right, 1).astype(self.xp.float64)
+        self.stall_left = self.xp.zeros_like(stall_left)
+        self.stall_right = self.xp.zeros_like(stall_right)
+        
+        self.stall_left[self.sites_left] = self.states_left
+        self.stall_right[self.sites_right] = self.states_right
+        
+        # Each barrier site holds the absolute step of its next flip, and a heap of these events on the host
+        # hands out the sites due at each step without touching the others
+        self.clock = 0
+        
+        self.event_left = self.waiting_times(self.sites_left, self.states_left)
+        self.event_right = self.waiting_times(self.sites_right, self.states_right)
+        
+        self.reset_events()
+        
+        
+    def occupancy(self, sites):
+    
+        types = self.get_site_types(sites)
+        
+        return self.birth_prob[types] / (self.birth_prob[types] + self.death_prob[types])
+        
+        
+    def waiting_times(self, sites, states, bound_state_id=1):
+    
+        types = self.get_site_types(sites)
+        prob = self.xp.where(self.xp.equal(states, bound_state_id),
+                             self.death_prob[types],
+                             self.birth_prob[types])
+        
+        # Number of steps up to and including the next state change, drawn from a geometric distribution
+        rate = -self.xp.log1p(-self.xp.minimum(prob.astype(self.xp.float64), 1 - 1e-16))
+        wait = self.xp.ceil(-self.xp.log1p(-self.rng.random(len(sites))) / self.xp.maximum(rate, 1e-300))
+        
+        return self.xp.clip(wait, 1, 4e18).astype(self.xp.int64)
                          
 
-    def birth(self, unbound_state_id):
+    def reset_events(self):
     
-        rng_left = self.xp.less(self.xp.random.random(self.lattice_size), self.birth_prob)
-        rng_right = self.xp.less(self.xp.random.random(self.lattice_size), self.birth_prob)
-
-        ids_left = self.xp.flatnonzero(rng_left * self.xp.equal(self.states_left, unbound_state_id))
-        ids_right = self.xp.flatnonzero(rng_right * self.xp.equal(self.states_right, unbound_state_id))
+        self.events = [(time, 0, k) for k, time in enumerate(self.get_list(self.event_left))]
+        self.events += [(time, 1, k) for k, time in enumerate(self.get_list(self.event_right))]
+        
+        heapq.heapify(self.events)
+        
+        
+    def push_events(self, due_left, due_right):
+    
+        for leg, due, event in [(0, due_left, self.event_left), (1, due_right, self.event_right)]:
+            for k, time in zip(self.get_list(due), self.get_list(event[due])):
+                heapq.heappush(self.events, (time, leg, k))
+            
+            
+    def birth(self, due_left, due_right, unbound_state_id):
+    
+        ids_left = due_left[self.xp.equal(self.states_left[due_left], unbound_state_id)]
+        ids_right = due_right[self.xp.equal(self.states_right[due_right], unbound_state_id)]
         
-        self.stall_left[ids_left] = 1
-        self.stall_right[ids_right] = 1
+        self.stall_left[self.sites_left[ids_left]] = 1
+        self.stall_right[self.sites_right[ids_right]] = 1
         
         return ids_left, ids_right
                 
         
-    def death(self, bound_state_id):
+    def death(self, due_left, due_right, bound_state_id):
 
-        rng_left = self.xp.less(self.xp.random.random(self.lattice_size), self.death_prob)
-        rng_right = self.xp.less(self.xp.random.random(self.lattice_size), self.death_prob)
-
-        ids_left = self.xp.flatnonzero(rng_left * self.xp.equal(self.states_left, bound_state_id))
-        ids_right = self.xp.flatnonzero(rng_right * self.xp.equal(self.states_right, bound_state_id))
+        ids_left = due_left[self.xp.equal(self.states_left[due_left], bound_state_id)]
+        ids_right = due_right[self.xp.equal(self.states_right[due_right], bound_state_id)]
         
-        self.stall_left[ids_left] = 0
-        self.stall_right[ids_right] = 0
+        self.stall_left[self.sites_left[ids_left]] = 0
+        self.stall_right[self.sites_right[ids_right]] = 0
         
         return ids_left, ids_right
 
     
     def step(self, extrusion_engine, unbound_state_id=0, bound_state_id=1):
     
-        ids_birth_left, ids_birth_right = self.birth(unbound_state_id)
-        ids_death_left, ids_death_right = self.death(bound_state_id)
+        self.clock += 1
+        
+        if len(self.events) == 0 or self.events[0][0] > self.clock:
+            return
+            
+        due = ([], [])
+        
+        # Events pop in order of leg and site, so that the waiting times are drawn in the same order as a scan
+        while len(self.events) > 0 and self.events[0][0] <= self.clock:
+            _, leg, k = heapq.heappop(self.events)
+            due[leg].append(k)
+            
+        due_left = self.xp.asarray(due[0], dtype=self.xp.int64)
+        due_right = self.xp.asarray(due[1], dtype=self.xp.int64)
+        
+        # Barriers are referred to by their index in the site arrays, which also indexes their states and events
+        ids_birth_left, ids_birth_right = self.birth(due_left, due_right, unbound_state_id)
+        ids_death_left, ids_death_right = self.death(due_left, due_right, bound_state_id)
 
         self.states_left[ids_birth_left] = bound_state_id
         self.states_left[ids_death_left] = unbound_state_id
 
         self.states_right[ids_birth_right] = bound_state_id
         self.states_right[ids_death_right] = unbound_state_id
+        
+        self.event_left[due_left] = self.clock + self.waiting_times(self.sites_left[due_left],
+                                                                    self.states_left[due_left],
+                                                                    bound_state_id)
+        self.event_right[due_right] = self.clock + self.waiting_times(self.sites_right[due_right],
+                                                                      self.states_right[due_right],
+                                                                      bound_state_id)
+        
+        self.push_events(due_left, due_right)
 
-        lef_ids_left = self.xp.in1d(extrusion_engine.positions[:, 0], ids_death_left)
-        lef_ids_right = self.xp.in1d(extrusion_engine.positions[:, 1], ids_death_right)
+        for leg, sites_death in enumerate([self.sites_left[ids_death_left], self.sites_right[ids_death_right]]):
+            lef_ids = extrusion_engine.site_owners[sites_death]
+            
+            is_stalled = self.xp.equal(extrusion_engine.positions[lef_ids, leg], sites_death)
+            is_stalled *= self.xp.greater_equal(lef_ids, 0)
+            
+            extrusion_engine.stalled[lef_ids[is_stalled], leg] = 0
 
-        extrusion_engine.stalled[:, 0] = self.xp.where(lef_ids_left, 0, extrusion_engine.stalled[:, 0])
-        extrusion_engine.stalled[:, 1] = self.xp.where(lef_ids_right, 0, extrusion_engine.stalled[:, 1])
+            
+    def get_checkpoint(self):
+    
+        checkpoint = {key: self.get_array(getattr(self, key)) for key in self.state_keys}
+        
+        # Events are stored as the steps left until each flip, so that checkpoints do not depend on the clock
+        checkpoint['waiting_left'] = self.get_array(self.event_left - self.clock)
+        checkpoint['waiting_right'] = self.get_array(self.event_right - self.clock)
+        
+        return checkpoint
+        
+        
+    def set_checkpoint(self, checkpoint):
+    
+        for key in self.state_keys:
+            getattr(self, key)[...] = self.xp.asarray(checkpoint[key])
+            
+        self.event_left[...] = self.xp.asarray(checkpoint['waiting_left']) + self.clock
+        self.event_right[...] = self.xp.asarray(checkpoint['waiting_right']) + self.clock
+        
+        self.reset_events()
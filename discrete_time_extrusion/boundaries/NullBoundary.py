@@ -1,4 +1,9 @@
+from ..RandomStream import RandomStream
+
+
 class NullBoundary():
+
+    checkpoint_keys = ()
      
     def __init__(self,
                  stall_left,
@@ -13,23 +18,58 @@ class NullBoundary():
             import numpy as np
             self.xp = np
 
+        self.rng = kwargs.get('rng') or RandomStream(self.xp)
+
         self.number = 0
         self.lattice_size = len(stall_left)
         
+        # Site properties are looked up in per-type tables through this array, which covers a single replica and
+        # is indexed modulo its length
+        self.site_types = kwargs.get('site_types')
+        
+        if self.site_types is None:
+            self.site_types = self.xp.zeros(self.lattice_size, dtype=self.xp.uint8)
+            
+        assert self.lattice_size % len(self.site_types) == 0, ('Site type array (%d) does not tile the lattice (%d)'
+                                                               % (len(self.site_types), self.lattice_size))
+        
         self.stall_left = self.xp.zeros_like(stall_left)
         self.stall_right = self.xp.zeros_like(stall_right)
         
         self.get_list = lambda x: x.get().tolist() if self.xp.__name__ == 'cupy' else x.tolist()
+        self.get_array = lambda x: x.get() if self.xp.__name__ == 'cupy' else x
 
 
+    def get_site_types(self, sites=None):
+    
+        if sites is None:
+            sites = self.xp.arange(self.lattice_size)
+            
+        return self.site_types[sites % len(self.site_types)]
+        
+        
     def step(self, *args, **kwargs):
     
         pass
         
         
-    def get_bound_positions(self):
+    def get_bound_positions(self, as_array=False):
 
         bound_left_positions = self.xp.flatnonzero(self.stall_left)
         bound_right_positions = self.xp.flatnonzero(self.stall_right)
+        
+        if as_array:
+            return self.get_array(self.xp.concatenate([bound_left_positions, bound_right_positions]))
     
         return self.get_list(bound_left_positions) + self.get_list(bound_right_positions)
+
+
+    def get_checkpoint(self):
+
+        return {key: self.get_array(getattr(self, key)) for key in self.checkpoint_keys}
+
+
+    def set_checkpoint(self, checkpoint):
+
+        for key in self.checkpoint_keys:
+            getattr(self, key)[...] = self.xp.asarray(checkpoint[key])
@@ -8,7 +8,7 @@ class StaticBoundary(NullBoundary.NullBoundary):
                  stall_right,
                  *args, **kwargs):
         
-        super().__init__(stall_left, stall_right)
+        super().__init__(stall_left, stall_right, **kwargs)
 
         self.stall_left = stall_left
         self.stall_right = stall_right
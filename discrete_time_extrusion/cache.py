@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from . import arrays
+
+
+CACHE_VERSION = 1
+
+# Run lengths do not enter the site arrays, so jobs differing only in them share a cache entry
+uncached_params = ['steps', 'dummy_steps']
+
+
+def encode(value):
+
+    # Every value is tagged with its type and prefixed with its length, so that no two different setups encode alike
+    if value is None:
+        tag, payload = b'N', b''
+
+    elif isinstance(value, (bool, np.bool_)):
+        tag, payload = b'B', b'1' if value else b'0'
+
+    elif isinstance(value, (int, np.integer)):
+        tag, payload = b'I', str(int(value)).encode()
+
+    elif isinstance(value, (float, np.floating)):
+        tag, payload = b'F', float(value).hex().encode()
+
+    elif isinstance(value, str):
+        tag, payload = b'S', value.encode()
+
+    elif isinstance(value, (list, tuple)):
+        tag, payload = b'L', b''.join(encode(item) for item in value)
+
+    elif isinstance(value, dict):
+        tag, payload = b'D', b''.join(sorted(encode(key) + encode(item) for key, item in value.items()))
+
+    elif isinstance(value, np.ndarray) or hasattr(value, '__cuda_array_interface__'):
+        array = np.ascontiguousarray(value.get() if hasattr(value, 'get') else value)
+
+        if array.dtype.hasobject:
+            raise TypeError("Cannot hash arrays of Python objects for the site array cache")
+
+        tag, payload = b'A', encode(array.dtype.str) + encode(list(array.shape)) + array.tobytes()
+
+    else:
+        raise TypeError("Cannot hash parameters of type %s for the site array cache" % type(value).__name__)
+
+    return tag + len(payload).to_bytes(8, 'little') + payload
+
+
+def setup_key(type_list,
+              site_types,
+              left_positions,
+              right_positions,
+              compact=False,
+              **kwargs):
+
+    params = {key: value for key, value in kwargs.items() if key not in uncached_params}
+    setup_arrays = [np.asarray([] if array is None else array) for array in [site_types, left_positions, right_positions]]
+
+    setup = [CACHE_VERSION, list(type_list), compact, params] + setup_arrays
+
+    return hashlib.sha256(encode(setup)).hexdigest()
+
+
+def save_site_arrays(cache_dir, key, site_arrays):
+
+    layout, flat_arrays = arrays.flatten_site_arrays(site_arrays)
+    layout["arrays"] = []
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Entries are written aside and renamed into place, so that concurrent jobs never read a partial entry
+    staging_dir = tempfile.mkdtemp(prefix='.%s.' % key, dir=cache_dir)
+
+    try:
+        for i, (name, array) in enumerate(flat_arrays.items()):
+            array = array.get() if hasattr(array, 'get') else np.asarray(array)
+
+            np.save(os.path.join(staging_dir, '%d.npy' % i), array)
+            layout["arrays"].append(name)
+
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w') as manifest_file:
+            json.dump(layout, manifest_file, default=int)
+
+        os.rename(staging_dir, os.path.join(cache_dir, key))
+
+    except OSError:
+        # Another job stored the same entry first
+        if not os.path.isdir(os.path.join(cache_dir, key)):
+            raise
+
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def load_site_arrays(xp, cache_dir, key):
+
+    entry_dir = os.path.join(cache_dir, key)
+
+    try:
+        with open(os.path.join(entry_dir, 'manifest.json')) as manifest_file:
+            layout = json.load(manifest_file)
+
+    except FileNotFoundError:
+        return None
+
+    flat_arrays = {}
+
+    # Host arrays stay memory-mapped and read-only, device arrays are copied over
+    for i, name in enumerate(layout["arrays"]):
+        array = np.load(os.path.join(entry_dir, '%d.npy' % i), mmap_mode='r')
+        flat_arrays[name] = np.asarray(array) if xp is np else xp.asarray(array)
+
+    return arrays.unflatten_site_arrays(layout, flat_arrays)
+
+
+def make_cached_translocator_arrays(xp,
+                                    cache_dir,
+                                    type_list,
+                                    site_types,
+                                    left_positions,
+                                    right_positions,
+                                    **kwargs):
+
+    key = setup_key(type_list, site_types, left_positions, right_positions, **kwargs)
+    site_arrays = load_site_arrays(xp, cache_dir, key)
+
+    if site_arrays is None:
+        site_arrays = arrays.make_translocator_arrays(xp, type_list, site_types, left_positions, right_positions, **kwargs)
+        save_site_arrays(cache_dir, key, site_arrays)
+
+    return site_arrays
@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import arrays, cache
+from .Translocator import Translocator
+
+
+_attached_blocks = {}
+
+
+def get_context(start_method=None):
+
+    # Forked workers hang once the parent has started numba's parallel thread pool, so they are spawned instead
+    if start_method is None:
+        try:
+            import numba
+
+            numba.threading_layer()
+            start_method = 'spawn'
+
+        except (ImportError, ValueError):
+            pass
+
+    return multiprocessing.get_context(start_method)
+
+
+def share_site_arrays(site_arrays, blocks):
+
+    layout, flat_arrays = arrays.flatten_site_arrays(site_arrays)
+    layout["arrays"] = {}
+
+    for name, array in flat_arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+
+        blocks.append(block)
+        layout["arrays"][name] = (block.name, array.shape, array.dtype.str)
+
+    return layout
+
+
+def attach_site_arrays(layout):
+
+    flat_arrays = {}
+
+    for name, (block_name, shape, dtype) in layout["arrays"].items():
+        if block_name not in _attached_blocks:
+            # Workers share the parent's resource tracker, so the block is only unlinked by run_ensemble
+            _attached_blocks[block_name] = shared_memory.SharedMemory(name=block_name)
+
+        flat_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=_attached_blocks[block_name].buf)
+        flat_arrays[name].flags.writeable = False
+
+    return arrays.unflatten_site_arrays(layout, flat_arrays)
+
+
+def run_realization(task):
+
+    (extrusion_engine, barrier_engine, type_list, site_types,
+     ctcf_left_positions, ctcf_right_positions, layout, seed, params, run_kwargs, analysis) = task
+
+    translocator = Translocator(extrusion_engine, barrier_engine, type_list, site_types,
+                                ctcf_left_positions, ctcf_right_positions,
+                                site_arrays=attach_site_arrays(layout), seed=seed, **params)
+    translocator.run_trajectory(**run_kwargs)
+
+    if analysis:
+        return analysis(translocator)
+
+    return {'state_trajectory': translocator.state_trajectory,
+            'lef_trajectory': translocator.lef_trajectory,
+            'ctcf_trajectory': translocator.ctcf_trajectory}
+
+
+def run_ensemble(extrusion_engine,
+                 barrier_engine,
+                 type_list,
+                 site_types,
+                 ctcf_left_positions,
+                 ctcf_right_positions,
+                 number_of_realizations=None,
+                 param_list=None,
+                 processes=None,
+                 seed=None,
+                 analysis=None,
+                 run_kwargs=None,
+                 start_method=None,
+                 cache_dir=None,
+                 **kwargs):
+
+    run_kwargs = run_kwargs or {}
+
+    if param_list is None:
+        if number_of_realizations is None:
+            raise RuntimeError("Specify either number_of_realizations or param_list")
+
+        param_list = [{}] * number_of_realizations
+
+    param_list = [{**kwargs, **params} for params in param_list]
+    seeds = np.random.SeedSequence(seed).spawn(len(param_list))
+
+    blocks = []
+    layouts = {}
+
+    tasks = []
+
+    try:
+        for params, realization_seed in zip(param_list, seeds):
+            # Realizations sharing a parameter set also share a single copy of the site arrays
+            key = json.dumps(params, sort_keys=True, default=str)
+
+            if key not in layouts:
+                if cache_dir is None:
+                    site_arrays = arrays.make_translocator_arrays(np, type_list, site_types,
+                                                                  ctcf_left_positions, ctcf_right_positions, **params)
+                else:
+                    site_arrays = cache.make_cached_translocator_arrays(np, cache_dir, type_list, site_types,
+                                                                        ctcf_left_positions, ctcf_right_positions, **params)
+
+                layouts[key] = share_site_arrays(site_arrays, blocks)
+
+            tasks.append((extrusion_engine, barrier_engine, type_list, site_types,
+                          ctcf_left_positions, ctcf_right_positions,
+                          layouts[key], realization_seed, params, run_kwargs, analysis))
+
+        context = get_context(start_method)
+
+        with context.Pool(processes) as pool:
+            results = pool.map(run_realization, tasks, chunksize=1)
+
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return results
@@ -1,7 +1,11 @@
+import numpy as np
+
 from . import NullExtruder, EngineFactory
     
 
 class BaseExtruder(NullExtruder.NullExtruder):
+
+    site_block_size = 64
     
     def __init__(self,
                  number,
@@ -14,7 +18,7 @@ class BaseExtruder(NullExtruder.NullExtruder):
                  pause_prob,
                  *args, **kwargs):
     
-        super().__init__(number, barrier_engine, chromosome_bounds)
+        super().__init__(number, barrier_engine, chromosome_bounds, **kwargs)
 		
         self.birth_prob = birth_prob
         
@@ -24,46 +28,88 @@ class BaseExtruder(NullExtruder.NullExtruder):
         self.diffusion_prob = diffusion_prob
         self.pause_prob = pause_prob
 
-        self.stepping_engine = EngineFactory.SteppingEngine
-        self.diffusion_engine = EngineFactory.DiffusionEngine
+        device = 'GPU' if self.xp.__name__ == 'cupy' else 'CPU'
+        self.backend = EngineFactory.resolve_backend(kwargs.get('backend'), device)
+
+        self.stepping_engine = EngineFactory.SteppingEngine(self.backend, self.compact)
+        self.diffusion_engine = EngineFactory.DiffusionEngine(self.backend, self.compact)
+
+        self.site_index_engine = EngineFactory.SiteIndexEngine(self.backend)
+        self.loading_engine = EngineFactory.LoadingEngine(self.backend)
+        
+        self.placement_engine = EngineFactory.PlacementEngine(self.backend)
+        
+        # Index over the birth probabilities of free sites, kept in step with the occupancy bitmap - sites are
+        # summed in blocks of site_block_size, and blocks in a Fenwick tree (1-based, so one longer than the blocks)
+        number_of_blocks = (self.lattice_size + self.site_block_size - 1) // self.site_block_size
+        
+        self.site_weights = self.xp.zeros(self.lattice_size, dtype=self.xp.float64)
+        
+        self.tree_weights = self.xp.zeros(number_of_blocks+1, dtype=self.xp.float64)
+        self.tree_counts = self.xp.zeros(number_of_blocks+1, dtype=self.xp.int64)
+        
+        self.reset_site_index()
 
                             
     def birth(self, unbound_state_id):
     
         unbound_ids = self.xp.flatnonzero(self.xp.equal(self.states, unbound_state_id))
         
-        free_sites = self.sites[~self.occupied * self.xp.greater(self.birth_prob, 0)]
-        binding_sites = self.xp.random.choice(free_sites, size=len(unbound_ids), replace=False)
-
-        rng = self.xp.less(self.xp.random.random(len(unbound_ids)), self.birth_prob[binding_sites])
-		
-        load_ids = self.xp.flatnonzero(rng)
-        ids = unbound_ids[load_ids]
+        if self.loading_engine is None:
+            ids, binding_sites = [], []
+            
+            for group in range(len(self.group_bounds)-1):
+                group_ids = unbound_ids[self.xp.equal(self.LEF_groups[unbound_ids], group)]
+                group_sites = self.sites[self.group_bounds[group]:self.group_bounds[group+1]]
+                
+                is_free = ~self.occupied[group_sites] * self.xp.greater(self.birth_prob[self.get_site_types(group_sites)], 0)
+                group_sites = self.rng.choice(group_sites[is_free], len(group_ids))
+        
+                group_ids = group_ids[:len(group_sites)]
+                rng = self.xp.less(self.rng.random(len(group_ids)), self.birth_prob[self.get_site_types(group_sites)])
+                
+                ids.append(group_ids[rng])
+                binding_sites.append(group_sites[rng])
+                
+            ids = self.xp.concatenate(ids)
+            binding_sites = self.xp.concatenate(binding_sites)
+            
+        else:
+            self.update_site_index()
+            
+            binding_sites = self.loading_engine(self, unbound_ids)
+            is_loaded = self.xp.greater_equal(binding_sites, 0)
+            
+            ids = unbound_ids[is_loaded]
+            binding_sites = binding_sites[is_loaded]
 
-        if len(load_ids) > 0:
-            binding_sites = binding_sites[load_ids]
+        if len(ids) > 0:
+            # Loaded sites are marked first so that a staggered leg cannot land on another LEF loaded in this step
+            self.occupied[binding_sites] = True
         
-            rng_dir = self.xp.less(self.xp.random.random(len(ids)), 0.5)
-            rng_stagger = self.xp.less(self.xp.random.random(len(ids)), 0.5) * ~self.occupied[binding_sites+1]
+            rng_dir = self.xp.less(self.rng.random(len(ids)), 0.5)
+            rng_stagger = self.xp.less(self.rng.random(len(ids)), 0.5) * ~self.occupied[binding_sites+1]
 
             self.positions[ids] = binding_sites[:, None]
             self.positions[ids, 1] = self.xp.where(rng_stagger,
                                                    self.positions[ids, 1] + 1,
                                                    self.positions[ids, 1])
                                                    
-            self.directions[ids] = rng_dir.astype(self.xp.uint32)
+            self.directions[ids] = rng_dir.astype(self.directions.dtype)
                                                            
         return ids
                                                                                 
         
     def death(self, bound_state_id):
     
+        types = self.get_site_types(self.positions)
+        
         death_prob = self.xp.where(self.stalled,
-                                   self.stalled_death_prob[self.positions],
-                                   self.death_prob[self.positions])
+                                   self.stalled_death_prob[types],
+                                   self.death_prob[types])
         death_prob = self.xp.max(death_prob, axis=1)
         
-        rng = self.xp.less(self.xp.random.random(self.number), death_prob)
+        rng = self.xp.less(self.rng.random(self.number), death_prob)
         ids = self.xp.flatnonzero(rng * self.xp.equal(self.states, bound_state_id))
         
         return ids
@@ -86,16 +132,275 @@ class BaseExtruder(NullExtruder.NullExtruder):
         self.unload(ids_death)
 
 
+    def update_occupancies(self):
+    
+        sites = super().update_occupancies()
+        
+        # Index updates are batched until the next loading step, which applies the net change at each touched site
+        if self.site_index_engine is not None:
+            self.pending_sites.append(sites)
+            
+        return sites
+        
+        
+    def update_site_index(self):
+    
+        # Stale indices are rebuilt in full, as the sites changed since they were last kept in step are not known
+        if self.site_index_stale:
+            self.reset_site_index()
+    
+        elif self.site_index_engine is not None and len(self.pending_sites) > 0:
+            self.site_index_engine(self, self.xp.concatenate(self.pending_sites))
+            
+        self.pending_sites = []
+        
+        
+    def reset_site_index(self):
+    
+        if self.site_index_engine is not None:
+            self.site_index_engine(self)
+            
+        self.pending_sites = []
+        self.site_index_stale = False
+            
+            
+    def set_checkpoint(self, checkpoint):
+    
+        super().set_checkpoint(checkpoint)
+        self.reset_site_index()
+        
+
+    def get_transition_matrix(self, type_weights, unbound_state_id=0, bound_state_id=1):
+    
+        birth_prob = self.get_array(self.birth_prob).astype(np.float64)
+        death_prob = self.get_array(self.death_prob).astype(np.float64)
+        
+        # Unbound LEFs load with the mean birth probability of the sites they pick from
+        is_loading = np.greater(birth_prob, 0)
+        loading_weight = type_weights[is_loading].sum()
+        
+        matrix = np.zeros((2, 2))
+        
+        if loading_weight > 0:
+            matrix[unbound_state_id, bound_state_id] = (type_weights * birth_prob)[is_loading].sum() / loading_weight
+            
+        matrix[bound_state_id, unbound_state_id] = (type_weights * death_prob).sum()
+        
+        np.fill_diagonal(matrix, 1 - matrix.sum(axis=1))
+        
+        return matrix
+        
+        
+    def get_type_weights(self, group):
+    
+        lo, hi = self.get_list(self.group_bounds[group:group+2])
+        site_types = self.get_array(self.get_site_types(self.sites[lo:hi]))
+        
+        return np.bincount(site_types, minlength=len(self.birth_prob)) / max(hi-lo, 1)
+        
+        
+    def get_stationary_distribution(self, matrix):
+    
+        # Solves probs @ matrix = probs together with the normalisation of probs
+        system = np.vstack([matrix.T - np.eye(len(matrix)), np.ones(len(matrix))])
+        target = np.zeros(len(matrix)+1)
+        target[-1] = 1
+        
+        probs = np.clip(np.linalg.lstsq(system, target, rcond=None)[0], 0, None)
+        
+        return probs / probs.sum()
+        
+        
+    def sample_states(self, unbound_state_id=0, bound_state_id=1):
+    
+        LEF_groups = self.get_array(self.LEF_groups)
+        
+        rngs = self.get_array(self.rng.random(self.number)).astype(np.float64)
+        states = np.full(self.number, unbound_state_id, dtype=np.int32)
+        
+        for group in range(len(self.group_bounds)-1):
+            ids = np.flatnonzero(np.equal(LEF_groups, group))
+            
+            matrix = self.get_transition_matrix(self.get_type_weights(group), unbound_state_id, bound_state_id)
+            probs = self.get_stationary_distribution(matrix)
+            
+            states[ids] = np.minimum(np.searchsorted(np.cumsum(probs), rngs[ids], side='right'), len(probs)-1)
+            
+        return states
+        
+        
+    def get_velocities(self, unbound_state_id=0, bound_state_id=1, active_state_id=1):
+    
+        LEF_groups = self.get_array(self.LEF_groups)
+        pause_prob = self.get_array(self.pause_prob).astype(np.float64)
+        
+        velocities = np.zeros(self.number)
+        
+        for group in range(len(self.group_bounds)-1):
+            type_weights = self.get_type_weights(group)
+            
+            matrix = self.get_transition_matrix(type_weights, unbound_state_id, bound_state_id)
+            probs = self.get_stationary_distribution(matrix)
+            
+            # Bound LEFs only extrude in the active state, and when they are not paused
+            if probs[unbound_state_id] < 1:
+                velocity = probs[active_state_id] / (1 - probs[unbound_state_id]) * (1 - type_weights @ pause_prob)
+                velocities[np.equal(LEF_groups, group)] = velocity
+                
+        return velocities
+        
+        
+    def get_unbinding_probs(self, unbound_state_id=0, bound_state_id=1):
+    
+        unbinding_probs = np.zeros(len(self.group_bounds)-1)
+        
+        for group in range(len(unbinding_probs)):
+            matrix = self.get_transition_matrix(self.get_type_weights(group), unbound_state_id, bound_state_id)
+            probs = self.get_stationary_distribution(matrix)
+            
+            # Bound LEFs unbind at the mean rate flux / bound_fraction, so that their bound lifetimes are geometric
+            # with that probability per step - exactly so with two states, and on average with more
+            flux = probs[unbound_state_id] * matrix[unbound_state_id, bound_state_id]
+            
+            if flux > 0:
+                unbinding_probs[group] = min(flux / (1 - probs[unbound_state_id]), 1.)
+                
+        return unbinding_probs
+        
+        
+    def get_relaxation_steps(self, unbound_state_id=0, bound_state_id=1):
+    
+        unbinding_probs = self.get_unbinding_probs(unbound_state_id, bound_state_id)
+        unbinding_probs = unbinding_probs[np.greater(unbinding_probs, 0)]
+        
+        # About one mean bound lifetime of the longest-lived group, over which loops placed from steady state settle
+        # into the jams that legs build up at barriers
+        return int(np.ceil(1 / unbinding_probs.min())) if len(unbinding_probs) > 0 else 0
+        
+        
+    def sample_leg_steps(self, states, directions, velocities, mode, unbound_state_id=0, bound_state_id=1):
+    
+        LEF_groups = self.get_array(self.LEF_groups)
+        
+        rngs = self.get_array(self.rng.random(self.number, 2)).astype(np.float64)
+        steps = np.zeros(self.number)
+        
+        # The time since binding of bound LEFs is geometric with their mean bound lifetime
+        for group, unbinding_prob in enumerate(self.get_unbinding_probs(unbound_state_id, bound_state_id)):
+            ids = np.flatnonzero(np.equal(LEF_groups, group) & np.not_equal(states, unbound_state_id))
+            
+            if unbinding_prob > 0:
+                with np.errstate(divide='ignore'):
+                    ages = np.floor(np.log1p(-rngs[ids, 0]) / np.log1p(-unbinding_prob)) + 1
+                    
+                steps[ids] = ages * velocities[ids]
+                
+        # Steps are rounded at random, so that their mean is kept
+        steps = np.floor(steps + rngs[:, 1]).astype(np.int64)
+        
+        leg_steps = np.zeros((self.number, 2), dtype=np.int64)
+        
+        if mode == "asymmetric":
+            leg_steps[np.arange(self.number), directions] = steps
+            
+        else:
+            leg_steps[...] = steps[:, None]
+            
+        return leg_steps
+        
+        
+    def sample_barrier_delays(self):
+    
+        site_types = self.get_array(self.get_site_types())
+        
+        diffusion_prob = self.get_array(self.diffusion_prob).astype(np.float64)
+        pause_prob = self.get_array(self.pause_prob).astype(np.float64)
+        
+        # Stalled legs are freed by the outward half of their diffusion moves, or by their CTCF unbinding
+        release_prob = diffusion_prob[site_types] / 2
+        
+        if hasattr(self.barrier_engine, 'death_prob'):
+            release_prob = release_prob + self.get_array(self.barrier_engine.death_prob).astype(np.float64)[site_types]
+            
+        release_prob = np.minimum(release_prob, 1)
+        delays = []
+        
+        for stall in [self.barrier_engine.stall_left, self.barrier_engine.stall_right]:
+            stall = self.get_array(stall).astype(np.float64)
+            rngs = self.get_array(self.rng.random(2, self.lattice_size)).astype(np.float64)
+            
+            # Legs reaching a barrier stall there before stepping on past it with this probability,
+            # and are then held for a geometric number of steps
+            move = (1 - stall) * (1 - pause_prob[site_types])
+            stop_prob = np.divide(stall, stall + move, out=np.zeros(self.lattice_size), where=np.greater(stall, 0))
+            
+            with np.errstate(divide='ignore'):
+                delay = np.floor(np.log1p(-rngs[1]) / np.log1p(-release_prob))
+                
+            # Sites that let legs pass are marked with a delay of -1
+            delays.append(np.where(np.less(rngs[0], stop_prob), delay, -1))
+            
+        return delays
+        
+        
+    def place_loops(self, states, leg_steps, velocities, max_attempts=64, unbound_state_id=0):
+    
+        site_types = self.get_array(self.get_site_types())
+        group_bounds = self.get_array(self.group_bounds)
+        
+        birth_prob = self.get_array(self.birth_prob).astype(np.float64)
+        
+        states = states.copy()
+        delays = self.sample_barrier_delays()
+        
+        rngs = self.get_array(self.rng.random(self.number, max_attempts)).astype(np.float64)
+        loading_weights = np.zeros(self.lattice_size)
+        
+        for lo, hi in zip(group_bounds[:-1], group_bounds[1:]):
+            loading_weights[lo:hi] = np.cumsum(birth_prob[site_types[lo:hi]])
+        
+        # Younger loops go first, and older ones extrude around them until their legs run into a neighbour or run
+        # out of steps
+        bound_ids = np.flatnonzero(np.not_equal(states, unbound_state_id))
+        order = bound_ids[np.argsort(leg_steps[bound_ids].sum(axis=1), kind='stable')]
+        
+        positions, stalled = self.placement_engine(self, order, rngs, leg_steps.astype(np.int64),
+                                                   velocities.astype(np.float64), loading_weights, delays, states,
+                                                   unbound_state_id)
+            
+        return states, positions, stalled
+        
+        
+    def initialize_steady_state(self, mode, unbound_state_id=0, bound_state_id=1, active_state_id=1, max_attempts=64):
+    
+        directions = np.less(self.get_array(self.rng.random(self.number)), 0.5).astype(np.int64)
+        
+        states = self.sample_states(unbound_state_id, bound_state_id)
+        velocities = self.get_velocities(unbound_state_id, bound_state_id, active_state_id)
+        
+        leg_steps = self.sample_leg_steps(states, directions, velocities, mode, unbound_state_id, bound_state_id)
+        states, positions, stalled = self.place_loops(states, leg_steps, velocities, max_attempts, unbound_state_id)
+        
+        # Arrays are filled in place, since they may live in shared memory
+        self.states[...] = self.xp.asarray(states)
+        self.positions[...] = self.xp.asarray(positions)
+        
+        self.stalled[...] = self.xp.asarray(stalled).astype(self.stalled.dtype)
+        self.directions[...] = self.xp.asarray(directions).astype(self.directions.dtype)
+        
+        self.reset_occupancies()
+        self.reset_site_index()
+        
+
     def diffusion_step(self, unbound_state_id=0, **kwargs):
     
-        self.update_occupancies()
         self.diffusion_engine(self, unbound_state_id, **kwargs)
                 
 
     def extrusion_step(self, mode, unbound_state_id=0, bound_state_id=1, active_state_id=1, **kwargs):
     
-        self.update_occupancies()
         self.update_states(unbound_state_id, bound_state_id)
+        self.update_occupancies()
 
         self.stepping_engine(self, mode, active_state_id, **kwargs)
 
@@ -1,125 +1,546 @@
-import warnings
+import types
+
+import numpy as np
 
 from .engines.DiffusionEngines import _diffusion_step_cpu, _diffusion_step_gpu
 from .engines.SymmetricEngines import _symmetric_step_cpu, _symmetric_step_gpu
 from .engines.AsymmetricEngines import _asymmetric_step_cpu, _asymmetric_step_gpu
+from .engines.FusedEngines import _fused_steps_cpu, event_names
+from .engines.TransitionEngines import _transition_step_cpu, _transition_step_gpu
+from .engines.LoadingEngines import _build_site_index_cpu, _update_site_index_cpu, _load_free_sites_cpu
+from .engines.PlacementEngines import _place_loops_cpu
+
+
+engine_registry = {}
+
+# The CUDA sources are written against these types, and compiled once for each layout
+cuda_types = {False: {'real_t': 'double', 'real2_t': 'double2', 'real3_t': 'double3', 'real4_t': 'double4',
+					  'flag_t': 'unsigned int', 'flag2_t': 'uint2'},
+			  True: {'real_t': 'float', 'real2_t': 'float2', 'real3_t': 'float3', 'real4_t': 'float4',
+					 'flag_t': 'unsigned char', 'flag2_t': 'uchar2'}}
+
+
+def launch_cpu(kernel, N, args, threads_per_block):
+
+	kernel(*args)
+	
+	
+def launch_cuda(kernel, N, args, threads_per_block):
+
+	num_blocks = (N+threads_per_block-1) // threads_per_block
+	kernel((num_blocks,), (threads_per_block,), args)
+
+
+def register_backend(name, loader, device='CPU', launcher=launch_cpu):
+
+	engine_registry[name] = {'loader': loader,
+							 'device': device,
+							 'launcher': launcher,
+							 'engines': None}
+							 
+							 
+def load_backend(name):
+
+	if name not in engine_registry:
+		raise RuntimeError("Unknown backend '%s' - available backends are %s" % (name, list(engine_registry)))
+		
+	backend = engine_registry[name]
 	
-try:
-    import cupy as cp
-    
-    diffusion_step_cuda = cp.RawKernel(_diffusion_step_gpu(), '_diffusion_step_gpu', options=('--use_fast_math',))
-    symmetric_step_cuda = cp.RawKernel(_symmetric_step_gpu(), '_symmetric_step_gpu', options=('--use_fast_math',))
-    asymmetric_step_cuda = cp.RawKernel(_asymmetric_step_gpu(), '_asymmetric_step_gpu', options=('--use_fast_math',))
-    
-    cuda_engines = {'diffusion' : diffusion_step_cuda,
-                    'symmetric' : symmetric_step_cuda,
-                    'asymmetric' : asymmetric_step_cuda}
-
-except:
-    pass
-    
-try:
-    import numba as nb
-    use_numba = True
-
-    diffusion_step_numba = nb.njit(fastmath=True)(_diffusion_step_cpu)
-    symmetric_step_numba = nb.njit(fastmath=True)(_symmetric_step_cpu)
-    asymmetric_step_numba = nb.njit(fastmath=True)(_asymmetric_step_cpu)
-    
-    numba_engines = {'diffusion' : diffusion_step_numba,
-                     'symmetric' : symmetric_step_numba,
-                     'asymmetric' : asymmetric_step_numba}
-
-except ImportError:
-    use_numba = False
-
-    diffusion_step = _diffusion_step_cpu
-    symmetric_step = _symmetric_step_cpu
-    asymmetric_step = _asymmetric_step_cpu
-    
-    python_engines = {'diffusion' : diffusion_step,
-                      'symmetric' : symmetric_step,
-                      'asymmetric' : asymmetric_step}
-
-
-def DiffusionEngine(sim, unbound_state_id, threads_per_block=256, **kwargs):
-
-	rngs = sim.xp.random.random((sim.number, 3)).astype(sim.xp.float64)
-	args = tuple([unbound_state_id,
-				  rngs,
-				  sim.number,
-				  0, sim.lattice_size,
-				  sim.states,
-				  sim.occupied,
-				  sim.stalled,
-				  sim.diffusion_prob,
-				  sim.positions])
-				  
-	if sim.xp.__name__ == 'cupy':
-		num_blocks = (sim.number+threads_per_block-1) // threads_per_block
-		
-		warnings.warn("Running lattice diffusion on the GPU")
-		cuda_engines['diffusion']((num_blocks,), (threads_per_block,), args)
-		
-	elif sim.xp.__name__ == 'numpy':
-		if use_numba:
-			warnings.warn("Running lattice diffusion on the CPU using Numba")
-			numba_engines['diffusion'](*args)
+	if backend['engines'] is None:
+		backend['engines'] = backend['loader']()
+		
+	return backend
+	
+	
+def get_kernel(engines, name, compact=False):
+
+	# CPU kernels specialise on the array dtypes by themselves, CUDA kernels come in a separate compact build
+	if compact and ('%s/compact' % name) in engines['engines']:
+		return engines['engines']['%s/compact' % name]
+		
+	return engines['engines'][name]
+	
+	
+def available_backends(device=None):
+
+	backends = []
+	
+	for name, backend in engine_registry.items():
+		if device in [None, backend['device']]:
+			try:
+				load_backend(name)
+				backends.append(name)
+				
+			except ImportError:
+				pass
+				
+	return backends
+	
+	
+def resolve_backend(backend, device='CPU'):
+
+	if backend is None:
+		backends = available_backends(device)
+		
+		if len(backends) == 0:
+			raise RuntimeError("No backend available for device %s" % device)
 			
-		else:
-			warnings.warn("Running lattice diffusion on the CPU using pure Python backend")
-			python_engines['diffusion'](*args)
+		backend = backends[0]
+		
+	if engine_registry.get(backend, {}).get('device', device) != device:
+		raise RuntimeError("Backend '%s' cannot run on device %s" % (backend, device))
+		
+	load_backend(backend)
+		
+	return backend
+
+
+def load_python_engines():
+
+	return {'diffusion' : _diffusion_step_cpu,
+			'symmetric' : _symmetric_step_cpu,
+			'asymmetric' : _asymmetric_step_cpu,
+			'transitions' : _transition_step_cpu,
+			'fused' : _fused_steps_cpu,
+			'build_site_index' : _build_site_index_cpu,
+			'update_site_index' : _update_site_index_cpu,
+			'loading' : _load_free_sites_cpu,
+			'place_loops' : _place_loops_cpu}
+			
+
+def compile_numba_kernel(nb, kernel, parallel, compiled):
 
-	sim.update_occupancies()
+	scope = dict(kernel.__globals__)
+	calls_parallel = False
+	
+	# Helpers a kernel calls from its own module are compiled once per backend, and bound in its globals in place
+	# of their Python versions
+	for name in kernel.__code__.co_names:
+		helper = kernel.__globals__.get(name)
+		
+		if isinstance(helper, types.FunctionType) and helper.__module__ == kernel.__module__:
+			if helper not in compiled:
+				compiled[helper] = compile_numba_kernel(nb, helper, parallel, compiled)
+				
+			scope[name] = compiled[helper]
+			calls_parallel |= compiled[helper].py_func.__qualname__.endswith('_parallel')
+			
+	uses_prange = parallel and ('prange' in kernel.__code__.co_names)
+	
+	if parallel:
+		scope['prange'] = nb.prange
+		
+	kernel = types.FunctionType(kernel.__code__, scope, kernel.__name__)
+	
+	# The disk cache is keyed on the function name and bytecode, not on the compilation flags or the helpers called
+	if uses_prange or calls_parallel:
+		kernel.__qualname__ = '%s_parallel' % kernel.__qualname__
+		
+	return nb.njit(fastmath=True, parallel=uses_prange, cache=True)(kernel)
+
+
+def load_numba_engines():
+
+	import numba as nb
+	
+	# Kernels are compiled on first call for the dtypes they are given, and cached on disk for later processes
+	compiled = {}
+	
+	return {name: compile_numba_kernel(nb, kernel, False, compiled) for name, kernel in load_python_engines().items()}
+	
+
+def load_numba_parallel_engines():
+
+	import numba as nb
+	
+	# Loops over prange run in parallel, in the kernels themselves or in the helpers they call
+	compiled = {}
+	
+	return {name: compile_numba_kernel(nb, kernel, True, compiled) for name, kernel in load_python_engines().items()}
+	
+
+def load_cuda_engines():
+
+	import cupy as cp
+	
+	if not cp.cuda.is_available():
+		raise ImportError("Could not load CUDA environment")
+	
+	sources = {'diffusion' : _diffusion_step_gpu,
+			   'symmetric' : _symmetric_step_gpu,
+			   'asymmetric' : _asymmetric_step_gpu,
+			   'transitions' : _transition_step_gpu}
+			   
+	engines = {}
+	
+	for name, source in sources.items():
+		for compact, suffix in [(False, ''), (True, '/compact')]:
+			header = ''.join('typedef %s %s;\n' % (ctype, alias) for alias, ctype in cuda_types[compact].items())
+			engines[name + suffix] = cp.RawKernel(header + source(), source.__name__, options=('--use_fast_math',))
+			
+	return engines
+
+
+# Backends are tried in registration order when none is requested explicitly
+register_backend('cuda', load_cuda_engines, device='GPU', launcher=launch_cuda)
+register_backend('numba', load_numba_engines)
+register_backend('numba_parallel', load_numba_parallel_engines)
+register_backend('python', load_python_engines)
+
+
+def site_type_args(engines, sim):
+
+	# The type array covers a single replica - CUDA kernels are given its length, CPU kernels read it off the array
+	if engines['device'] == 'GPU':
+		return [sim.site_types, len(sim.site_types)]
+		
+	return [sim.site_types]
+
+
+def DiffusionEngine(backend, compact=False):
+
+	engines = load_backend(backend)
+	
+	kernel = get_kernel(engines, 'diffusion', compact)
+	launch = engines['launcher']
+	
+	# The CPU kernels draw two numbers per leg, the CUDA kernel picks a single leg per LEF
+	rng_width = 3 if engines['device'] == 'GPU' else 4
+
+	def engine(sim, unbound_state_id, threads_per_block=256, **kwargs):
+
+		rngs = sim.rng.random(sim.number, rng_width)
+		args = tuple([unbound_state_id,
+					  rngs,
+					  sim.number,
+					  0, sim.lattice_size,
+					  sim.states,
+					  sim.occupied,
+					  sim.stalled,
+					  *site_type_args(engines, sim),
+					  sim.diffusion_prob,
+					  sim.positions])
+					  
+		launch(kernel, sim.number, args, threads_per_block)
+		sim.update_occupancies()
+		
+	return engine
 			                
 
-def SteppingEngine(sim, mode, active_state_id, threads_per_block=256, **kwargs):
+def SteppingEngine(backend, compact=False):
+
+	engines = load_backend(backend)
+	
+	kernels = {mode: get_kernel(engines, mode, compact) for mode in ["symmetric", "asymmetric"]}
+	launch = engines['launcher']
+
+	def engine(sim, mode, active_state_id, threads_per_block=256, **kwargs):
 			      
-	if mode == "symmetric":
-		rngs = sim.xp.random.random((sim.number, 4)).astype(sim.xp.float64)
-		args = tuple([active_state_id,
-			          rngs,
-			          sim.number,
-			          0, sim.lattice_size,
-			          sim.states,
-			          sim.occupied,
-			          sim.barrier_engine.stall_left,
-			          sim.barrier_engine.stall_right,
-			          sim.pause_prob,
-			          sim.positions,
-			          sim.stalled])
-
-	elif mode == "asymmetric":
-		rngs = sim.xp.random.random((sim.number, 2)).astype(sim.xp.float64)
-		args = tuple([active_state_id,
-			          rngs,
-			          sim.number,
-			          0, sim.lattice_size,
-			          sim.states,
-			          sim.occupied,
-			          sim.directions,
-			          sim.barrier_engine.stall_left,
-			          sim.barrier_engine.stall_right,
-			          sim.pause_prob,
-			          sim.positions,
-			          sim.stalled])
+		if mode == "symmetric":
+			rngs = sim.rng.random(sim.number, 4)
+			args = tuple([active_state_id,
+						  rngs,
+						  sim.number,
+						  0, sim.lattice_size,
+						  sim.states,
+						  sim.occupied,
+						  sim.barrier_engine.stall_left,
+						  sim.barrier_engine.stall_right,
+						  *site_type_args(engines, sim),
+						  sim.pause_prob,
+						  sim.positions,
+						  sim.stalled])
 
-	else:
-		raise RuntimeError("Unsupported mode '%s'" % mode)
+		elif mode == "asymmetric":
+			rngs = sim.rng.random(sim.number, 2)
+			args = tuple([active_state_id,
+						  rngs,
+						  sim.number,
+						  0, sim.lattice_size,
+						  sim.states,
+						  sim.occupied,
+						  sim.directions,
+						  sim.barrier_engine.stall_left,
+						  sim.barrier_engine.stall_right,
+						  *site_type_args(engines, sim),
+						  sim.pause_prob,
+						  sim.positions,
+						  sim.stalled])
+
+		else:
+			raise RuntimeError("Unsupported mode '%s'" % mode)
+			
+		launch(kernels[mode], sim.number, args, threads_per_block)
+		sim.update_occupancies()
 		
-	if sim.xp.__name__ == 'cupy':
-		num_blocks = (sim.number+threads_per_block-1) // threads_per_block
+	return engine
+
+
+def TransitionEngine(backend, compact=False):
+
+	engines = load_backend(backend)
+	
+	kernel = get_kernel(engines, 'transitions', compact)
+	launch = engines['launcher']
+
+	def engine(sim, unbound_state_id, threads_per_block=256, **kwargs):
+
+		rngs = sim.rng.random(sim.number)
+		new_states = sim.xp.full(sim.number, -1, dtype=sim.xp.int32)
 		
-		warnings.warn("Running lattice extrusion on the GPU")
-		cuda_engines[mode]((num_blocks,), (threads_per_block,), args)
+		args = [rngs,
+				sim.number,
+				unbound_state_id,
+				sim.death_state_id,
+				sim.states,
+				sim.positions,
+				sim.stalled,
+				*site_type_args(engines, sim),
+				sim.state_offsets,
+				sim.transition_products,
+				sim.transition_probs,
+				sim.death_prob,
+				sim.stalled_death_prob,
+				new_states]
 				
-	elif sim.xp.__name__ == 'numpy':
-		if use_numba:
-			warnings.warn("Running lattice extrusion on the CPU using Numba")
-			numba_engines[mode](*args)
+		# The CUDA kernel indexes the flattened transition table, so it also needs the number of site types
+		if engines['device'] == 'GPU':
+			args.insert(2, len(sim.death_prob))
+					  
+		launch(kernel, sim.number, tuple(args), threads_per_block)
+		
+		return new_states
+		
+	return engine
+
+
+def FusedEngine(backend):
+
+	engines = load_backend(backend)
+	
+	if 'fused' not in engines['engines']:
+		return None
+	
+	kernel = engines['engines']['fused']
+	launch = engines['launcher']
 
+	def engine(sim, N, mode, unbound_state_id=0, bound_state_id=1, max_attempts=64, threads_per_block=256, **kwargs):
+
+		if mode not in ["symmetric", "asymmetric"]:
+			raise RuntimeError("Unsupported mode '%s'" % mode)
+			
+		barrier = sim.barrier_engine
+		
+		ctcf_states_left = getattr(barrier, 'states_left', barrier.stall_left)
+		ctcf_states_right = getattr(barrier, 'states_right', barrier.stall_right)
+		
+		ctcf_birth_prob = getattr(barrier, 'birth_prob', barrier.stall_left)
+		ctcf_death_prob = getattr(barrier, 'death_prob', barrier.stall_left)
+		
+		ctcf_event_left = getattr(barrier, 'event_left', sim.ctcf_sites_left)
+		ctcf_event_right = getattr(barrier, 'event_right', sim.ctcf_sites_right)
+		
+		counts = sim.xp.zeros(len(event_names), dtype=sim.xp.int64)
+
+		args = tuple([N,
+					  mode == "asymmetric",
+					  sim.rng.generator,
+					  unbound_state_id,
+					  bound_state_id,
+					  sim.number,
+					  max_attempts,
+					  sim.states,
+					  sim.occupied,
+					  sim.site_owners,
+					  sim.site_types,
+					  sim.directions,
+					  sim.positions,
+					  sim.stalled,
+					  sim.dying,
+					  sim.previous_positions,
+					  sim.loading_sites,
+					  sim.LEF_groups,
+					  sim.loading_bounds,
+					  sim.birth_prob,
+					  sim.death_prob,
+					  sim.stalled_death_prob,
+					  sim.diffusion_prob,
+					  sim.pause_prob,
+					  barrier.stall_left,
+					  barrier.stall_right,
+					  sim.ctcf_sites_left,
+					  sim.ctcf_sites_right,
+					  ctcf_states_left,
+					  ctcf_states_right,
+					  ctcf_birth_prob,
+					  ctcf_death_prob,
+					  ctcf_event_left,
+					  ctcf_event_right,
+					  getattr(barrier, 'clock', 0),
+					  counts])
+					  
+		launch(kernel, sim.number, args, threads_per_block)
+		
+		# Events the batched engines report through separate calls are counted inside the kernel
+		return dict(zip(event_names, counts.tolist()))
+		
+	return engine
+
+
+def SiteIndexEngine(backend):
+
+	engines = load_backend(backend)
+	
+	if 'update_site_index' not in engines['engines']:
+		return None
+	
+	kernels = engines['engines']
+	launch = engines['launcher']
+
+	def engine(sim, sites=None, threads_per_block=256):
+	
+		index_arrays = [sim.occupied,
+						sim.site_types,
+						sim.birth_prob,
+						sim.site_weights,
+						sim.tree_weights,
+						sim.tree_counts]
+	
+		if sites is None:
+			args = tuple([sim.lattice_size, sim.site_block_size] + index_arrays)
+			launch(kernels['build_site_index'], sim.lattice_size, args, threads_per_block)
+			
 		else:
-			warnings.warn("Running lattice extrusion on the CPU using pure Python backend")
-			python_engines[mode](*args)
+			args = tuple([sites, len(sites), sim.site_block_size] + index_arrays)
+			launch(kernels['update_site_index'], len(sites), args, threads_per_block)
+		
+	return engine
+
+
+def LoadingEngine(backend):
+
+	engines = load_backend(backend)
+	
+	if 'loading' not in engines['engines']:
+		return None
+	
+	kernel = engines['engines']['loading']
+	launch = engines['launcher']
+
+	def engine(sim, ids, threads_per_block=256):
+	
+		number = len(ids)
+		
+		rngs = sim.rng.random(number, 2)
+		sites = sim.xp.full(number, -1, dtype=sim.xp.int32)
+		
+		prefix_weights = sim.xp.zeros(len(sim.group_bounds), dtype=sim.xp.float64)
+		prefix_counts = sim.xp.zeros(len(sim.group_bounds), dtype=sim.xp.int64)
+		
+		args = tuple([rngs,
+					  number,
+					  sim.lattice_size,
+					  sim.site_block_size,
+					  sim.site_weights,
+					  sim.tree_weights,
+					  sim.tree_counts,
+					  sim.LEF_groups[ids],
+					  sim.group_bounds,
+					  prefix_weights,
+					  prefix_counts,
+					  sites])
+					  
+		launch(kernel, number, args, threads_per_block)
+		
+		# Sites are returned per LEF, with -1 for those that did not load
+		return sites
+		
+	return engine
+
+
+def PlacementEngine(backend):
+
+	engines = load_backend(backend)
+	
+	# Loops are laid out on the host, so that backends without a placement kernel borrow one from a CPU backend
+	if 'place_loops' not in engines['engines']:
+		engines = load_backend(available_backends('CPU')[0])
+	
+	kernel = engines['engines']['place_loops']
+	launch = engines['launcher']
+
+	def engine(sim, order, rngs, leg_steps, velocities, loading_weights, delays, states, unbound_state_id=0):
+	
+		positions = np.full((sim.number, 2), -1, dtype=np.int32)
+		stalled = np.zeros((sim.number, 2), dtype=bool)
+		
+		occupied = np.zeros(sim.lattice_size, dtype=bool)
+		occupied[sim.get_array(sim.chromosome_bounds)] = True
+		
+		args = tuple([order,
+					  rngs.shape[1],
+					  unbound_state_id,
+					  rngs,
+					  leg_steps,
+					  velocities,
+					  sim.get_array(sim.LEF_groups),
+					  sim.get_array(sim.group_bounds),
+					  loading_weights,
+					  delays[0],
+					  delays[1],
+					  occupied,
+					  states,
+					  positions,
+					  stalled])
+					  
+		launch(kernel, len(order), args, 1)
+		
+		# Host arrays, with states of LEFs that found no free sites set to unbound in place
+		return positions, stalled
+		
+	return engine
+
+
+def warmup(backend=None, mode="symmetric", compact=False, lattice_size=512, number=8, steps=4):
+
+	from . import BaseExtruder, FusedExtruder, MultistateExtruder
+	from ..boundaries import StaticBoundary, DynamicBoundary
+	from ..RandomStream import RandomStream
+	
+	device = engine_registry.get(backend, {}).get('device', 'CPU')
+	backend = resolve_backend(backend, device)
+	
+	if device == 'GPU':
+		import cupy as xp
+		
+	else:
+		import numpy as xp
+	
+	# Runs every engine once on a small lattice, which compiles the kernels for this backend, mode and dtype layout
+	real_dtype = xp.float32 if compact else xp.float64
+	table = lambda value: xp.asarray([value, 0], dtype=real_dtype)
+	
+	stall = xp.zeros(lattice_size, dtype=xp.float32)
+	stall[lattice_size//4::lattice_size//4] = 1
+	
+	site_types = xp.zeros(lattice_size // 2, dtype=xp.uint8)
+	
+	LEF_arrays = [table(0.1), table(0.01), table(0.01), table(0.01), table(0.1)]
+	LEF_transition_dict = {"LEF_states": {'RN': 1, 'RB': 2},
+						   "LEF_transitions": {'12': table(0.1), '21': table(0.1)}}
+	
+	extruders = [BaseExtruder.BaseExtruder, FusedExtruder.FusedExtruder, MultistateExtruder.MultistateExtruder]
+	boundaries = [StaticBoundary.StaticBoundary, DynamicBoundary.DynamicBoundary]
+	
+	for boundary in boundaries:
+		for extruder in extruders:
+			rng = RandomStream(xp, 0, dtype=real_dtype)
+			barrier_engine = boundary(stall, stall.copy(), table(0.1), table(0.1), site_types=site_types, rng=rng)
+			
+			extrusion_engine = extruder(number, barrier_engine, [0, -1], *LEF_arrays, **LEF_transition_dict,
+										backend=backend, compact=compact)
+			
+			extrusion_engine.initialize_steady_state(mode)
+			extrusion_engine.steps(steps, mode)
 			
-	sim.update_occupancies()
+	return backend
@@ -0,0 +1,64 @@
+from . import BaseExtruder, EngineFactory
+    
+
+class FusedExtruder(BaseExtruder.BaseExtruder):
+
+    def __init__(self,
+                 number,
+                 barrier_engine,
+                 chromosome_bounds,
+                 birth_prob,
+                 death_prob,
+                 stalled_death_prob,
+                 diffusion_prob,
+                 pause_prob,
+                 *args, **kwargs):
+    
+        super().__init__(number,
+                         barrier_engine,
+                         chromosome_bounds,
+                         birth_prob,
+                         death_prob,
+                         stalled_death_prob,
+                         diffusion_prob,
+                         pause_prob,
+                         **kwargs)
+        
+        self.fused_engine = EngineFactory.FusedEngine(self.backend)
+        self.dying = self.xp.zeros(self.number, dtype=bool)
+
+        self.loading_sites = self.xp.flatnonzero(self.xp.greater(self.birth_prob[self.get_site_types()], 0)).astype(self.xp.int32)
+        self.loading_bounds = self.xp.searchsorted(self.loading_sites, self.group_bounds).astype(self.xp.int64)
+        
+        if hasattr(barrier_engine, 'sites_left'):
+            self.ctcf_sites_left = barrier_engine.sites_left
+            self.ctcf_sites_right = barrier_engine.sites_right
+            
+        else:
+            self.ctcf_sites_left = self.xp.zeros(0, dtype=self.xp.int64)
+            self.ctcf_sites_right = self.xp.zeros(0, dtype=self.xp.int64)
+
+            # Static barriers hold on to their input arrays, which are read-only when shared or cached,
+            # while the fused kernel is compiled against writable barrier arrays
+            barrier_engine.stall_left = barrier_engine.stall_left.copy()
+            barrier_engine.stall_right = barrier_engine.stall_right.copy()
+        
+        
+    def steps(self, N, mode, **kwargs):
+    
+        if self.fused_engine is None:
+            super().steps(N, mode, **kwargs)
+            
+        elif N > 0:
+            self.fused_engine(self, N, mode, **kwargs)
+            self.previous_positions[...] = self.positions
+            
+            # The kernel loads LEFs without the site index, which is only rebuilt if a batched loading step needs it
+            self.site_index_stale = True
+            self.pending_sites = []
+            
+            # The kernel moves the barrier events on by itself, leaving the clock and the event heap behind
+            if hasattr(self.barrier_engine, 'events'):
+                self.barrier_engine.clock += N
+                self.barrier_engine.reset_events()
+
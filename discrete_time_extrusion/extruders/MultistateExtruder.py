@@ -1,4 +1,6 @@
-from . import BaseExtruder
+import numpy as np
+
+from . import BaseExtruder, EngineFactory
     
 
 class MultistateExtruder(BaseExtruder.BaseExtruder):
@@ -21,76 +23,87 @@ class MultistateExtruder(BaseExtruder.BaseExtruder):
                          death_prob,
                          stalled_death_prob,
                          diffusion_prob,
-                         pause_prob)
+                         pause_prob,
+                         **kwargs)
         
         self.state_dict = kwargs["LEF_states"]
         self.transition_dict = kwargs["LEF_transitions"]
         
-
-    def state_transitions(self, unbound_state_id):
+        self.transition_engine = EngineFactory.TransitionEngine(self.backend, self.compact)
+        self.compile_transitions()
         
-        ids_array = self.xp.zeros((len(self.state_dict), self.number), dtype=self.xp.int32)
-        products_array = self.xp.zeros((len(self.state_dict), self.number), dtype=self.xp.int32)
-            
-        for i, state_id in enumerate(self.state_dict.values()):
-            ctr = 0
-            buffer = 1 if state_id == min(self.state_dict.values()) else 2
-            
-            state_array = self.xp.zeros(buffer, dtype=self.xp.int32)
-            transition_array = self.xp.zeros((buffer, self.number), dtype=self.xp.float64)
-            
-            for ids, transition_prob in self.transition_dict.items():
-                if state_id == int(ids[0]):
-                    state_array[ctr] = int(ids[1])
-                    transition_array[ctr] = transition_prob[self.positions].max(axis=1)
-                    
-                    ctr += 1
-                    
-            if state_id == max(self.state_dict.values()):
-                death_prob = self.xp.where(self.stalled,
-                                           self.stalled_death_prob[self.positions],
-                                           self.death_prob[self.positions])
-                                      
-                state_array[-1] = unbound_state_id
-                transition_array[-1] = death_prob.max(axis=1)
-
-            rng = self.xp.random.random(self.number)
-            cumul_prob = self.xp.cumsum(transition_array, axis=0)
 
-            rng1 = self.xp.less(rng, cumul_prob[0])
-            rng2 = self.xp.logical_and(self.xp.less(rng, cumul_prob[-1]), ~rng1)
-            
-            product_states = self.xp.where(rng1, state_array[0], state_array[-1])
-            transition_mask = self.xp.logical_or(rng1, rng2) * self.xp.equal(self.states, state_id)
+    def compile_transitions(self):
+    
+        # Transitions are grouped by initial state, so that the outgoing transitions of state s
+        # are the rows state_offsets[s]:state_offsets[s+1] of the stacked probability table
+        transitions = sorted(self.transition_dict.items(), key=lambda transition: int(transition[0][0]))
+        number_of_states = max(self.state_dict.values()) + 1
         
-            ids = self.xp.flatnonzero(transition_mask)
-            products = product_states[ids]
-            
-            ids_array[i] = self.xp.r_[ids, self.xp.full(self.number-len(ids), -1, dtype=self.xp.int32)]
-            products_array[i] = self.xp.r_[products, self.xp.full(self.number-len(ids), -1, dtype=self.xp.int32)]
-            
-        return ids_array, products_array
+        sources = [int(ids[0]) for ids, _ in transitions]
+        offsets = [sum(source < state for source in sources) for state in range(number_of_states+1)]
+        
+        self.death_state_id = max(self.state_dict.values())
+        self.state_offsets = self.xp.asarray(offsets, dtype=self.xp.int32)
+        
+        self.transition_products = self.xp.asarray([int(ids[1]) for ids, _ in transitions], dtype=self.xp.int32)
+        self.transition_probs = self.xp.zeros((len(transitions), len(self.death_prob)), dtype=self.death_prob.dtype)
+        
+        for i, (_, transition_prob) in enumerate(transitions):
+            self.transition_probs[i] = transition_prob
             
         
     def update_states(self, unbound_state_id, bound_state_id):
         
-        ids_array, products_array = self.state_transitions(unbound_state_id)
-        rng = self.xp.less(self.xp.random.random(self.number), 0.5).astype(self.xp.uint32)
+        new_states = self.transition_engine(self, unbound_state_id)
+        rng = self.xp.less(self.rng.random(self.number), 0.5).astype(self.directions.dtype)
 
         ids_birth = self.birth(unbound_state_id)
         self.states[ids_birth] = bound_state_id
+        
+        ids = self.xp.flatnonzero(self.xp.greater_equal(new_states, 0))
+        products = new_states[ids]
 	
-        for ids, products in zip(ids_array, products_array):
-            is_product = self.xp.greater_equal(ids, 0)
-            is_active = self.xp.equal(products, self.state_dict['RN'])
-                        
-            self.states[ids[is_product]] = products[is_product]
-            self.directions[ids] = self.xp.where(is_product*is_active, rng, self.directions[ids])
+        self.states[ids] = products
+        
+        ids_active = ids[self.xp.equal(products, self.state_dict['RN'])]
+        self.directions[ids_active] = rng[ids_active]
             
         ids_death = ids[self.xp.equal(products, unbound_state_id)]
         self.unload(ids_death)
 
 
+    def get_transition_matrix(self, type_weights, unbound_state_id=0, bound_state_id=1):
+    
+        two_state_matrix = super().get_transition_matrix(type_weights, unbound_state_id, bound_state_id)
+        number_of_states = max(self.state_dict.values()) + 1
+        
+        offsets = self.get_array(self.state_offsets)
+        products = self.get_array(self.transition_products)
+        
+        transition_probs = self.get_array(self.transition_probs).astype(np.float64)
+        
+        # Unloading only happens from the death state, while loading always lands in the bound state
+        matrix = np.zeros((number_of_states, number_of_states))
+        
+        matrix[unbound_state_id, bound_state_id] = two_state_matrix[unbound_state_id, bound_state_id]
+        matrix[self.death_state_id, unbound_state_id] += two_state_matrix[bound_state_id, unbound_state_id]
+        
+        for t in range(len(products)):
+            source = np.searchsorted(offsets, t, side='right') - 1
+            matrix[source, products[t]] += transition_probs[t] @ type_weights
+            
+        np.fill_diagonal(matrix, 0)
+        np.fill_diagonal(matrix, 1 - matrix.sum(axis=1))
+        
+        return matrix
+        
+        
+    def initialize_steady_state(self, mode, **kwargs):
+    
+        super().initialize_steady_state(mode, active_state_id=self.state_dict['RN'], **kwargs)
+        
+
     def extrusion_step(self, mode, **kwargs):
     
         super().extrusion_step(mode, active_state_id=self.state_dict['RN'], **kwargs)
@@ -1,4 +1,6 @@
 class NullExtruder():
+
+    checkpoint_keys = ('positions', 'states', 'stalled', 'directions', 'occupied')
     
     def __init__(self,
                  number,
@@ -7,24 +9,41 @@ class NullExtruder():
                  *args, **kwargs):
             
         self.number = number
+        self.compact = kwargs.get('compact', False)
         self.barrier_engine = barrier_engine
         
         self.xp = barrier_engine.xp
+        self.rng = barrier_engine.rng
         self.get_list = barrier_engine.get_list
+        self.get_array = barrier_engine.get_array
         
+        self.site_types = barrier_engine.site_types
+        self.get_site_types = barrier_engine.get_site_types
         self.lattice_size = barrier_engine.lattice_size
         self.occupied = self.xp.zeros(self.lattice_size, dtype=bool)
         self.sites = self.xp.arange(self.lattice_size, dtype=self.xp.int32)
         
+        flag_dtype = self.xp.uint8 if self.compact else self.xp.uint32
+        
         self.states = self.xp.zeros(self.number, dtype=self.xp.int32)
-        self.directions = self.xp.zeros(self.number, dtype=self.xp.uint32)
+        self.directions = self.xp.zeros(self.number, dtype=flag_dtype)
         
-        self.stalled = self.xp.zeros((self.number, 2), dtype=self.xp.uint32)
+        self.stalled = self.xp.zeros((self.number, 2), dtype=flag_dtype)
         self.positions = self.xp.zeros((self.number, 2), dtype=self.xp.int32) - 1
         
         self.chromosome_bounds = self.xp.asarray(chromosome_bounds, dtype=self.xp.int32)
 
-        self.update_occupancies()
+        # LEFs only load within the sites of their own replica group
+        LEF_groups = kwargs.get('LEF_groups') or {"group_bounds": [0, self.lattice_size], "group_LEFs": [self.number]}
+        
+        self.group_bounds = self.xp.asarray(LEF_groups["group_bounds"], dtype=self.xp.int64)
+        self.LEF_groups = self.xp.repeat(self.xp.arange(len(LEF_groups["group_LEFs"]), dtype=self.xp.int32),
+                                         self.xp.asarray(LEF_groups["group_LEFs"]))
+
+        self.site_owners = self.xp.full(self.lattice_size, -1, dtype=self.xp.int32)
+        self.previous_positions = self.positions.copy()
+
+        self.reset_occupancies()
         
 
     def step(self, *args, **kwargs):
@@ -38,46 +57,95 @@ class NullExtruder():
             self.step(*args, **kwargs)
             
             
-    def resolve_overlaps(self):
+    def resolve_overlaps(self, ids, legs, previous_positions):
 		
-        leg_distance = self.xp.roll(self.positions, 1, axis=1) - self.positions
-        is_loop = self.xp.not_equal(leg_distance, 0)
+        # Scatter LEF ids onto the site index and read them back - a leg whose id got overwritten collided
+        # with a leg from another LEF, and is sent back to its previous site, which nobody else can have entered
+        positions = self.positions[ids, legs]
+        self.site_owners[positions] = ids
 		
-        ids = self.positions[is_loop]
-        _, first, counts = self.xp.unique(ids, return_index=True, return_counts=True)
+        lost = self.xp.not_equal(self.site_owners[positions], ids)
+        self.positions[ids[lost], legs[lost]] = previous_positions[lost]
         
-        first_dupl_ids = first[self.xp.greater(counts, 1)]
-        ids[first_dupl_ids] = self.xp.where(self.xp.mod(first_dupl_ids, 2),
-                                            ids[first_dupl_ids]-1,
-                                            ids[first_dupl_ids]+1)
-		
-        self.positions[is_loop] = ids
+        return ~lost
         
 
     def update_occupancies(self):
+    
+        ids, legs = self.xp.nonzero(self.xp.not_equal(self.positions, self.previous_positions))
+        previous_positions = self.previous_positions[ids, legs]
+        
+        is_bound = self.xp.greater_equal(self.positions[ids, legs], 0)
+        is_moved = self.xp.ones(len(ids), dtype=bool)
+        
+        is_moved[is_bound] = self.resolve_overlaps(ids[is_bound], legs[is_bound], previous_positions[is_bound])
+        
+        vacated = previous_positions[is_moved]
+        vacated = vacated[self.xp.greater_equal(vacated, 0)]
+        
+        self.occupied[vacated] = False
+        self.site_owners[vacated] = -1
+        
+        # Both legs of the moved LEFs are marked, since legs of a single LEF may share a site
+        positions = self.positions[ids]
+        is_bound = self.xp.greater_equal(positions, 0)
+        
+        self.occupied[positions[is_bound]] = True
+        self.site_owners[positions[is_bound]] = self.xp.broadcast_to(ids[:, None], positions.shape)[is_bound]
+        
+        self.previous_positions[ids, legs] = self.positions[ids, legs]
+        
+        return self.xp.concatenate([vacated, self.positions[ids, legs]])
+        
+        
+    def reset_occupancies(self):
         
         self.occupied.fill(False)
         self.occupied[self.chromosome_bounds] = True
         
-        self.resolve_overlaps()
+        self.site_owners.fill(-1)
+        
+        is_bound = self.xp.greater_equal(self.positions, 0)
+        ids = self.xp.broadcast_to(self.xp.arange(self.number, dtype=self.xp.int32)[:, None], self.positions.shape)
+        
+        self.occupied[self.positions[is_bound]] = True
+        self.site_owners[self.positions[is_bound]] = ids[is_bound]
         
-        ids = self.positions[self.xp.greater_equal(self.positions, 0)]
-        self.occupied[ids] = True
+        self.previous_positions[...] = self.positions
         
 
-    def get_states(self):
+    def get_states(self, as_array=False):
 
-        return self.get_list(self.states)
+        get = self.get_array if as_array else self.get_list
+
+        return get(self.states)
         
         
-    def get_positions(self):
+    def get_positions(self, as_array=False):
+
+        get = self.get_array if as_array else self.get_list
 
-        return self.get_list(self.positions)
+        return get(self.positions)
         
         
-    def get_bound_positions(self):
+    def get_bound_positions(self, as_array=False):
 
         ids = self.xp.greater_equal(self.positions, 0).all(axis=1)
         bound_positions = self.positions[ids]
 
-        return self.get_list(bound_positions)
+        get = self.get_array if as_array else self.get_list
+
+        return get(bound_positions)
+
+
+    def get_checkpoint(self):
+
+        return {key: self.get_array(getattr(self, key)) for key in self.checkpoint_keys}
+
+
+    def set_checkpoint(self, checkpoint):
+
+        for key in self.checkpoint_keys:
+            getattr(self, key)[...] = self.xp.asarray(checkpoint[key])
+            
+        self.reset_occupancies()
@@ -1,3 +1,7 @@
+# Rebound to numba.prange by the parallel numba backend
+prange = range
+
+
 def _asymmetric_step_cpu(active_state_id,
                          rngs,
                          N,
@@ -8,11 +12,12 @@ def _asymmetric_step_cpu(active_state_id,
                          directions,
                          stall_left,
                          stall_right,
+                         site_types,
                          pause_prob,
                          positions,
                          stalled):
 					
-	for i in range(N):
+	for i in prange(N):
 		if states[i] == active_state_id:
 			leg_id = directions[i]
 			
@@ -23,7 +28,7 @@ def _asymmetric_step_cpu(active_state_id,
 				stalled[i, leg_id] = True
 
 			if not stalled[i, leg_id]:
-				pause = pause_prob[cur]
+				pause = pause_prob[site_types[cur % len(site_types)]]
 
 				if leg_id == 0:
 					if not occupied[cur-1]:
@@ -43,18 +48,20 @@ def _asymmetric_step_gpu():
 	extern "C"
 	__global__ void _asymmetric_step_gpu(
 			const int active_state_id,
-			const double* rngs,
+			const real_t* rngs,
 			const unsigned int N,
 			const unsigned int N_min,
 			const unsigned int N_max,
 			const int* states,
 			const bool* occupied,
-			const unsigned int* directions,
-			const double* stall_left,
-			const double* stall_right,
-			const double* pause_prob,
+			const flag_t* directions,
+			const float* stall_left,
+			const float* stall_right,
+			const unsigned char* site_types,
+			const unsigned int type_period,
+			const real_t* pause_prob,
 			int* positions,
-			unsigned int* stalled) {
+			flag_t* stalled) {
 
 		unsigned int i = (unsigned int) (blockDim.x * blockIdx.x + threadIdx.x);
 
@@ -64,10 +71,10 @@ def _asymmetric_step_gpu():
 		if (states[i] != active_state_id)
 			return;
 
-		uint2* stall = (uint2*) stalled;
+		flag2_t* stall = (flag2_t*) stalled;
 		int2* position = (int2*) positions;
 		
-		double2* rng = (double2*) rngs;
+		real2_t* rng = (real2_t*) rngs;
 
 		unsigned int leg_id = directions[i];
 		unsigned int cur = (unsigned int) (leg_id==0 ? position[i].x : position[i].y);
@@ -82,7 +89,7 @@ def _asymmetric_step_gpu():
 		if (leg_id == 0) {
 			if (stall[i].x == 0) {
 				if (!occupied[cur-1]) {
-					if (rng[i].y > pause_prob[cur])
+					if (rng[i].y > pause_prob[site_types[cur % type_period]])
 						position[i].x = (int) cur-1;
 				}
 			}
@@ -91,7 +98,7 @@ def _asymmetric_step_gpu():
 		else if (leg_id == 1) {
 			if (stall[i].y == 0) {
 				if (!occupied[cur+1]) {
-					if (rng[i].y > pause_prob[cur])
+					if (rng[i].y > pause_prob[site_types[cur % type_period]])
 						position[i].y = (int) cur+1;
 				}
 			}
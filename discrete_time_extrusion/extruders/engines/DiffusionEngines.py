@@ -1,3 +1,7 @@
+# Rebound to numba.prange by the parallel numba backend
+prange = range
+
+
 def _diffusion_step_cpu(unbound_state_id,
                         rngs,
                         N,
@@ -6,15 +10,16 @@ def _diffusion_step_cpu(unbound_state_id,
                         states,
                         occupied,
                         stalled,
+                        site_types,
                         diffuse_prob,
                         positions):
 					
-	for i in range(N):
+	for i in prange(N):
 		if (states[i] != unbound_state_id):
 			for j in range(2):
 				cur = positions[i, j]
 
-				if rngs[i, 2*j] < diffuse_prob[cur]:
+				if rngs[i, 2*j] < diffuse_prob[site_types[cur % len(site_types)]]:
 					stalled[i, j] = False
 				
 					if rngs[i, 2*j+1] < 0.5:
@@ -33,14 +38,16 @@ def _diffusion_step_gpu():
 	extern "C"
 	__global__ void _diffusion_step_gpu(
 			const int unbound_state_id,
-			const double* rngs,
+			const real_t* rngs,
 			const unsigned int N,
 			const unsigned int N_min,
 			const unsigned int N_max,
 			const int* states,
 			const bool* occupied,
-			const unsigned int* stalled,
-			const double* diffuse_prob,
+			const flag_t* stalled,
+			const unsigned char* site_types,
+			const unsigned int type_period,
+			const real_t* diffuse_prob,
 			int* positions) {
 
 		unsigned int i = (unsigned int) (blockDim.x * blockIdx.x + threadIdx.x);
@@ -51,16 +58,16 @@ def _diffusion_step_gpu():
 		if (states[i] == unbound_state_id)
 			return;
 
-		uint2* stall = (uint2*) stalled;
+		flag2_t* stall = (flag2_t*) stalled;
 		int2* position = (int2*) positions;
 		
-		double3* rng = (double3*) rngs;
+		real3_t* rng = (real3_t*) rngs;
 
 		unsigned int cur1 = (unsigned int) position[i].x;
 		unsigned int cur2 = (unsigned int) position[i].y;
 
 		if (rng[i].x < 0.5) {
-			if (rng[i].y < diffuse_prob[cur1]) {
+			if (rng[i].y < diffuse_prob[site_types[cur1 % type_period]]) {
 				stall[i].x = 0;
 			
 				if (rng[i].z < 0.5) {
@@ -75,7 +82,7 @@ def _diffusion_step_gpu():
 		}
 		
 		else {
-			if (rng[i].y < diffuse_prob[cur2]) {
+			if (rng[i].y < diffuse_prob[site_types[cur2 % type_period]]) {
 				stall[i].y = 0;
 
 				if (rng[i].z < 0.5) {
@@ -0,0 +1,465 @@
+import numpy as np
+
+
+# Rebound to numba.prange by the parallel numba backend
+prange = range
+
+# Events counted by the kernel, in the order of its counts array
+event_names = ('loaded', 'unloaded', 'stalls', 'blocked', 'collisions', 'ctcf_births', 'ctcf_deaths')
+
+# Philox4x32-10 constants (Salmon et al., SC 2011) - products of two 32-bit words fit in 64 bits without overflow
+philox_m0 = np.uint64(0xD2511F53)
+philox_m1 = np.uint64(0xCD9E8D57)
+
+philox_w0 = np.uint64(0x9E3779B9)
+philox_w1 = np.uint64(0xBB67AE85)
+
+mask32 = np.uint64(0xFFFFFFFF)
+shift32 = np.uint64(32)
+
+# Counter blocks of each LEF's numbers within a step - loading attempts take 4 numbers per block from the last one on
+diffusion_block = 0
+unloading_block = 1
+extrusion_block = 2
+loading_block = 3
+attempts_block = 4
+
+
+def _philox(key0, key1, lef, block):
+
+	# Four uniform numbers in [0, 1) for one LEF and counter block, from a key drawn once per step - every LEF
+	# computes its own numbers, so that the per-LEF phases draw inside their parallel loops
+	c0 = np.uint64(lef)
+	c1 = np.uint64(block)
+	c2 = np.uint64(0)
+	c3 = np.uint64(0)
+
+	for _round in range(10):
+		p0 = philox_m0 * c0
+		p1 = philox_m1 * c2
+
+		c0, c1, c2, c3 = (p1 >> shift32) ^ c1 ^ key0, p1 & mask32, (p0 >> shift32) ^ c3 ^ key1, p0 & mask32
+
+		key0 = (key0 + philox_w0) & mask32
+		key1 = (key1 + philox_w1) & mask32
+
+	return c0 * 2.**-32, c1 * 2.**-32, c2 * 2.**-32, c3 * 2.**-32
+
+
+def _flip_barriers(time,
+                   leg,
+                   rng,
+                   ctcf_sites,
+                   ctcf_states,
+                   ctcf_event,
+                   ctcf_birth_prob,
+                   ctcf_death_prob,
+                   stall,
+                   site_types,
+                   site_owners,
+                   positions,
+                   stalled):
+
+	# Flips the CTCFs on one side whose event comes up at this time, and returns the time of the next event
+	next_event = 1 << 62
+
+	births = 0
+	deaths = 0
+
+	for k in range(len(ctcf_sites)):
+		if ctcf_event[k] == time:
+			site = ctcf_sites[k]
+
+			if ctcf_states[k] == 0:
+				ctcf_states[k] = 1
+				stall[site] = 1
+
+				births += 1
+				prob = ctcf_death_prob[site_types[site % len(site_types)]]
+
+			else:
+				ctcf_states[k] = 0
+				stall[site] = 0
+
+				deaths += 1
+				prob = ctcf_birth_prob[site_types[site % len(site_types)]]
+
+				lef = site_owners[site]
+
+				if (lef >= 0) and (positions[lef, leg] == site):
+					stalled[lef, leg] = False
+
+			rate = -np.log1p(-min(prob, 1. - 1e-16))
+			wait = np.ceil(-np.log1p(-rng.random()) / max(rate, 1e-300))
+
+			ctcf_event[k] = time + int(min(max(wait, 1.), 4e18))
+
+		next_event = min(next_event, ctcf_event[k])
+
+	return next_event, births, deaths
+
+
+def _diffuse(key0,
+             key1,
+             unbound_state_id,
+             N,
+             states,
+             occupied,
+             site_types,
+             diffuse_prob,
+             positions,
+             previous_positions,
+             stalled):
+
+	for i in prange(N):
+		previous_positions[i, 0] = positions[i, 0]
+		previous_positions[i, 1] = positions[i, 1]
+
+		if states[i] != unbound_state_id:
+			rngs = _philox(key0, key1, i, diffusion_block)
+
+			for j in range(2):
+				cur = positions[i, j]
+
+				if rngs[2*j] < diffuse_prob[site_types[cur % len(site_types)]]:
+					stalled[i, j] = False
+
+					if rngs[2*j+1] < 0.5:
+						if (not occupied[cur-1]) and ((j == 0) or (cur > positions[i, 0])):
+							positions[i, j] = cur - 1
+
+					else:
+						if (not occupied[cur+1]) and ((j == 1) or (cur < positions[i, 1])):
+							positions[i, j] = cur + 1
+
+
+def _is_claimed_before(i, j, new, site_owners, positions, previous_positions):
+
+	# Legs only step onto free neighbouring sites, so that the other legs heading for the same site come from
+	# either side of it, or from the same site for the two legs of one LEF
+	for side in range(new-1, new+2, 2):
+		if (side < 0) or (side >= len(site_owners)):
+			continue
+
+		lef = site_owners[side]
+
+		if (lef < 0) or (lef > i):
+			continue
+
+		for leg in range(2):
+			if ((lef < i) or (leg < j)) and (previous_positions[lef, leg] == side) and (positions[lef, leg] == new):
+				return True
+
+	return False
+
+
+def _resolve_moves(N, occupied, site_owners, positions, previous_positions):
+
+	# Legs move against the occupancies at the start of the phase, as in the batched engines - of the legs stepping
+	# onto the same site, the first in LEF and leg order keeps it, and the others go back to where they came from.
+	# That first leg never moves back, so that later legs find it whichever order the LEFs are processed in
+	collisions = 0
+
+	for i in prange(N):
+		lef_collisions = 0
+
+		for j in range(2):
+			cur = previous_positions[i, j]
+			new = positions[i, j]
+
+			if (new != cur) and _is_claimed_before(i, j, new, site_owners, positions, previous_positions):
+				positions[i, j] = cur
+				lef_collisions += 1
+
+		collisions += lef_collisions
+
+	# Claimed sites were free at the start of the phase, so that no two LEFs write to the same site
+	for i in prange(N):
+		for j in range(2):
+			cur = previous_positions[i, j]
+			new = positions[i, j]
+
+			if new != cur:
+				occupied[new] = True
+				site_owners[new] = i
+
+				if positions[i, 1-j] != cur:
+					occupied[cur] = False
+					site_owners[cur] = -1
+
+	return collisions
+
+
+def _choose_unloading(key0,
+                      key1,
+                      bound_state_id,
+                      N,
+                      states,
+                      site_types,
+                      positions,
+                      stalled,
+                      dying,
+                      death_prob,
+                      stalled_death_prob):
+
+	unloaded = 0
+
+	for i in prange(N):
+		dying[i] = False
+
+		if states[i] == bound_state_id:
+			type1 = site_types[positions[i, 0] % len(site_types)]
+			type2 = site_types[positions[i, 1] % len(site_types)]
+
+			death1 = stalled_death_prob[type1] if stalled[i, 0] else death_prob[type1]
+			death2 = stalled_death_prob[type2] if stalled[i, 1] else death_prob[type2]
+
+			if _philox(key0, key1, i, unloading_block)[0] < max(death1, death2):
+				dying[i] = True
+				unloaded += 1
+
+	return unloaded
+
+
+def _propose_loads(key0,
+                   key1,
+                   unbound_state_id,
+                   N,
+                   max_attempts,
+                   states,
+                   occupied,
+                   site_types,
+                   loading_sites,
+                   LEF_groups,
+                   loading_bounds,
+                   birth_prob,
+                   proposals):
+
+	# Unbound LEFs draw uniformly from the free sites in the range of their replica group, and propose to load there
+	# with the side of their second leg and their direction packed into one flag
+	for i in prange(N):
+		proposals[i, 0] = -1
+
+		first_site = loading_bounds[LEF_groups[i]]
+		num_loading_sites = loading_bounds[LEF_groups[i]+1] - first_site
+
+		if (states[i] == unbound_state_id) and (num_loading_sites > 0):
+			site = -1
+			rngs = _philox(key0, key1, i, attempts_block)
+
+			for attempt in range(max_attempts):
+				if (attempt > 0) and (attempt % 4 == 0):
+					rngs = _philox(key0, key1, i, attempts_block + attempt // 4)
+
+				offset = min(int(rngs[attempt % 4] * num_loading_sites), num_loading_sites - 1)
+				candidate = loading_sites[first_site + offset]
+
+				if not occupied[candidate]:
+					site = candidate
+					break
+
+			if site >= 0:
+				birth, stagger, direction, _ = _philox(key0, key1, i, loading_block)
+
+				if birth < birth_prob[site_types[site % len(site_types)]]:
+					proposals[i, 0] = site
+					proposals[i, 1] = (1 if stagger < 0.5 else 0) + (2 if direction < 0.5 else 0)
+
+
+def _load(bound_state_id, N, states, occupied, site_owners, directions, positions, proposals):
+
+	# Proposals are drawn against the occupancies at the start of the phase, and LEFs proposing a site taken by an
+	# earlier LEF in this pass try again at the next step. The pass makes no draws, so that it stays short
+	loaded = 0
+
+	for i in range(N):
+		site = proposals[i, 0]
+
+		if (site >= 0) and (not occupied[site]):
+			states[i] = bound_state_id
+			loaded += 1
+
+			positions[i, 0] = site
+			positions[i, 1] = site
+
+			occupied[site] = True
+			site_owners[site] = i
+
+			if (proposals[i, 1] & 1) and (not occupied[site+1]):
+				positions[i, 1] = site + 1
+				occupied[site+1] = True
+				site_owners[site+1] = i
+
+			directions[i] = proposals[i, 1] >> 1
+
+	return loaded
+
+
+def _unload(unbound_state_id, N, states, occupied, site_owners, positions, stalled, dying):
+
+	for i in prange(N):
+		if dying[i]:
+			occupied[positions[i, 0]] = False
+			occupied[positions[i, 1]] = False
+
+			site_owners[positions[i, 0]] = -1
+			site_owners[positions[i, 1]] = -1
+
+			states[i] = unbound_state_id
+
+			positions[i, 0] = -1
+			positions[i, 1] = -1
+
+			stalled[i, 0] = False
+			stalled[i, 1] = False
+
+
+def _extrude(key0,
+             key1,
+             asymmetric,
+             bound_state_id,
+             N,
+             states,
+             occupied,
+             site_types,
+             directions,
+             positions,
+             previous_positions,
+             stalled,
+             pause_prob,
+             stall_left,
+             stall_right):
+
+	stalls = 0
+	blocked = 0
+
+	for i in prange(N):
+		previous_positions[i, 0] = positions[i, 0]
+		previous_positions[i, 1] = positions[i, 1]
+
+		# Events are summed per LEF first, as numba drops reductions made across the inner loop
+		lef_stalls = 0
+		lef_blocked = 0
+
+		if states[i] == bound_state_id:
+			rngs = _philox(key0, key1, i, extrusion_block)
+
+			for j in range(2):
+				if asymmetric and (directions[i] != j):
+					continue
+
+				cur = positions[i, j]
+				stall = stall_left[cur] if j == 0 else stall_right[cur]
+
+				if (rngs[2*j] < stall) and (not stalled[i, j]):
+					stalled[i, j] = True
+					lef_stalls += 1
+
+				if not stalled[i, j]:
+					new = cur - 1 if j == 0 else cur + 1
+
+					if occupied[new]:
+						lef_blocked += 1
+
+					elif rngs[2*j+1] > pause_prob[site_types[cur % len(site_types)]]:
+						positions[i, j] = new
+
+		stalls += lef_stalls
+		blocked += lef_blocked
+
+	return stalls, blocked
+
+
+def _fused_steps_cpu(steps,
+                     asymmetric,
+                     rng,
+                     unbound_state_id,
+                     bound_state_id,
+                     N,
+                     max_attempts,
+                     states,
+                     occupied,
+                     site_owners,
+                     site_types,
+                     directions,
+                     positions,
+                     stalled,
+                     dying,
+                     previous_positions,
+                     loading_sites,
+                     LEF_groups,
+                     loading_bounds,
+                     birth_prob,
+                     death_prob,
+                     stalled_death_prob,
+                     diffuse_prob,
+                     pause_prob,
+                     stall_left,
+                     stall_right,
+                     ctcf_sites_left,
+                     ctcf_sites_right,
+                     ctcf_states_left,
+                     ctcf_states_right,
+                     ctcf_birth_prob,
+                     ctcf_death_prob,
+                     ctcf_event_left,
+                     ctcf_event_right,
+                     clock,
+                     counts):
+
+	# Event times are absolute, counted on the barrier clock
+	next_event = 1 << 62
+
+	for k in range(len(ctcf_sites_left)):
+		next_event = min(next_event, ctcf_event_left[k])
+
+	for k in range(len(ctcf_sites_right)):
+		next_event = min(next_event, ctcf_event_right[k])
+
+	for step in range(steps):
+		# The generator only draws the key of each step, from which the LEFs compute their own numbers
+		key0 = np.uint64(rng.random() * 4294967296.)
+		key1 = np.uint64(rng.random() * 4294967296.)
+
+		time = clock + step + 1
+
+		# Barrier dynamics - the sites are only scanned at steps holding an event, which also find the next one
+		if time >= next_event:
+			next_left, births_left, deaths_left = _flip_barriers(time, 0, rng, ctcf_sites_left, ctcf_states_left,
+			                                                     ctcf_event_left, ctcf_birth_prob, ctcf_death_prob,
+			                                                     stall_left, site_types, site_owners, positions,
+			                                                     stalled)
+			next_right, births_right, deaths_right = _flip_barriers(time, 1, rng, ctcf_sites_right, ctcf_states_right,
+			                                                        ctcf_event_right, ctcf_birth_prob, ctcf_death_prob,
+			                                                        stall_right, site_types, site_owners, positions,
+			                                                        stalled)
+
+			next_event = min(next_left, next_right)
+
+			counts[5] += births_left + births_right
+			counts[6] += deaths_left + deaths_right
+
+		# Lattice diffusion of bound LEFs
+		_diffuse(key0, key1, unbound_state_id, N, states, occupied, site_types, diffuse_prob,
+		         positions, previous_positions, stalled)
+		counts[4] += _resolve_moves(N, occupied, site_owners, positions, previous_positions)
+
+		# Unloading decisions are taken before loading so that newly loaded LEFs cannot unbind
+		counts[1] += _choose_unloading(key0, key1, bound_state_id, N, states, site_types, positions, stalled, dying,
+		                               death_prob, stalled_death_prob)
+
+		# Loading proposals are kept in the previous positions, which are free until extrusion
+		_propose_loads(key0, key1, unbound_state_id, N, max_attempts, states, occupied, site_types, loading_sites,
+		               LEF_groups, loading_bounds, birth_prob, previous_positions)
+		counts[0] += _load(bound_state_id, N, states, occupied, site_owners, directions, positions, previous_positions)
+
+		_unload(unbound_state_id, N, states, occupied, site_owners, positions, stalled, dying)
+
+		# Loop extrusion by active LEFs
+		stalls, blocked = _extrude(key0, key1, asymmetric, bound_state_id, N, states, occupied, site_types,
+		                           directions, positions, previous_positions, stalled, pause_prob, stall_left,
+		                           stall_right)
+
+		counts[2] += stalls
+		counts[3] += blocked
+		counts[4] += _resolve_moves(N, occupied, site_owners, positions, previous_positions)
@@ -0,0 +1,195 @@
+def _build_site_index_cpu(L,
+                          B,
+                          occupied,
+                          site_types,
+                          birth_prob,
+                          weights,
+                          tree_weights,
+                          tree_counts):
+
+	tree_weights[:] = 0.
+	tree_counts[:] = 0
+
+	for i in range(L):
+		weights[i] = 0. if occupied[i] else birth_prob[site_types[i % len(site_types)]]
+
+		if weights[i] > 0:
+			tree_weights[i//B + 1] += weights[i]
+			tree_counts[i//B + 1] += 1
+
+	# Block sums are folded into the Fenwick tree in place, each node passing its partial sum on to its parent
+	for i in range(1, len(tree_weights)):
+		j = i + (i & -i)
+
+		if j < len(tree_weights):
+			tree_weights[j] += tree_weights[i]
+			tree_counts[j] += tree_counts[i]
+
+
+def _update_site_index_cpu(sites,
+                           N,
+                           B,
+                           occupied,
+                           site_types,
+                           birth_prob,
+                           weights,
+                           tree_weights,
+                           tree_counts):
+
+	for k in range(N):
+		site = sites[k]
+		weight = 0. if occupied[site] else birth_prob[site_types[site % len(site_types)]]
+
+		if weight != weights[site]:
+			delta_count = (1 if weight > 0 else 0) - (1 if weights[site] > 0 else 0)
+			delta_weight = weight - weights[site]
+
+			weights[site] = weight
+
+			i = site//B + 1
+
+			while i < len(tree_weights):
+				tree_weights[i] += delta_weight
+				tree_counts[i] += delta_count
+
+				i += i & -i
+
+
+def _load_free_sites_cpu(rngs,
+                         N,
+                         L,
+                         B,
+                         weights,
+                         tree_weights,
+                         tree_counts,
+                         ranges,
+                         range_bounds,
+                         prefix_weights,
+                         prefix_counts,
+                         sites):
+
+	number_of_blocks = len(tree_weights) - 1
+
+	top = 1
+
+	while 2*top <= number_of_blocks:
+		top *= 2
+
+	is_stale = True
+	is_retried = False
+
+	k = 0
+
+	while k < N:
+		if is_stale:
+			# Weights and counts of the free sites before each range bound, summed over the tree and the last block
+			for q in range(len(range_bounds)):
+				bound = range_bounds[q]
+
+				prefix_weights[q] = 0.
+				prefix_counts[q] = 0
+
+				i = bound // B
+
+				while i > 0:
+					prefix_weights[q] += tree_weights[i]
+					prefix_counts[q] += tree_counts[i]
+
+					i -= i & -i
+
+				for site in range((bound // B) * B, bound):
+					if weights[site] > 0:
+						prefix_weights[q] += weights[site]
+						prefix_counts[q] += 1
+
+			is_stale = False
+
+		r = ranges[k]
+
+		range_weight = prefix_weights[r+1] - prefix_weights[r]
+		range_count = prefix_counts[r+1] - prefix_counts[r]
+
+		# Picking one of the free sites of the range uniformly and accepting it with its own birth probability
+		# loads with total probability W/N_free, after which the site is drawn in proportion to its weight
+		if (range_count <= 0) or (rngs[k, 0] * range_count >= range_weight):
+			is_retried = False
+			k += 1
+			continue
+
+		target = prefix_weights[r] + rngs[k, 1] * range_weight
+
+		block = 0
+		step = top
+
+		while step > 0:
+			if (block + step <= number_of_blocks) and (target >= tree_weights[block + step]):
+				block += step
+				target -= tree_weights[block]
+
+			step //= 2
+
+		site = block * B
+
+		while (site < min((block+1)*B, L)-1) and (target >= weights[site]):
+			target -= weights[site]
+			site += 1
+
+		# Round-off in the running sums can land the search on an empty site, or outside the range - the sums are
+		# then rebuilt from the site weights and the draw retried, and should that fail too, the free site of the
+		# same rank is taken from the exact counts instead
+		if (site >= L) or (weights[site] <= 0) or (site < range_bounds[r]) or (site >= range_bounds[r+1]):
+			if not is_retried:
+				for i in range(1, len(tree_weights)):
+					tree_weights[i] = 0.
+
+				for i in range(L):
+					tree_weights[i//B + 1] += weights[i]
+
+				for i in range(1, len(tree_weights)):
+					j = i + (i & -i)
+
+					if j < len(tree_weights):
+						tree_weights[j] += tree_weights[i]
+
+				is_stale = True
+				is_retried = True
+				continue
+
+			rank = prefix_counts[r] + min(int(rngs[k, 1] * range_count), range_count-1)
+
+			block = 0
+			step = top
+
+			while step > 0:
+				if (block + step <= number_of_blocks) and (rank >= tree_counts[block + step]):
+					block += step
+					rank -= tree_counts[block]
+
+				step //= 2
+
+			site = block * B
+
+			while (weights[site] <= 0) or (rank > 0):
+				if weights[site] > 0:
+					rank -= 1
+
+				site += 1
+
+		sites[k] = site
+
+		for q in range(r+1, len(range_bounds)):
+			prefix_weights[q] -= weights[site]
+			prefix_counts[q] -= 1
+
+		i = block + 1
+
+		while i < len(tree_weights):
+			tree_weights[i] -= weights[site]
+			tree_counts[i] -= 1
+
+			i += i & -i
+
+		weights[site] = 0.
+		is_retried = False
+
+		k += 1
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def _walk_leg(start,
+              direction,
+              steps,
+              velocity,
+              lo,
+              hi,
+              delays,
+              occupied):
+
+	# Legs move up to the last free site in a row, taking one step per site and the delay of each barrier they
+	# stall at, counted in the steps they extrude over that time
+	site = start
+	arrival = 0.
+
+	for k in range(steps + 1):
+		delay = delays[site] * velocity if delays[site] >= 0 else -1.
+
+		new = site + direction
+		is_next = (k < steps) and (new >= lo) and (new < hi)
+
+		# Barriers right in front of a neighbour hold legs for good, as they cannot diffuse past them
+		if is_next and occupied[new] and (delay >= 0):
+			delay = np.inf
+
+		if (not is_next) or occupied[new] or (arrival + 1 + max(delay, 0.) > steps):
+			break
+
+		arrival += 1 + max(delay, 0.)
+		site = new
+
+	return site, (delay >= 0) and (steps < arrival + delay)
+
+
+def _place_loops_cpu(order,
+                     max_attempts,
+                     unbound_state_id,
+                     rngs,
+                     leg_steps,
+                     velocities,
+                     LEF_groups,
+                     group_bounds,
+                     loading_weights,
+                     delays_left,
+                     delays_right,
+                     occupied,
+                     states,
+                     positions,
+                     stalled):
+
+	# Loops are laid out one at a time in the given order, as each one blocks those placed after it
+	for i in order:
+		lo = group_bounds[LEF_groups[i]]
+		hi = group_bounds[LEF_groups[i]+1]
+
+		total_weight = loading_weights[hi-1] if hi > lo else 0.
+		anchor = -1
+
+		# LEFs load onto a pair of free sites, drawn from the cumulative birth probabilities of their group
+		for attempt in range(max_attempts if total_weight > 0 else 0):
+			site = lo + np.searchsorted(loading_weights[lo:hi], rngs[i, attempt] * total_weight, side='right')
+
+			if (site+1 < hi) and (not occupied[site]) and (not occupied[site+1]):
+				anchor = site
+				break
+
+		if anchor < 0:
+			states[i] = unbound_state_id
+			continue
+
+		positions[i, 0], stalled[i, 0] = _walk_leg(anchor, -1, leg_steps[i, 0], velocities[i], lo, hi,
+		                                           delays_left, occupied)
+		positions[i, 1], stalled[i, 1] = _walk_leg(anchor+1, 1, leg_steps[i, 1], velocities[i], lo, hi,
+		                                           delays_right, occupied)
+
+		occupied[positions[i, 0]] = True
+		occupied[positions[i, 1]] = True
@@ -1,3 +1,7 @@
+# Rebound to numba.prange by the parallel numba backend
+prange = range
+
+
 def _symmetric_step_cpu(active_state_id,
                         rngs,
                         N,
@@ -7,11 +11,12 @@ def _symmetric_step_cpu(active_state_id,
                         occupied,
                         stall_left,
                         stall_right,
+                        site_types,
                         pause_prob,
                         positions,
                         stalled):
 					
-	for i in range(N):
+	for i in prange(N):
 		if states[i] == active_state_id:
 			cur1 = positions[i, 0]
 			cur2 = positions[i, 1]
@@ -27,14 +32,14 @@ def _symmetric_step_cpu(active_state_id,
 
 			if not stalled[i, 0]:
 				if not occupied[cur1-1]:
-					pause1 = pause_prob[cur1]
+					pause1 = pause_prob[site_types[cur1 % len(site_types)]]
 					
 					if rngs[i, 2] > pause1:
 						positions[i, 0] = cur1 - 1
 						
 			if not stalled[i, 1]:
 				if not occupied[cur2+1]:
-					pause2 = pause_prob[cur2]
+					pause2 = pause_prob[site_types[cur2 % len(site_types)]]
 					
 					if rngs[i, 3] > pause2:
 						positions[i, 1] = cur2 + 1
@@ -47,17 +52,19 @@ def _symmetric_step_gpu():
 	extern "C"
 	__global__ void _symmetric_step_gpu(
 			const int active_state_id,
-			const double* rngs,
+			const real_t* rngs,
 			const unsigned int N,
 			const unsigned int N_min,
 			const unsigned int N_max,
 			const int* states,
 			const bool* occupied,
-			const double* stall_left,
-			const double* stall_right,
-			const double* pause_prob,
+			const float* stall_left,
+			const float* stall_right,
+			const unsigned char* site_types,
+			const unsigned int type_period,
+			const real_t* pause_prob,
 			int* positions,
-			unsigned int* stalled) {
+			flag_t* stalled) {
 
 		unsigned int i = (unsigned int) (blockDim.x * blockIdx.x + threadIdx.x);
 
@@ -67,10 +74,10 @@ def _symmetric_step_gpu():
 		if (states[i] != active_state_id)
 			return;
 
-		uint2* stall = (uint2*) stalled;
+		flag2_t* stall = (flag2_t*) stalled;
 		int2* position = (int2*) positions;
 		
-		double4* rng = (double4*) rngs;
+		real4_t* rng = (real4_t*) rngs;
 
 		unsigned int cur1 = (unsigned int) position[i].x;
 		unsigned int cur2 = (unsigned int) position[i].y;
@@ -86,7 +93,7 @@ def _symmetric_step_gpu():
 						
 		if (stall[i].x == 0) {
 			if (!occupied[cur1-1]) {
-				double pause1 = pause_prob[cur1];
+				double pause1 = pause_prob[site_types[cur1 % type_period]];
 				
 				if (rng[i].y > pause1)
 					position[i].x = (int) cur1-1;
@@ -95,7 +102,7 @@ def _symmetric_step_gpu():
 					
 		if (stall[i].y == 0) {
 			if (!occupied[cur2+1]) {
-				double pause2 = pause_prob[cur2];
+				double pause2 = pause_prob[site_types[cur2 % type_period]];
 				
 				if (rng[i].z > pause2)
 					position[i].y = (int) cur2+1;
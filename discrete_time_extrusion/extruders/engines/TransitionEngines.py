@@ -0,0 +1,102 @@
+# Rebound to numba.prange by the parallel numba backend
+prange = range
+
+
+def _transition_step_cpu(rngs,
+                         N,
+                         unbound_state_id,
+                         death_state_id,
+                         states,
+                         positions,
+                         stalled,
+                         site_types,
+                         state_offsets,
+                         transition_products,
+                         transition_probs,
+                         death_prob,
+                         stalled_death_prob,
+                         new_states):
+					
+	for i in prange(N):
+		state = states[i]
+		
+		if state != unbound_state_id:
+			type1 = site_types[positions[i, 0] % len(site_types)]
+			type2 = site_types[positions[i, 1] % len(site_types)]
+			
+			cumul_prob = 0.
+			
+			for t in range(state_offsets[state], state_offsets[state+1]):
+				cumul_prob += max(transition_probs[t, type1], transition_probs[t, type2])
+				
+				if rngs[i] < cumul_prob:
+					new_states[i] = transition_products[t]
+					break
+					
+			if (new_states[i] < 0) and (state == death_state_id):
+				death1 = stalled_death_prob[type1] if stalled[i, 0] else death_prob[type1]
+				death2 = stalled_death_prob[type2] if stalled[i, 1] else death_prob[type2]
+				
+				if rngs[i] < cumul_prob + max(death1, death2):
+					new_states[i] = unbound_state_id
+
+
+def _transition_step_gpu():
+
+	return r'''
+	
+	extern "C"
+	__global__ void _transition_step_gpu(
+			const real_t* rngs,
+			const unsigned int N,
+			const unsigned int N_types,
+			const int unbound_state_id,
+			const int death_state_id,
+			const int* states,
+			const int* positions,
+			const flag_t* stalled,
+			const unsigned char* site_types,
+			const unsigned int type_period,
+			const int* state_offsets,
+			const int* transition_products,
+			const real_t* transition_probs,
+			const real_t* death_prob,
+			const real_t* stalled_death_prob,
+			int* new_states) {
+
+		unsigned int i = (unsigned int) (blockDim.x * blockIdx.x + threadIdx.x);
+
+		if (i >= N)
+			return;
+			
+		int state = states[i];
+			
+		if (state == unbound_state_id)
+			return;
+
+		const flag2_t* stall = (const flag2_t*) stalled;
+		const int2* position = (const int2*) positions;
+		
+		unsigned int type1 = site_types[position[i].x % type_period];
+		unsigned int type2 = site_types[position[i].y % type_period];
+		
+		double cumul_prob = 0;
+
+		for (int t = state_offsets[state]; t < state_offsets[state+1]; t++) {
+			cumul_prob += fmax(transition_probs[t*N_types+type1], transition_probs[t*N_types+type2]);
+			
+			if (rngs[i] < cumul_prob) {
+				new_states[i] = transition_products[t];
+				return;
+			}
+		}
+		
+		if (state == death_state_id) {
+			double death1 = stall[i].x ? stalled_death_prob[type1] : death_prob[type1];
+			double death2 = stall[i].y ? stalled_death_prob[type2] : death_prob[type2];
+			
+			if (rngs[i] < cumul_prob + fmax(death1, death2))
+				new_states[i] = unbound_state_id;
+		}
+	}
+	'''
@@ -0,0 +1,319 @@
+import csv
+import copy
+import functools
+import itertools
+
+import numpy as np
+import sympy as sym
+
+import scipy.integrate
+import scipy.sparse
+
+
+bound_states = ['RB', 'RN', 'RP', 'RW']
+free_states = ['R', 'N', 'P', 'W']
+
+variable_names = bound_states + free_states
+parameter_names = ['tau_N', 'F_N', 'N_N', 'tau_P', 'F_P', 'N_P', 'tau_W', 'F_W', 'N_W', 'tau_R', 'F_R', 'N_R']
+
+
+def load_parameter_table(path):
+
+    with open(path) as table_file:
+        rows = [row for row in csv.reader(table_file, skipinitialspace=True) if row and not row[0].startswith('#')]
+
+    header, rows = rows[0], rows[1:]
+
+    # Tables either list one parameter per line, or one parameter set per line with a column per parameter
+    if header[:2] == ['parameter', 'value']:
+        return {row[0]: np.asarray([float(row[1])]) for row in rows}
+
+    return {name: np.asarray([float(row[i]) for row in rows]) for i, name in enumerate(header)}
+
+
+def sweep_parameters(parameters, name, factors):
+
+    factors = np.asarray(factors, dtype=float)
+
+    sweep = {key: np.repeat(np.asarray(value, dtype=float).reshape(-1)[:1], len(factors)) for key, value in parameters.items()}
+    sweep[name] = sweep[name] * factors
+
+    return sweep
+
+
+def get_batch(parameters):
+
+    values = np.broadcast_arrays(*[np.atleast_1d(np.asarray(parameters[name], dtype=float)) for name in parameter_names])
+
+    return dict(zip(parameter_names, values))
+
+
+def get_transitions(sequence):
+
+    # Unbound cohesin loads into the first state, walks up and down the sequence, and unloads from the last state
+    transitions = [('R', sequence[0])]
+
+    for s1, s2 in zip(sequence[:-1], sequence[1:]):
+        transitions.append((s1, s2))
+        transitions.append((s2, s1))
+
+    transitions.append((sequence[-1], 'R'))
+
+    return transitions
+
+
+@functools.lru_cache(maxsize=None)
+def derive_model(sequence):
+
+    sequence = tuple(sequence)
+
+    state_ids = {name: i for i, name in enumerate(variable_names)}
+    state_symbols = {name: sym.symbols(name) for name in variable_names}
+
+    parameters = dict(zip(parameter_names, sym.symbols(parameter_names)))
+
+    transitions = get_transitions(sequence)
+    rate_symbols = {(s1, s2): sym.symbols("k_%s%s" % (s1[-1], s2[-1])) for s1, s2 in transitions}
+
+    # Mass action kinetics, with transitions into N, P and W states binding the corresponding free subunit
+    rhs = sym.zeros(len(state_symbols), 1)
+
+    for s1, s2 in transitions:
+        flux = rate_symbols[(s1, s2)] * state_symbols[s1]
+
+        if s2[-1] not in ['R', 'B']:
+            flux *= state_symbols[s2[-1]]
+
+        rhs[state_ids[s1]] -= flux
+        rhs[state_ids[s2]] += flux
+
+    for name in ['N', 'P', 'W']:
+        rhs[state_ids[name]] = -rhs[state_ids['R' + name]]
+
+    R, N, P, W = [state_symbols[name] for name in free_states]
+    RN, RP, RW = [state_symbols[name] for name in ['RN', 'RP', 'RW']]
+
+    tau_N, F_N, N_N, tau_P, F_P, N_P, tau_W, F_W, N_W, tau_R, F_R, N_R = parameters.values()
+
+    # Equilibrium concentrations implied by the measured abundances and chromatin-bound fractions
+    equilibrium = {'RB': N_R*F_R - N_N*F_N - N_P*F_P - N_W*F_W,
+                   'RN': N_N*F_N,
+                   'RP': N_P*F_P,
+                   'RW': N_W*F_W,
+                   'R': N_R * (1-F_R),
+                   'N': N_N * (1-F_N),
+                   'P': N_P * (1-F_P),
+                   'W': N_W * (1-F_W)}
+
+    def substitute(expr, excluded):
+        return expr.subs({name: value for name, value in equilibrium.items() if name not in excluded})
+
+    eq_R = substitute(rhs[state_ids['R']], ['R'])
+    eq_N = substitute(rhs[state_ids['N']], ['N', 'RN'])
+    eq_P = substitute(rhs[state_ids['P']], ['P', 'RP'])
+    eq_W = substitute(rhs[state_ids['W']], ['W', 'RW'])
+
+    # Rates are fixed by matching the equilibrium bound fractions and residence times of each subunit
+    constraints = [sym.collect(eq_R, R).coeff(R, 0) - N_R*F_R/tau_R,
+                   sym.collect(eq_N, RN).coeff(RN, 1) - 1/tau_N,
+                   sym.collect(eq_P, RP).coeff(RP, 1) - 1/tau_P,
+                   sym.collect(eq_W, RW).coeff(RW, 1) - 1/tau_W,
+                   sym.collect(eq_R, R).coeff(R, 1) + 1/tau_R * F_R/(1-F_R),
+                   sym.collect(eq_N, N).coeff(N, 1) + 1/tau_N * F_N/(1-F_N),
+                   sym.collect(eq_P, P).coeff(P, 1) + 1/tau_P * F_P/(1-F_P),
+                   sym.collect(eq_W, W).coeff(W, 1) + 1/tau_W * F_W/(1-F_W)]
+
+    rate_list = list(rate_symbols.values())
+    solution = sym.solve(constraints, *rate_list, dict=True)[0]
+
+    variables = list(state_symbols.values())
+    jacobian = rhs.jacobian(variables)
+
+    pattern = [(i, j) for i in range(len(variables)) for j in range(len(variables)) if jacobian[i, j] != 0]
+
+    return {'sequence': sequence,
+            'rate_names': [str(rate) for rate in rate_list],
+            'transitions': transitions,
+            'rates': sym.lambdify(list(parameters.values()), [solution[rate] for rate in rate_list], 'numpy'),
+            'rhs': sym.lambdify((variables, rate_list), list(rhs), 'numpy'),
+            'jacobian': sym.lambdify((variables, rate_list), [jacobian[i, j] for i, j in pattern], 'numpy'),
+            'jacobian_pattern': np.asarray(pattern, dtype=np.int64).reshape(-1, 2)}
+
+
+def infer_rates(sequence, parameters):
+
+    model = derive_model(tuple(sequence))
+    batch = get_batch(parameters)
+
+    values = model['rates'](*batch.values())
+    number = len(batch['N_R'])
+
+    return {name: np.broadcast_to(value, (number,)).astype(float) for name, value in zip(model['rate_names'], values)}
+
+
+def solve_kinetics(sequence,
+                   rates,
+                   parameters,
+                   t_span=(0, 3600),
+                   t_eval=None,
+                   method='BDF',
+                   **kwargs):
+
+    model = derive_model(tuple(sequence))
+    batch = get_batch(parameters)
+
+    number = len(batch['N_R'])
+    size = len(variable_names) * number
+
+    rate_values = [np.broadcast_to(np.asarray(rates[name], dtype=float), (number,)) for name in model['rate_names']]
+
+    # All parameter sets are integrated as one system, whose state holds every variable for every set
+    def rhs(t, y):
+        derivatives = model['rhs'](y.reshape(len(variable_names), number), rate_values)
+        return np.concatenate(np.broadcast_arrays(*derivatives, np.zeros(number))[:-1])
+
+    # Parameter sets are uncoupled, so the Jacobian is block-diagonal with one sparse block per set
+    rows, cols = model['jacobian_pattern'].T
+    offsets = np.arange(number)
+
+    jacobian_rows = (rows[:, None] * number + offsets).ravel()
+    jacobian_cols = (cols[:, None] * number + offsets).ravel()
+
+    def jacobian(t, y):
+        values = model['jacobian'](y.reshape(len(variable_names), number), rate_values)
+        data = np.concatenate(np.broadcast_arrays(*values, np.zeros(number))[:-1]) if len(values) else np.zeros(0)
+
+        return scipy.sparse.csc_matrix((data, (jacobian_rows, jacobian_cols)), shape=(size, size))
+
+    # Starting from fully unbound RAD21, with free subunits at their total abundances
+    y0 = np.zeros((len(variable_names), number))
+
+    for i, name in enumerate(free_states):
+        y0[len(bound_states) + i] = batch['N_%s' % name]
+
+    # Explicit methods take no Jacobian at all, and LSODA only takes a dense one
+    if method in ['BDF', 'Radau']:
+        kwargs.setdefault('jac', jacobian)
+
+    elif method == 'LSODA':
+        kwargs.setdefault('jac', lambda t, y: jacobian(t, y).toarray())
+
+    solution = scipy.integrate.solve_ivp(rhs, t_span, y0.ravel(), method=method, t_eval=t_eval, **kwargs)
+
+    if not solution.success:
+        raise RuntimeError("Kinetics integration failed: %s" % solution.message)
+
+    return solution.t, solution.y.reshape(len(variable_names), number, -1).transpose(1, 0, 2)
+
+
+def get_final_states(sequence, rates, parameters, t_span=(0, 3600), **kwargs):
+
+    _, states = solve_kinetics(sequence, rates, parameters, t_span=t_span, t_eval=[t_span[-1]], **kwargs)
+
+    return states[..., -1]
+
+
+def relative_bound(species, parameters_wt, parameters_mut, final_states_wt, final_states_mut):
+
+    if species not in free_states:
+        raise ValueError("Perturbation consequence not in known state symbols")
+
+    i = variable_names.index(species)
+    abundance_key = "N_%s" % species
+
+    wt_bound = np.asarray(parameters_wt[abundance_key]) - final_states_wt[..., i]
+    mut_bound = np.asarray(parameters_mut[abundance_key]) - final_states_mut[..., i]
+
+    return mut_bound / wt_bound
+
+
+def find_candidate_sequences(parameters, perturbations, t_span=(0, 3600), **kwargs):
+
+    candidates = []
+
+    for sequence in itertools.permutations(bound_states):
+        rates = infer_rates(sequence, parameters)
+
+        # Only models with positive rates are physical
+        if not all((value > 0).all() for value in rates.values()):
+            continue
+
+        # The wild type and every perturbation, with rates kept at their wild type values, are integrated in one batch
+        batch = [get_batch(parameters)]
+
+        for name, ratio, _ in perturbations:
+            perturbed = dict(batch[0])
+            perturbed[name] = perturbed[name] * ratio
+
+            batch.append(perturbed)
+
+        batch_parameters = {name: np.concatenate([params[name] for params in batch]) for name in parameter_names}
+        batch_rates = {name: np.tile(value, len(batch)) for name, value in rates.items()}
+
+        final_states = get_final_states(sequence, batch_rates, batch_parameters, t_span=t_span, **kwargs)
+        final_states = final_states.reshape(len(batch), -1, len(variable_names))
+
+        checks = []
+
+        # Consequences are given as the expected change in bound fraction, such as '>1' or '<1'
+        for k, (_, _, consequences) in enumerate(perturbations):
+            for species, condition in consequences.items():
+                ratio = relative_bound(species, batch[0], batch[k+1], final_states[0], final_states[k+1])
+                compare = {'>': np.greater, '<': np.less}[condition[0]]
+
+                checks.append(compare(ratio, float(condition[1:])))
+
+        if np.all(checks):
+            candidates.append(tuple(sequence))
+
+    return candidates
+
+
+def make_extrusion_params(sequence, rates, final_states, parameters, extrusion_dict, site_types=None):
+
+    sequence = tuple(sequence)
+    batch = get_batch(parameters)
+
+    # Kinetic rates are the same on every site type, so each type of the template gets a copy of them
+    if site_types is None:
+        site_types = list(extrusion_dict["LEF_diffusion_rate"])
+
+    final_states = np.atleast_2d(final_states)
+    params_list = []
+
+    for k in range(len(final_states)):
+        params = copy.deepcopy(extrusion_dict)
+
+        # Extrusion proceeds in the RN state, so the velocity is rescaled to its share of bound cohesin
+        active_fraction = batch['F_R'][k] * batch['N_R'][k] / final_states[k, variable_names.index('RN')]
+
+        params["velocity_multiplier"] *= float(active_fraction)
+        params["LEF_states"] = {name: i+1 for i, name in enumerate(sequence)}
+        params["LEF_transition_rates"] = {}
+
+        for rate, value in rates.items():
+            s1 = "R%s" % rate[-2]
+            s2 = "R%s" % rate[-1]
+
+            id1 = sequence.index(s1)+1 if s1 in sequence else 0
+            id2 = sequence.index(s2)+1 if s2 in sequence else 0
+
+            value = np.broadcast_to(value, (len(final_states),))[k]
+
+            # Binding rates are pseudo-first order in the free subunit concentration
+            if rate[-1] not in ['R', 'B']:
+                value *= final_states[k, variable_names.index(rate[-1])]
+
+            value = {site_type: float(value) for site_type in site_types}
+
+            if (id1 != 0) and (id2 != 0):
+                params["LEF_transition_rates"]["%d%d" % (id1, id2)] = value
+            elif id1 == 0:
+                params["LEF_on_rate"] = value
+            elif id2 == 0:
+                params["LEF_off_rate"] = value
+                params["LEF_stalled_off_rate"] = dict(value)
+
+        params_list.append(params)
+
+    return params_list
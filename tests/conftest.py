@@ -0,0 +1,129 @@
+import os
+import json
+import warnings
+
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.Translocator import Translocator
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+# A small lattice of 4 replicas with 500 sites each, one barrier pair every 100 sites and 40 LEFs
+SITES_PER_REPLICA = 500
+CTCF_POSITIONS = np.arange(50, SITES_PER_REPLICA, 100)
+
+
+# Equilibrium statistics of the original engines on this lattice, averaged over 6 seeds with 3000 burn-in steps
+# and 2000 samples taken every 20 steps - LEF state fractions, mean loop size of bound LEFs, fraction of stalled
+# legs of bound LEFs and fraction of barrier sites holding a CTCF
+BASELINE_STATISTICS = {'symmetric': {'states': [0.3481, 0.6519],
+                                     'loop_size': 116.36,
+                                     'stalled': 0.0369,
+                                     'ctcf_occupancy': 0.9901},
+                       'asymmetric': {'states': [0.3497, 0.6503],
+                                      'loop_size': 63.74,
+                                      'stalled': 0.0120,
+                                      'ctcf_occupancy': 0.9902},
+                       'static': {'states': [0.3514, 0.6486],
+                                  'loop_size': 115.60,
+                                  'stalled': 0.0412,
+                                  'ctcf_occupancy': 1.},
+                       'multistate': {'states': [0.3514, 0.1677, 0.1161, 0.2789, 0.0860],
+                                      'loop_size': 103.82,
+                                      'stalled': 0.0115,
+                                      'ctcf_occupancy': 0.9900}}
+
+
+def load_params(filename='extrusion_dict.json', **kwargs):
+
+    with open(os.path.join(DATA_PATH, filename)) as param_file:
+        params = json.load(param_file)
+
+    params.update(monomers_per_replica=SITES_PER_REPLICA,
+                  number_of_replica=4,
+                  LEF_separation=50,
+                  steps=100,
+                  dummy_steps=0)
+    params.update(kwargs)
+
+    return params
+
+
+def make_translocator(extrusion_engine=BaseExtruder,
+                      barrier_engine=DynamicBoundary,
+                      filename='extrusion_dict.json',
+                      seed=0,
+                      translocator=Translocator,
+                      **kwargs):
+
+    options = {key: kwargs.pop(key) for key in ['backend', 'compact', 'cache_dir', 'site_arrays', 'processes']
+               if key in kwargs}
+
+    params = load_params(filename, **kwargs)
+    site_types = np.zeros(params['monomers_per_replica'] * params['sites_per_monomer'], dtype=int)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+
+        return translocator(extrusion_engine, barrier_engine, ['A'], site_types, CTCF_POSITIONS, CTCF_POSITIONS,
+                            seed=seed, **options, **params)
+
+
+@pytest.fixture
+def translocator_factory():
+
+    return make_translocator
+
+
+def sample_statistics(translocator, samples=2000, period=20, burn_in=2000):
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    number_of_states = max(getattr(extruder, 'state_dict', {'bound': 1}).values()) + 1
+    number_of_barriers = 2 * len(CTCF_POSITIONS) * translocator.params['number_of_replica']
+
+    translocator.run(burn_in)
+    statistics = []
+
+    for _ in range(samples):
+        translocator.run(period)
+
+        states = extruder.get_states(as_array=True)
+        positions = extruder.get_positions(as_array=True)
+        stalled = extruder.get_array(extruder.stalled)
+
+        is_bound = (positions >= 0).all(axis=1)
+        occupancy = np.count_nonzero(barrier.get_array(barrier.stall_left)) \
+                    + np.count_nonzero(barrier.get_array(barrier.stall_right))
+
+        if is_bound.any():
+            loop_size = np.mean(positions[is_bound, 1] - positions[is_bound, 0])
+            stalled_fraction = np.mean(stalled[is_bound] > 0)
+
+        else:
+            loop_size = stalled_fraction = np.nan
+
+        statistics.append(np.concatenate([np.bincount(states, minlength=number_of_states) / len(states),
+                                          [loop_size, stalled_fraction, occupancy / number_of_barriers]]))
+
+    # Loop sizes and stall fractions are undefined for samples without bound LEFs, which sparse runs can hit
+    statistics = np.nanmean(statistics, axis=0)
+
+    return {'states': statistics[:number_of_states],
+            'loop_size': statistics[-3],
+            'stalled': statistics[-2],
+            'ctcf_occupancy': statistics[-1]}
+
+
+def assert_baseline_statistics(statistics, baseline):
+
+    # With the default sampling, loop sizes and stall fractions of single runs scatter by about 2 and 5 percent
+    np.testing.assert_allclose(statistics['states'], baseline['states'], atol=0.02)
+    np.testing.assert_allclose(statistics['loop_size'], baseline['loop_size'], rtol=0.08)
+    np.testing.assert_allclose(statistics['stalled'], baseline['stalled'], rtol=0.2)
+    np.testing.assert_allclose(statistics['ctcf_occupancy'], baseline['ctcf_occupancy'], atol=0.005)
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from conftest import CTCF_POSITIONS, SITES_PER_REPLICA, load_params
+
+from discrete_time_extrusion import arrays
+from discrete_time_extrusion.Translocator import Translocator
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+
+
+TYPE_LIST = ['A', 'B', 'C']
+VALUES = {'A': 0.5, 'B': 0.25, 'C': 0.}
+
+
+def per_site_values(type_list, site_types, value_dict):
+
+    values = np.zeros(len(site_types))
+
+    for i, name in enumerate(type_list):
+        values[np.equal(site_types, i)] = value_dict[name]
+
+    return values
+
+
+def test_unknown_types_map_onto_the_extra_type():
+
+    site_types = np.array([0, 1, 2, -1, 3, 200])
+    type_array = arrays.make_type_array(np, TYPE_LIST, site_types, number_of_replica=2)
+
+    # A single replica is stored, whatever the number of replicas
+    assert type_array.dtype == np.uint8
+    np.testing.assert_array_equal(type_array, [0, 1, 2, 3, 3, 3])
+
+
+def test_type_tables_end_with_a_zero_entry():
+
+    table = arrays.make_type_table(np, TYPE_LIST, VALUES)
+
+    np.testing.assert_array_equal(table, [0.5, 0.25, 0., 0.])
+
+
+def test_site_arrays_match_per_site_values():
+
+    site_types = np.random.default_rng(0).integers(-1, len(TYPE_LIST) + 2, 100)
+    at_ids = np.arange(3, 100, 7)
+
+    expected = per_site_values(TYPE_LIST, site_types, VALUES)
+
+    np.testing.assert_array_equal(arrays.make_site_array(np, TYPE_LIST, site_types, VALUES, number_of_replica=3),
+                                  np.tile(expected, 3))
+
+    expected[np.setdiff1d(np.arange(100), at_ids)] = 0
+
+    np.testing.assert_array_equal(arrays.make_site_array(np, TYPE_LIST, site_types, VALUES, at_ids=at_ids),
+                                  expected)
+
+
+def test_mismatched_tables_raise():
+
+    with pytest.raises(AssertionError):
+        arrays.make_type_table(np, TYPE_LIST, {'A': 1.})
+
+    with pytest.raises(AssertionError):
+        arrays.make_type_array(np, ['T%d' % i for i in range(255)], np.zeros(10, dtype=int))
+
+
+def test_engines_look_up_per_site_values():
+
+    params = load_params()
+
+    # Every rate takes a different value on each site type, and none on sites of unlisted types
+    for key in ['LEF_on_rate', 'LEF_off_rate', 'LEF_stalled_off_rate', 'LEF_diffusion_rate', 'CTCF_on_rate',
+                'CTCF_off_rate']:
+        params[key] = {'A': params[key]['A'], 'B': 2 * params[key]['A']}
+
+    for key in ['LEF_pause', 'CTCF_facestall', 'CTCF_backstall']:
+        params[key] = {'A': params[key]['A'], 'B': params[key]['A']}
+
+    site_types = np.arange(SITES_PER_REPLICA) % 3
+    translocator = Translocator(BaseExtruder, DynamicBoundary, ['A', 'B'], site_types, CTCF_POSITIONS, CTCF_POSITIONS,
+                                seed=0, **params)
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    lattice_types = np.tile(site_types, params['number_of_replica'])
+    time_unit = params['sites_per_monomer'] * params['velocity_multiplier']
+
+    for table, key in [(extruder.birth_prob, 'LEF_on_rate'),
+                       (extruder.death_prob, 'LEF_off_rate'),
+                       (extruder.stalled_death_prob, 'LEF_stalled_off_rate'),
+                       (extruder.diffusion_prob, 'LEF_diffusion_rate'),
+                       (barrier.birth_prob, 'CTCF_on_rate'),
+                       (barrier.death_prob, 'CTCF_off_rate')]:
+        np.testing.assert_allclose(table[extruder.get_site_types()],
+                                   per_site_values(['A', 'B'], lattice_types, params[key]) / time_unit)
+
+    assert extruder.site_types is barrier.site_types
+    assert len(extruder.site_types) == SITES_PER_REPLICA
+
+    # LEFs only load onto sites of listed types
+    extruder.states[:] = 0
+    extruder.positions[:] = -1
+
+    extruder.reset_occupancies()
+    extruder.reset_site_index()
+
+    for _ in range(20):
+        extruder.states[extruder.birth(0)] = 1
+
+    assert (extruder.states == 1).sum() > 0
+    assert (lattice_types[extruder.positions[extruder.states == 1, 0]] < 2).all()
+
+
+def test_only_stall_arrays_span_the_lattice():
+
+    params = load_params()
+    site_types = np.zeros(SITES_PER_REPLICA, dtype=int)
+
+    translocator = Translocator(BaseExtruder, DynamicBoundary, ['A'], site_types, CTCF_POSITIONS, CTCF_POSITIONS,
+                                seed=0, **params)
+
+    barrier = translocator.barrier_engine
+
+    # Barrier states are kept at the CTCF sites, and the stall arrays in single precision
+    assert barrier.site_types.nbytes == SITES_PER_REPLICA
+
+    assert barrier.states_left.dtype == barrier.states_right.dtype == np.int8
+    assert len(barrier.states_left) == len(barrier.sites_left) == params['number_of_replica'] * len(CTCF_POSITIONS)
+
+    for stall, sites, states in [(barrier.stall_left, barrier.sites_left, barrier.states_left),
+                                 (barrier.stall_right, barrier.sites_right, barrier.states_right)]:
+        assert stall.dtype == np.float32
+        assert len(stall) == barrier.lattice_size
+
+        np.testing.assert_array_equal(stall[sites], states)
+        assert np.count_nonzero(stall) == np.count_nonzero(states)
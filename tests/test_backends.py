@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.extruders import EngineFactory
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, 'extrusion_dict.json'),
+           (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json')]
+
+
+def engine_state(translocator):
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    return [extruder.positions, extruder.states, extruder.stalled, extruder.occupied,
+            barrier.stall_left, barrier.stall_right]
+
+
+@pytest.fixture
+def registered_backend():
+
+    names = []
+
+    def register(name, loader):
+        EngineFactory.register_backend(name, loader)
+        names.append(name)
+
+    yield register
+
+    for name in names:
+        del EngineFactory.engine_registry[name]
+
+
+def test_unknown_backend_raises(translocator_factory):
+
+    with pytest.raises(RuntimeError):
+        translocator_factory(backend='fortran')
+
+
+def test_backend_must_match_device(translocator_factory):
+
+    with pytest.raises(RuntimeError):
+        translocator_factory(backend='cuda')
+
+
+def test_default_backend_is_first_available(translocator_factory):
+
+    backends = EngineFactory.available_backends('CPU')
+
+    assert 'python' in backends
+    assert 'cuda' not in backends
+
+    assert translocator_factory().extrusion_engine.backend == backends[0]
+
+
+def test_backends_failing_to_load_are_not_available(registered_backend):
+
+    def loader():
+        raise ImportError("Missing compiler")
+
+    registered_backend('missing', loader)
+
+    assert 'missing' in EngineFactory.engine_registry
+    assert 'missing' not in EngineFactory.available_backends()
+
+
+def test_registered_backend_runs_its_kernels(translocator_factory, registered_backend):
+
+    calls = []
+
+    def loader():
+        engines = EngineFactory.load_python_engines()
+        diffusion = engines['diffusion']
+
+        def counting_diffusion(*args):
+            calls.append(1)
+            diffusion(*args)
+
+        return dict(engines, diffusion=counting_diffusion)
+
+    registered_backend('counting', loader)
+
+    translocator = translocator_factory(backend='counting')
+    reference = translocator_factory(backend='python')
+
+    translocator.run(20)
+    reference.run(20)
+
+    assert len(calls) == 20
+
+    for array, expected in zip(engine_state(translocator), engine_state(reference)):
+        np.testing.assert_array_equal(array, expected)
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numba_parallel'])
+@pytest.mark.parametrize('mode', ['symmetric', 'asymmetric'])
+@pytest.mark.parametrize('extrusion_engine, filename', ENGINES)
+def test_compiled_backends_match_python_backend(translocator_factory, backend, mode, extrusion_engine, filename):
+
+    if backend not in EngineFactory.available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    # The parallel kernels only write to their own LEF, so they draw and apply the same moves as the serial ones
+    translocator = translocator_factory(extrusion_engine, filename=filename, backend=backend, mode=mode)
+    reference = translocator_factory(extrusion_engine, filename=filename, backend='python', mode=mode)
+
+    translocator.run(200)
+    reference.run(200)
+
+    for array, expected in zip(engine_state(translocator), engine_state(reference)):
+        np.testing.assert_array_equal(array, expected)
+
+
+def test_warmup_resolves_backends():
+
+    assert EngineFactory.warmup('python') == 'python'
+    assert EngineFactory.warmup() == EngineFactory.available_backends('CPU')[0]
+
+    with pytest.raises(RuntimeError):
+        EngineFactory.warmup('fortran')
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numba_parallel'])
+@pytest.mark.parametrize('compact', [False, True])
+def test_warmup_compiles_kernels(backend, compact):
+
+    if backend not in EngineFactory.available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    EngineFactory.warmup(backend, 'asymmetric', compact=compact)
+    engines = EngineFactory.load_backend(backend)['engines']
+
+    # Every kernel an asymmetric run calls has a build for the dtype layout of the mode
+    dtype = 'float32' if compact else 'float64'
+
+    for name in ['diffusion', 'asymmetric', 'transitions', 'fused', 'build_site_index', 'update_site_index', 'loading']:
+        assert any(dtype in str(signature) for signature in engines[name].signatures), name
+
+    # Loops are placed on float64 host arrays, whatever the layout of the run
+    assert len(engines['place_loops'].signatures) > 0
+
+
+def test_parallel_kernels_are_cached_apart_from_serial_ones():
+
+    if 'numba_parallel' not in EngineFactory.available_backends('CPU'):
+        pytest.skip("Backend 'numba_parallel' is not available")
+
+    serial = EngineFactory.load_backend('numba')['engines']
+    parallel = EngineFactory.load_backend('numba_parallel')['engines']
+
+    for name in ['diffusion', 'symmetric', 'asymmetric', 'transitions', 'fused']:
+        assert parallel[name].py_func.__qualname__ == '%s_parallel' % serial[name].py_func.__qualname__
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import run_benchmarks
+
+from discrete_time_extrusion.extruders import EngineFactory
+
+
+CASE = {'extruder': 'BaseExtruder', 'backend': 'python', 'mode': 'symmetric',
+        'monomers_per_replica': 200, 'LEF_separation': 20, 'number_of_replica': 2}
+
+
+def make_result(us_per_step, us_per_step_median=None, phases=None):
+
+    result = dict(CASE, us_per_step=us_per_step, phases={})
+
+    if us_per_step_median is not None:
+        result['us_per_step_median'] = us_per_step_median
+
+    for phase, (us_per_call, us_per_call_median) in (phases or {}).items():
+        result['phases'][phase] = {'us_per_call': us_per_call, 'us_per_call_median': us_per_call_median}
+
+    return result
+
+
+def compare(result, previous, tolerance=None):
+
+    return run_benchmarks.compare([result], {'results': [previous]}, tolerance)
+
+
+def test_run_case_reports_repeats():
+
+    result = run_benchmarks.run_case(steps=10, seed=0, repeats=3, **CASE)
+
+    assert result['repeats'] == 3
+    assert len(result['us_per_step_samples']) == 3
+
+    assert result['us_per_step'] == min(result['us_per_step_samples'])
+    assert result['us_per_step'] <= result['us_per_step_median']
+
+    for record in result['phases'].values():
+        assert 0 < record['us_per_call'] <= record['us_per_call_median']
+
+    assert compare(result, result) == []
+
+
+def test_slower_minimum_and_median_regress():
+
+    previous = make_result(100., 102., {'diffusion': (10., 10.)})
+
+    assert compare(make_result(120., 122., {'diffusion': (12., 12.)}), previous) == []
+
+    regressions = compare(make_result(130., 135., {'diffusion': (13., 13.5)}), previous)
+
+    assert [regression['timing'] for regression in regressions] == ['us_per_step', 'diffusion']
+    assert regressions[0]['tolerance'] == run_benchmarks.MIN_TOLERANCE
+
+
+def test_single_slow_repeats_do_not_regress():
+
+    previous = make_result(100., 102.)
+
+    # One lucky baseline repeat, or one slow repeat now, only moves the minimum or the median
+    assert compare(make_result(130., 104.), previous) == []
+    assert compare(make_result(100., 160.), make_result(100., 100.)) == []
+
+
+def test_noisy_timings_get_more_room():
+
+    previous = make_result(100., 120.)
+
+    # Repeats spreading by 20% allow a slowdown of three times that
+    assert compare(make_result(150., 170.), previous) == []
+    assert compare(make_result(180., 200.), previous)[0]['tolerance'] == pytest.approx(0.6)
+
+
+def test_explicit_tolerance_and_single_sample_baselines():
+
+    previous = make_result(100.)
+
+    assert compare(make_result(110., 111.), previous, tolerance=0.05) != []
+    assert compare(make_result(110., 111.), previous) == []
+    assert compare(make_result(140., 141.), previous) != []
+
+
+def test_scaling_compares_against_one_thread():
+
+    results = [dict(make_result(us_per_step), backend='numba_parallel', threads=threads)
+               for us_per_step, threads in [(400., 1), (110., 4), (60., 8)]]
+
+    # Serial backends and other cases have no single-thread reference to compare against
+    results += [make_result(300.), dict(make_result(50.), backend='numba_parallel', threads=2, LEF_separation=10)]
+
+    scaling = run_benchmarks.get_scaling(results)
+
+    assert [record['threads'] for record in scaling] == [1, 4, 8]
+    assert [record['speedup'] for record in scaling] == pytest.approx([1., 400 / 110, 400 / 60])
+    assert scaling[2]['efficiency'] == pytest.approx(400 / 60 / 8)
+
+
+def test_parallel_cases_record_their_threads():
+
+    if 'numba_parallel' not in EngineFactory.available_backends('CPU'):
+        pytest.skip("Backend 'numba_parallel' is not available")
+
+    case = dict(CASE, extruder='FusedExtruder', backend='numba_parallel')
+    result = run_benchmarks.run_case(steps=10, seed=0, repeats=1, threads=1, **case)
+
+    assert result['threads'] == 1
+    assert run_benchmarks.case_key(result)[-1] == 1
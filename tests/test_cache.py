@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import CTCF_POSITIONS, load_params
+
+from discrete_time_extrusion import arrays, cache
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+
+
+SITE_TYPES = np.zeros(500, dtype=int)
+
+
+def setup_key(site_types=SITE_TYPES, **kwargs):
+
+    params = load_params(**kwargs)
+
+    return cache.setup_key(['A'], site_types, CTCF_POSITIONS, CTCF_POSITIONS, **params)
+
+
+def test_keys_follow_the_setup():
+
+    assert setup_key() == setup_key()
+    assert setup_key() == setup_key(steps=10**6, dummy_steps=10)
+
+    assert setup_key() != setup_key(LEF_separation=51)
+    assert setup_key() != setup_key(LEF_off_rate={'A': 0.0051})
+    assert setup_key() != setup_key(site_types=np.arange(500) % 2)
+
+
+def test_keys_tell_arrays_apart():
+
+    site_types = np.zeros(2000, dtype=int)
+
+    changed = site_types.copy()
+    changed[1000] = 1
+
+    # Long arrays print with ellipses, so that their string forms would be the same
+    assert str(site_types) == str(changed)
+
+    keys = {setup_key(site_profile=array) for array in [site_types, changed, site_types.astype(np.int32),
+                                                        site_types.reshape(40, 50), site_types.tolist()]}
+
+    assert len(keys) == 5
+
+
+def test_keys_tell_types_apart():
+
+    values = [None, 0, False, 0., '0', [0], (0, 1), [[0], 1], [0, [1]], {'0': 0}, {0: '0'}, np.zeros(1)]
+
+    assert len({setup_key(site_profile=value) for value in values}) == len(values)
+
+
+def test_unsupported_params_raise():
+
+    with pytest.raises(TypeError):
+        setup_key(site_profile=object())
+
+    with pytest.raises(TypeError):
+        setup_key(site_profile={'A': {1, 2}})
+
+    with pytest.raises(TypeError):
+        setup_key(site_profile=np.array([None, 1]))
+
+
+@pytest.mark.parametrize('filename', ['extrusion_dict.json', 'extrusion_dict_RN_RB_RP_RW.json'])
+def test_cached_arrays_match_fresh_ones(tmp_path, filename):
+
+    cache_dir = str(tmp_path)
+
+    params = load_params(filename)
+    fresh = arrays.make_translocator_arrays(np, ['A'], SITE_TYPES, CTCF_POSITIONS, CTCF_POSITIONS, **params)
+
+    for _ in range(2):
+        cached = cache.make_cached_translocator_arrays(np, cache_dir, ['A'], SITE_TYPES, CTCF_POSITIONS,
+                                                       CTCF_POSITIONS, **params)
+
+        layout, flat_arrays = arrays.flatten_site_arrays(cached)
+        expected_layout, expected_arrays = arrays.flatten_site_arrays(fresh)
+
+        assert layout == expected_layout
+        assert flat_arrays.keys() == expected_arrays.keys()
+
+        for name, array in flat_arrays.items():
+            np.testing.assert_array_equal(array, expected_arrays[name])
+
+    assert len(os.listdir(cache_dir)) == 1
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+def test_cached_setups_run_alike(translocator_factory, tmp_path, backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+    cache_dir = str(tmp_path / 'cache')
+
+    reference = translocator_factory(backend=backend)
+    translocator = translocator_factory(backend=backend, cache_dir=cache_dir)
+
+    for t in [reference, translocator]:
+        t.run(300)
+
+    np.testing.assert_array_equal(translocator.extrusion_engine.positions, reference.extrusion_engine.positions)
+    translocator.save_checkpoint(checkpoint_path)
+
+    # The restored translocator reads its site arrays back from the cache entry
+    restored = translocator_factory(backend=backend, cache_dir=cache_dir, seed=3)
+    restored.load_checkpoint(checkpoint_path)
+
+    for t in [reference, restored]:
+        t.run(300)
+
+    np.testing.assert_array_equal(restored.extrusion_engine.positions, reference.extrusion_engine.positions)
+    np.testing.assert_array_equal(restored.extrusion_engine.states, reference.extrusion_engine.states)
+
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.boundaries.StaticBoundary import StaticBoundary
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, DynamicBoundary, 'extrusion_dict.json'),
+           (BaseExtruder, StaticBoundary, 'extrusion_dict.json'),
+           (FusedExtruder, DynamicBoundary, 'extrusion_dict.json'),
+           (MultistateExtruder, DynamicBoundary, 'extrusion_dict_RN_RB_RP_RW.json')]
+
+
+def assert_same_trajectories(translocator, reference):
+
+    for name in ['state_trajectory', 'lef_trajectory', 'ctcf_trajectory']:
+        samples = getattr(translocator, name)
+        expected = getattr(reference, name)
+
+        assert len(samples) == len(expected)
+
+        for sample, expected_sample in zip(samples, expected):
+            np.testing.assert_array_equal(sample, expected_sample)
+
+
+@pytest.mark.parametrize('extrusion_engine, barrier_engine, filename', ENGINES)
+def test_resumed_run_matches_uninterrupted_run(translocator_factory, tmp_path, extrusion_engine, barrier_engine, filename):
+
+    make = lambda: translocator_factory(extrusion_engine, barrier_engine, filename, seed=3)
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+
+    reference = make()
+    reference.run_trajectory(steps=30, path=str(tmp_path / 'reference'), dummy_steps=5,
+                             checkpoint_path=str(tmp_path / 'reference.npz'), checkpoint_interval=10)
+
+    # Interrupted after 20 samples, and picked up by a fresh translocator from the last checkpoint
+    interrupted = make()
+    interrupted.run_trajectory(steps=20, path=str(tmp_path / 'resumed'), dummy_steps=5,
+                               checkpoint_path=checkpoint_path, checkpoint_interval=10)
+
+    resumed = make()
+    resumed.load_checkpoint(checkpoint_path)
+
+    assert resumed.sample_count == 20
+    assert resumed.step_count == interrupted.step_count
+
+    resumed.run_trajectory(steps=30, path=str(tmp_path / 'resumed'), resume=True,
+                           checkpoint_path=checkpoint_path, checkpoint_interval=10)
+
+    assert_same_trajectories(resumed, reference)
+
+    np.testing.assert_array_equal(resumed.extrusion_engine.positions, reference.extrusion_engine.positions)
+    np.testing.assert_array_equal(resumed.extrusion_engine.occupied, reference.extrusion_engine.occupied)
+
+
+def test_checkpoint_restores_engine_state(translocator_factory, tmp_path):
+
+    translocator = translocator_factory()
+    translocator.run(200)
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+    translocator.save_checkpoint(checkpoint_path)
+
+    restored = translocator_factory(seed=1)
+    restored.load_checkpoint(checkpoint_path)
+
+    for engine, restored_engine in [(translocator.extrusion_engine, restored.extrusion_engine),
+                                    (translocator.barrier_engine, restored.barrier_engine)]:
+        restored_checkpoint = restored_engine.get_checkpoint()
+
+        for key, array in engine.get_checkpoint().items():
+            np.testing.assert_array_equal(restored_checkpoint[key], array)
+
+    assert restored.step_count == translocator.step_count
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS, assert_baseline_statistics, sample_statistics
+
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, 'extrusion_dict.json', 'symmetric'),
+           (FusedExtruder, 'extrusion_dict.json', 'symmetric'),
+           (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json', 'multistate')]
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def test_compact_dtypes(translocator_factory):
+
+    translocator = translocator_factory(MultistateExtruder, filename='extrusion_dict_RN_RB_RP_RW.json', compact=True)
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    assert extruder.stalled.dtype == extruder.directions.dtype == np.uint8
+    assert extruder.positions.dtype == np.int32
+
+    for table in [extruder.birth_prob, extruder.death_prob, extruder.stalled_death_prob, extruder.diffusion_prob,
+                  extruder.pause_prob, extruder.transition_probs, barrier.stall_left, barrier.stall_right]:
+        assert table.dtype == np.float32
+
+    assert translocator.rng.random(4).dtype == np.float32
+
+
+@pytest.mark.parametrize('extrusion_engine, filename, baseline', ENGINES)
+def test_compact_backends_agree(translocator_factory, extrusion_engine, filename, baseline):
+
+    require_backend('numba')
+
+    reference = translocator_factory(extrusion_engine, filename=filename, backend='python', compact=True)
+    compiled = translocator_factory(extrusion_engine, filename=filename, backend='numba', compact=True)
+
+    reference.run(200)
+    compiled.run(200)
+
+    for name in ['states', 'positions', 'stalled', 'directions']:
+        np.testing.assert_array_equal(getattr(compiled.extrusion_engine, name),
+                                      getattr(reference.extrusion_engine, name))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_checkpoints_load_across_modes(translocator_factory, tmp_path, compact):
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+
+    translocator = translocator_factory(compact=compact)
+    translocator.run(200)
+    translocator.save_checkpoint(checkpoint_path)
+
+    restored = translocator_factory(compact=not compact, seed=1)
+    restored.load_checkpoint(checkpoint_path)
+
+    for name in ['states', 'positions', 'stalled', 'directions', 'occupied']:
+        expected = getattr(translocator.extrusion_engine, name)
+        array = getattr(restored.extrusion_engine, name)
+
+        assert array.dtype == getattr(translocator_factory(compact=not compact).extrusion_engine, name).dtype
+        np.testing.assert_array_equal(array, expected)
+
+    restored.run(200)
+
+
+@pytest.mark.parametrize('extrusion_engine, filename, baseline', ENGINES)
+def test_compact_statistics_match_baseline(translocator_factory, extrusion_engine, filename, baseline):
+
+    require_backend('numba')
+
+    translocator = translocator_factory(extrusion_engine, filename=filename, backend='numba', compact=True)
+    statistics = sample_statistics(translocator)
+
+    assert_baseline_statistics(statistics, BASELINE_STATISTICS[baseline])
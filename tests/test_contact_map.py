@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.ContactMap import ContactMap
+
+
+def reference_map(positions, sites_per_replica, bin_size):
+
+    # Offline histogram of the folded bound leg pairs, with bin edges covering every site of the replica
+    ll = np.mod(positions, sites_per_replica)
+    ll = ll[ll[:, 1] > ll[:, 0]]
+
+    edges = np.arange((sites_per_replica + bin_size - 1) // bin_size + 1) * bin_size
+    lmap = np.histogram2d(ll[:, 0], ll[:, 1], edges)[0]
+
+    return lmap + lmap.T
+
+
+@pytest.mark.parametrize('bin_size', [1, 3, 7])
+def test_dense_and_sparse_maps_match_offline_histogram(translocator_factory, bin_size):
+
+    translocator = translocator_factory()
+    sites_per_replica = translocator.params['monomers_per_replica']
+
+    dense = translocator.add_contact_map(bin_size)
+    sparse = translocator.add_contact_map(bin_size, sparse=True, buffer_size=50)
+
+    translocator.run_trajectory(steps=200, period=5, dummy_steps=100)
+
+    history = np.concatenate(list(translocator.lef_trajectory))
+    expected = reference_map(history, sites_per_replica, bin_size)
+
+    assert dense.samples == sparse.samples == 200
+
+    np.testing.assert_array_equal(dense.get_map(), expected)
+    np.testing.assert_array_equal(sparse.get_map().toarray(), expected)
+
+
+def test_contact_map_checkpoint(translocator_factory):
+
+    translocator = translocator_factory()
+    contact_map = translocator.add_contact_map(sparse=True)
+
+    translocator.run_trajectory(steps=20)
+
+    restored = ContactMap(translocator.params['monomers_per_replica'], sparse=True)
+    restored.set_checkpoint(contact_map.get_checkpoint())
+
+    assert restored.samples == contact_map.samples
+    assert (restored.get_map() != contact_map.get_map()).nnz == 0
@@ -0,0 +1,196 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+
+
+def assert_heap_order(events):
+
+    # Each parent comes no later than its children, so that the root is the earliest event
+    for i in range(1, len(events)):
+        assert events[(i-1) // 2] <= events[i]
+
+
+def assert_consistent_events(barrier):
+
+    expected = [(time, 0, k) for k, time in enumerate(barrier.event_left.tolist())]
+    expected += [(time, 1, k) for k, time in enumerate(barrier.event_right.tolist())]
+
+    # One pending event per barrier site, none of them overdue
+    assert sorted(barrier.events) == sorted(expected)
+    assert_heap_order(barrier.events)
+    assert min(expected)[0] > barrier.clock
+
+
+@pytest.mark.parametrize('extrusion_engine', [BaseExtruder, FusedExtruder])
+def test_event_heap_follows_event_times(translocator_factory, extrusion_engine):
+
+    translocator = translocator_factory(extrusion_engine)
+
+    for _ in range(5):
+        translocator.run(200)
+        assert_consistent_events(translocator.barrier_engine)
+
+    assert translocator.barrier_engine.clock == 1000
+
+
+def test_events_pop_in_time_order(translocator_factory):
+
+    translocator = translocator_factory(CTCF_on_rate={'A': 0.04}, CTCF_off_rate={'A': 0.04})
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    for _ in range(50):
+        barrier.step(extruder)
+
+        # Draining a copy of the heap gives every pending event once, earliest first and then by leg and site
+        events = list(barrier.events)
+        popped = [heapq.heappop(events) for _ in range(len(events))]
+
+        assert popped == sorted(barrier.events)
+        assert popped[0][0] == min(barrier.event_left.min(), barrier.event_right.min())
+
+
+def test_sites_flip_at_their_event_times(translocator_factory):
+
+    translocator = translocator_factory(CTCF_on_rate={'A': 0.04}, CTCF_off_rate={'A': 0.04})
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    for _ in range(50):
+        event_left, event_right = barrier.event_left.copy(), barrier.event_right.copy()
+        states_left, states_right = barrier.states_left.copy(), barrier.states_right.copy()
+
+        barrier.step(extruder)
+
+        for event, states, new_states, sites, stall in [(event_left, states_left, barrier.states_left,
+                                                         barrier.sites_left, barrier.stall_left),
+                                                        (event_right, states_right, barrier.states_right,
+                                                         barrier.sites_right, barrier.stall_right)]:
+            is_due = event == barrier.clock
+
+            np.testing.assert_array_equal(new_states != states, is_due)
+            np.testing.assert_array_equal(stall[sites], new_states)
+
+        assert_consistent_events(barrier)
+
+
+def test_steps_without_events_draw_nothing(translocator_factory):
+
+    translocator = translocator_factory()
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    next_event = barrier.events[0][0]
+    state = barrier.rng.get_state()
+
+    for _ in range(next_event - 1):
+        barrier.step(extruder)
+
+    assert barrier.rng.get_state() == state
+
+    barrier.step(extruder)
+
+    assert barrier.rng.get_state() != state
+
+
+def test_ctcf_statistics(translocator_factory):
+
+    # Rates are divided by the velocity multiplier, into birth and death probabilities of 0.05 and 0.15 per step
+    translocator = translocator_factory(CTCF_on_rate={'A': 0.01}, CTCF_off_rate={'A': 0.03})
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    states = np.concatenate([barrier.states_left, barrier.states_right])
+
+    bound = []
+    flips = 0
+
+    for _ in range(20000):
+        barrier.step(extruder)
+
+        new_states = np.concatenate([barrier.states_left, barrier.states_right])
+        flips += (new_states != states).sum()
+
+        states = new_states
+        bound.append(states.mean())
+
+    # Two-state chain with occupancy b/(b+d), flipping at rate 2bd/(b+d) per site
+    assert np.mean(bound) == pytest.approx(0.25, abs=0.02)
+    assert flips / (20000 * len(states)) == pytest.approx(2 * 0.05 * 0.15 / 0.2, rel=0.05)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', [(BaseExtruder, 'python'),
+                                                       (FusedExtruder, 'python'),
+                                                       (FusedExtruder, 'numba')])
+def test_ctcf_death_releases_stalled_legs(translocator_factory, extrusion_engine, backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    # Without diffusion, legs only come off a CTCF when it unbinds
+    translocator = translocator_factory(extrusion_engine, backend=backend, LEF_diffusion_rate={'A': 0})
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    # Legs stalled at 50 and 250 by left CTCFs, and at 150 by a right CTCF - only the left CTCFs at 50 and 150 unbind
+    extruder.states[:] = 0
+    extruder.positions[:] = -1
+
+    extruder.states[:3] = 1
+    extruder.positions[:3] = [[50, 80], [140, 150], [230, 250]]
+    extruder.stalled[:3] = [[True, False], [False, True], [False, True]]
+
+    extruder.reset_occupancies()
+
+    barrier.states_left[:] = 1
+    barrier.states_right[:] = 1
+
+    barrier.stall_left[barrier.sites_left] = 1
+    barrier.stall_right[barrier.sites_right] = 1
+
+    barrier.event_left[:] = barrier.clock + 10**6
+    barrier.event_right[:] = barrier.clock + 10**6
+
+    barrier.event_left[np.isin(barrier.sites_left, [50, 150])] = barrier.clock + 1
+    barrier.reset_events()
+
+    translocator.run(1)
+
+    assert (barrier.states_left[np.isin(barrier.sites_left, [50, 150])] == 0).all()
+
+    np.testing.assert_array_equal(extruder.stalled[:3], [[False, False], [False, True], [False, True]])
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', [(BaseExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba_parallel')])
+def test_stalled_legs_sit_on_bound_ctcfs(translocator_factory, extrusion_engine, backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    # Fast CTCF turnover, so that many stalled legs see their CTCF unbind
+    translocator = translocator_factory(extrusion_engine, backend=backend, CTCF_off_rate={'A': 0.02})
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    for _ in range(100):
+        translocator.run(20)
+
+        is_bound = extruder.positions >= 0
+
+        for leg, stall in enumerate([barrier.stall_left, barrier.stall_right]):
+            is_stalled = extruder.stalled[:, leg].astype(bool) * is_bound[:, leg]
+
+            assert (stall[extruder.positions[is_stalled, leg]] > 0).all()
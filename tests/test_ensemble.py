@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from conftest import CTCF_POSITIONS, load_params
+
+from discrete_time_extrusion.ensemble import get_context, run_ensemble
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+
+
+def summarize(translocator):
+
+    extruder = translocator.extrusion_engine
+
+    return {'positions': extruder.positions.copy(),
+            'number_of_LEFs': extruder.number,
+            'shared': not extruder.birth_prob.flags.writeable}
+
+
+def run(seed, **kwargs):
+
+    params = load_params(steps=10, **kwargs)
+    site_types = np.zeros(params['monomers_per_replica'], dtype=int)
+
+    return run_ensemble(BaseExtruder, DynamicBoundary, ['A'], site_types, CTCF_POSITIONS, CTCF_POSITIONS,
+                        processes=2, seed=seed, analysis=summarize, **params)
+
+
+def test_ensemble_is_reproducible():
+
+    results = run(7, number_of_realizations=3)
+    repeated = run(7, number_of_realizations=3)
+
+    for result, repeated_result in zip(results, repeated):
+        np.testing.assert_array_equal(result['positions'], repeated_result['positions'])
+
+    # Realizations draw from independent streams
+    assert not np.array_equal(results[0]['positions'], results[1]['positions'])
+
+
+def test_realizations_match_standalone_runs(translocator_factory):
+
+    results = run(7, number_of_realizations=2)
+    seeds = np.random.SeedSequence(7).spawn(2)
+
+    for result, seed in zip(results, seeds):
+        translocator = translocator_factory(seed=seed, steps=10)
+        translocator.run_trajectory()
+
+        np.testing.assert_array_equal(result['positions'], translocator.extrusion_engine.positions)
+
+
+def test_param_list_realizations_share_site_arrays():
+
+    results = run(7, param_list=[{'LEF_separation': 50}, {'LEF_separation': 100}, {'LEF_separation': 50}])
+
+    assert [result['number_of_LEFs'] for result in results] == [40, 20, 40]
+    assert all(result['shared'] for result in results)
+
+
+def test_ensemble_needs_realizations():
+
+    with pytest.raises(RuntimeError):
+        run(7)
+
+
+def test_ensemble_runs_after_parallel_kernels(translocator_factory):
+
+    if 'numba_parallel' not in available_backends('CPU'):
+        pytest.skip("Backend 'numba_parallel' is not available")
+
+    # Starts numba's thread pool in this process, after which forked workers would hang
+    translocator_factory(backend='numba_parallel').run(10)
+
+    assert get_context().get_start_method() == 'spawn'
+
+    results = run(7, number_of_realizations=2)
+    reference = run(7, number_of_realizations=2, start_method='spawn')
+
+    for result, expected in zip(results, reference):
+        np.testing.assert_array_equal(result['positions'], expected['positions'])
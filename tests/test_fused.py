@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS, CTCF_POSITIONS, assert_baseline_statistics, load_params, sample_statistics
+
+from discrete_time_extrusion.ensemble import run_ensemble
+from discrete_time_extrusion.boundaries.StaticBoundary import StaticBoundary
+from discrete_time_extrusion.boundaries.DynamicBoundary import DynamicBoundary
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.engines.FusedEngines import _philox, _resolve_moves
+
+
+CASES = [(DynamicBoundary, 'symmetric', 'symmetric'),
+         (DynamicBoundary, 'asymmetric', 'asymmetric'),
+         (StaticBoundary, 'symmetric', 'static')]
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def engine_state(translocator):
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    return [extruder.positions, extruder.states, extruder.stalled, extruder.occupied, extruder.site_owners,
+            barrier.stall_left, barrier.stall_right]
+
+
+@pytest.mark.parametrize('mode', ['symmetric', 'asymmetric'])
+def test_python_and_numba_kernels_agree(translocator_factory, mode):
+
+    require_backend('numba')
+
+    reference = translocator_factory(FusedExtruder, backend='python', mode=mode)
+    compiled = translocator_factory(FusedExtruder, backend='numba', mode=mode)
+
+    reference.run(300)
+    compiled.run(300)
+
+    for array, expected in zip(engine_state(compiled), engine_state(reference)):
+        np.testing.assert_array_equal(array, expected)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba', 'numba_parallel'])
+def test_fused_occupancies_follow_positions(translocator_factory, backend):
+
+    require_backend(backend)
+
+    translocator = translocator_factory(FusedExtruder, backend=backend)
+    translocator.run(300)
+
+    extruder = translocator.extrusion_engine
+
+    occupied = extruder.occupied.copy()
+    site_owners = extruder.site_owners.copy()
+
+    extruder.reset_occupancies()
+
+    np.testing.assert_array_equal(occupied, extruder.occupied)
+    np.testing.assert_array_equal(site_owners, extruder.site_owners)
+
+
+def test_site_index_is_rebuilt_only_when_loading_needs_it(translocator_factory):
+
+    require_backend('numba')
+
+    translocator = translocator_factory(FusedExtruder, backend='numba')
+    extruder = translocator.extrusion_engine
+
+    calls = []
+    site_index_engine = extruder.site_index_engine
+
+    extruder.site_index_engine = lambda sim, *args: calls.append(args) or site_index_engine(sim, *args)
+
+    for _ in range(5):
+        translocator.run(50)
+
+    # Fused calls leave the index stale instead of rebuilding it over the whole lattice
+    assert calls == []
+    assert extruder.site_index_stale
+
+    # A batched loading step rebuilds it once, from the occupancies it starts from
+    occupied = extruder.occupied.copy()
+    extruder.birth(0)
+
+    assert calls == [()]
+    assert not extruder.site_index_stale
+
+    np.testing.assert_array_equal(extruder.site_weights,
+                                  np.where(occupied, 0., extruder.birth_prob[extruder.get_site_types()]))
+
+
+def test_parallel_kernel_is_reproducible(translocator_factory):
+
+    require_backend('numba_parallel')
+
+    translocators = [translocator_factory(FusedExtruder, backend='numba_parallel') for _ in range(2)]
+
+    for translocator in translocators:
+        translocator.run(300)
+
+    for array, expected in zip(*map(engine_state, translocators)):
+        np.testing.assert_array_equal(array, expected)
+
+
+@pytest.mark.parametrize('mode', ['symmetric', 'asymmetric'])
+def test_serial_and_parallel_kernels_agree(translocator_factory, mode):
+
+    require_backend('numba')
+    require_backend('numba_parallel')
+
+    # Both backends build the same kernel, whose parallel loops draw from per-LEF streams and settle claims by LEF order
+    serial = translocator_factory(FusedExtruder, backend='numba', mode=mode, seed=11)
+    parallel = translocator_factory(FusedExtruder, backend='numba_parallel', mode=mode, seed=11)
+
+    serial_statistics = sample_statistics(serial, samples=200)
+    parallel_statistics = sample_statistics(parallel, samples=200)
+
+    for name, value in serial_statistics.items():
+        np.testing.assert_array_equal(parallel_statistics[name], value)
+
+    for array, expected in zip(engine_state(parallel), engine_state(serial)):
+        np.testing.assert_array_equal(array, expected)
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numba_parallel'])
+@pytest.mark.parametrize('barrier_engine, mode, baseline', CASES)
+def test_fused_statistics_match_baseline(translocator_factory, backend, barrier_engine, mode, baseline):
+
+    require_backend(backend)
+
+    translocator = translocator_factory(FusedExtruder, barrier_engine, backend=backend, mode=mode)
+    statistics = sample_statistics(translocator)
+
+    assert_baseline_statistics(statistics, BASELINE_STATISTICS[baseline])
+
+
+def test_philox_matches_reference_output():
+
+    # Random123 known answer for Philox4x32-10 with a zero counter and key
+    values = _philox(np.uint64(0), np.uint64(0), 0, 0)
+
+    assert [int(value * 2**32) for value in values] == [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]
+
+
+def resolve_moves(previous_positions, positions, lattice_size=20):
+
+    previous_positions = np.array(previous_positions)
+    positions = np.array(positions)
+
+    occupied = np.zeros(lattice_size, dtype=bool)
+    site_owners = np.full(lattice_size, -1)
+
+    for i, legs in enumerate(previous_positions):
+        occupied[legs] = True
+        site_owners[legs] = i
+
+    collisions = _resolve_moves(len(positions), occupied, site_owners, positions, previous_positions)
+
+    return positions, collisions, occupied, site_owners
+
+
+# Legs stepping onto the same site from either side, and from one site for the two legs of a LEF
+CONTESTS = [([[2, 5], [7, 10]], [[2, 6], [6, 10]], [[2, 6], [7, 10]]),
+            ([[7, 10], [2, 5]], [[6, 10], [2, 6]], [[6, 10], [2, 5]]),
+            ([[5, 5]], [[4, 4]], [[4, 5]])]
+
+
+@pytest.mark.parametrize('previous_positions, positions, expected', CONTESTS)
+def test_first_leg_in_order_keeps_contested_sites(previous_positions, positions, expected):
+
+    positions, collisions, occupied, site_owners = resolve_moves(previous_positions, positions)
+
+    assert collisions == 1
+    np.testing.assert_array_equal(positions, expected)
+
+    # The first leg holds the site, and the others keep the sites they came from
+    expected_owners = np.full(len(site_owners), -1)
+
+    for i, legs in enumerate(expected):
+        expected_owners[legs] = i
+
+    np.testing.assert_array_equal(site_owners, expected_owners)
+    np.testing.assert_array_equal(occupied, expected_owners >= 0)
+
+
+def summarize(translocator):
+
+    return translocator.extrusion_engine.positions.copy()
+
+
+def test_fused_static_barriers_run_on_shared_arrays():
+
+    # Shared site arrays are read-only in the workers, while the fused kernel writes to the barrier arrays
+    params = load_params(steps=10, dummy_steps=100)
+    site_types = np.zeros(params['monomers_per_replica'], dtype=int)
+
+    results = run_ensemble(FusedExtruder, StaticBoundary, ['A'], site_types, CTCF_POSITIONS, CTCF_POSITIONS,
+                           processes=2, seed=7, number_of_realizations=2, analysis=summarize, start_method='spawn',
+                           **params)
+
+    assert len(results) == 2
+    assert all((positions >= 0).any() for positions in results)
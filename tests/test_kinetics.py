@@ -0,0 +1,161 @@
+import os
+import json
+import warnings
+
+import numpy as np
+import pytest
+
+from conftest import DATA_PATH
+
+from discrete_time_extrusion import arrays, kinetics
+
+
+SEQUENCE = ('RN', 'RB', 'RP', 'RW')
+
+
+@pytest.fixture(scope='module')
+def parameters():
+
+    return kinetics.load_parameter_table(os.path.join(DATA_PATH, 'biophysical_params_HeLa.csv'))
+
+
+def load_json(name):
+
+    with open(os.path.join(DATA_PATH, name)) as json_file:
+        return json.load(json_file)
+
+
+def make_extrusion_params(parameters, extrusion_dict, **kwargs):
+
+    rates = kinetics.infer_rates(SEQUENCE, parameters)
+    final_states = kinetics.get_final_states(SEQUENCE, rates, parameters, method='RK45')
+
+    return kinetics.make_extrusion_params(SEQUENCE, rates, final_states, parameters, extrusion_dict, **kwargs)
+
+
+def get_equilibrium(parameters):
+
+    batch = kinetics.get_batch(parameters)
+
+    # Bound and free concentrations implied by the abundances and chromatin-bound fractions
+    bound = {name: batch['N_%s' % name[-1]] * batch['F_%s' % name[-1]] for name in ['RN', 'RP', 'RW']}
+    bound['RB'] = batch['N_R'] * batch['F_R'] - sum(bound.values())
+
+    free = {name: batch['N_%s' % name] * (1 - batch['F_%s' % name]) for name in kinetics.free_states}
+
+    return np.stack([{**bound, **free}[name] for name in kinetics.variable_names], axis=-1)
+
+
+@pytest.mark.parametrize('method', ['BDF', 'Radau', 'LSODA', 'RK45', 'RK23', 'DOP853'])
+def test_methods_reach_the_equilibrium(parameters, method):
+
+    rates = kinetics.infer_rates(SEQUENCE, parameters)
+
+    # Only methods that use a Jacobian are given one, so that none of them warns about unused arguments
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+
+        final_states = kinetics.get_final_states(SEQUENCE, rates, parameters, t_span=(0, 7200), method=method,
+                                                 rtol=1e-6, atol=1e-6)
+
+    np.testing.assert_allclose(final_states, get_equilibrium(parameters), rtol=1e-3)
+
+
+def test_explicit_jacobians_override_the_default(parameters):
+
+    rates = kinetics.infer_rates(SEQUENCE, parameters)
+
+    reference = kinetics.get_final_states(SEQUENCE, rates, parameters, method='BDF')
+    final_states = kinetics.get_final_states(SEQUENCE, rates, parameters, method='BDF', jac=None)
+
+    np.testing.assert_allclose(final_states, reference, rtol=1e-3)
+
+
+@pytest.mark.parametrize('method', ['BDF', 'LSODA'])
+def test_batches_match_single_solves(parameters, method):
+
+    sweep = kinetics.sweep_parameters(parameters, 'N_W', [0.5, 1., 2.])
+
+    rates = kinetics.infer_rates(SEQUENCE, parameters)
+    batch_rates = {name: np.repeat(value, 3) for name, value in rates.items()}
+
+    final_states = kinetics.get_final_states(SEQUENCE, batch_rates, sweep, method=method, rtol=1e-8, atol=1e-8)
+
+    for k in range(3):
+        single = kinetics.get_final_states(SEQUENCE, rates, {name: value[k:k+1] for name, value in sweep.items()},
+                                           method=method, rtol=1e-8, atol=1e-8)
+
+        np.testing.assert_allclose(final_states[k], single[0], rtol=1e-5)
+
+    # Less WAPL leaves less of it bound
+    bound_W = sweep['N_W'] - final_states[:, kinetics.variable_names.index('W')]
+
+    assert (np.diff(bound_W) > 0).all()
+
+
+def test_parameter_sets_load_one_per_row(parameters, tmp_path):
+
+    names = list(parameters)
+
+    path = tmp_path / 'parameter_sets.csv'
+    path.write_text('# Reference set followed by one with twice as much WAPL\n'
+                    + ','.join(names) + '\n'
+                    + ','.join('%r' % float(parameters[name][0]) for name in names) + '\n'
+                    + ','.join('%r' % float(parameters[name][0] * (2 if name == 'N_W' else 1)) for name in names) + '\n')
+
+    table = kinetics.load_parameter_table(str(path))
+
+    assert list(table) == names
+
+    for name in names:
+        assert table[name].shape == (2,)
+        assert table[name][0] == parameters[name][0]
+
+    np.testing.assert_array_equal(table['N_W'], parameters['N_W'][0] * np.array([1., 2.]))
+
+
+def test_perturbations_single_out_the_reference_sequence(parameters):
+
+    # WAPL and PDS5 depletions raise the amount of bound cohesin, while NIPBL depletion lowers it
+    perturbations = [['N_W', 1/5, {'R': '>1'}], ['N_P', 1/5, {'R': '>1'}], ['N_N', 1/5, {'R': '<1'}]]
+
+    assert kinetics.find_candidate_sequences(parameters, perturbations) == [SEQUENCE]
+
+
+def test_extrusion_params_reproduce_the_reference_dict(parameters):
+
+    params_list = make_extrusion_params(parameters, load_json('extrusion_dict.json'))
+    expected = load_json('extrusion_dict_RN_RB_RP_RW.json')
+
+    assert len(params_list) == 1
+    assert set(params_list[0]) == set(expected)
+
+    for name, value in expected.items():
+        if name == 'LEF_transition_rates':
+            assert set(params_list[0][name]) == set(value)
+
+            for ids, rates in value.items():
+                assert params_list[0][name][ids] == pytest.approx(rates, rel=1e-9)
+
+        elif isinstance(value, str):
+            assert params_list[0][name] == value
+
+        else:
+            assert params_list[0][name] == pytest.approx(value, rel=1e-9)
+
+
+def test_extrusion_params_cover_every_site_type(parameters):
+
+    extrusion_dict = load_json('extrusion_dict_nonuniform.json')
+    type_list = list(extrusion_dict['LEF_diffusion_rate'])
+
+    params = make_extrusion_params(parameters, extrusion_dict)[0]
+
+    for name in ['LEF_on_rate', 'LEF_off_rate', 'LEF_stalled_off_rate']:
+        rate_table = arrays.make_type_table(np, type_list, params[name])
+
+        assert len(set(rate_table[:-1])) == 1
+
+    transition_dict = arrays.make_LEF_transition_dict(np, type_list, np.zeros(10, dtype=int), **params)
+
+    assert set(transition_dict['LEF_transitions']) == set(params['LEF_transition_rates'])
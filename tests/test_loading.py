@@ -0,0 +1,258 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.extruders.EngineFactory import available_backends, load_backend
+
+
+BACKENDS = ['python', 'numba']
+
+
+class SiteIndex():
+
+    def __init__(self, backend, lattice_size, block_size, birth_prob, site_types, occupied):
+
+        self.kernels = load_backend(backend)['engines']
+
+        self.L = lattice_size
+        self.B = block_size
+
+        self.occupied = occupied
+        self.site_types = site_types
+        self.birth_prob = birth_prob
+
+        number_of_blocks = (lattice_size + block_size - 1) // block_size
+
+        self.weights = np.zeros(lattice_size, dtype=np.float64)
+        self.tree_weights = np.zeros(number_of_blocks+1, dtype=np.float64)
+        self.tree_counts = np.zeros(number_of_blocks+1, dtype=np.int64)
+
+        self.build()
+
+
+    def arrays(self):
+
+        return (self.occupied, self.site_types, self.birth_prob, self.weights, self.tree_weights, self.tree_counts)
+
+
+    def build(self):
+
+        self.kernels['build_site_index'](self.L, self.B, *self.arrays())
+
+
+    def update(self, sites):
+
+        self.kernels['update_site_index'](sites, len(sites), self.B, *self.arrays())
+
+
+    def load(self, rngs, ranges, range_bounds):
+
+        sites = np.full(len(rngs), -1, dtype=np.int32)
+
+        prefix_weights = np.zeros(len(range_bounds), dtype=np.float64)
+        prefix_counts = np.zeros(len(range_bounds), dtype=np.int64)
+
+        self.kernels['loading'](rngs, len(rngs), self.L, self.B, self.weights, self.tree_weights, self.tree_counts,
+                                ranges, range_bounds, prefix_weights, prefix_counts, sites)
+
+        return sites
+
+
+def make_index(backend, lattice_size=1000, block_size=8, seed=0):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    rng = np.random.default_rng(seed)
+
+    birth_prob = np.array([0., 0.1, 0.5, 1.])
+    site_types = rng.integers(0, len(birth_prob), lattice_size)
+    occupied = rng.random(lattice_size) < 0.3
+
+    return SiteIndex(backend, lattice_size, block_size, birth_prob, site_types, occupied)
+
+
+def expected_weights(index):
+
+    return np.where(index.occupied, 0., index.birth_prob[index.site_types])
+
+
+def brute_force_tree(index):
+
+    # Node i of the 1-based Fenwick tree sums the blocks i - lowbit(i) + 1 to i
+    weights = expected_weights(index)
+    number_of_blocks = len(index.tree_weights) - 1
+
+    block_weights = np.zeros(number_of_blocks+1)
+    block_counts = np.zeros(number_of_blocks+1, dtype=np.int64)
+
+    np.add.at(block_weights, np.arange(index.L) // index.B + 1, weights)
+    np.add.at(block_counts, np.arange(index.L) // index.B + 1, weights > 0)
+
+    nodes = np.arange(1, number_of_blocks+1)
+    first = nodes - (nodes & -nodes) + 1
+
+    tree_weights = np.zeros(number_of_blocks+1)
+    tree_counts = np.zeros(number_of_blocks+1, dtype=np.int64)
+
+    tree_weights[1:] = [block_weights[a:b+1].sum() for a, b in zip(first, nodes)]
+    tree_counts[1:] = [block_counts[a:b+1].sum() for a, b in zip(first, nodes)]
+
+    return weights, tree_weights, tree_counts
+
+
+def assert_index_matches_sites(index):
+
+    weights, tree_weights, tree_counts = brute_force_tree(index)
+
+    np.testing.assert_array_equal(index.weights, weights)
+    np.testing.assert_allclose(index.tree_weights, tree_weights, atol=1e-9)
+    np.testing.assert_array_equal(index.tree_counts, tree_counts)
+
+
+def assert_consistent_index(index):
+
+    weights, tree_weights, tree_counts = index.weights.copy(), index.tree_weights.copy(), index.tree_counts.copy()
+    index.build()
+
+    np.testing.assert_array_equal(weights, index.weights)
+    np.testing.assert_allclose(tree_weights, index.tree_weights, atol=1e-9)
+    np.testing.assert_array_equal(tree_counts, index.tree_counts)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('lattice_size, block_size', [(1000, 8), (1000, 7), (64, 64), (5, 8)])
+def test_tree_nodes_sum_their_blocks(backend, lattice_size, block_size):
+
+    index = make_index(backend, lattice_size=lattice_size, block_size=block_size)
+    assert_index_matches_sites(index)
+
+    rng = np.random.default_rng(4)
+
+    # Occupying and freeing sites, including the first and last, walks every level of the tree
+    for sites in [np.array([0, lattice_size-1]), rng.integers(0, lattice_size, 10), np.arange(lattice_size)]:
+        for occupied in [True, False]:
+            index.occupied[sites] = occupied
+            index.update(sites)
+
+            assert_index_matches_sites(index)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_sites_are_drawn_in_proportion_to_their_weights(backend):
+
+    index = make_index(backend)
+    cumulative_weights = np.cumsum(expected_weights(index))
+
+    # Each draw maps its second number onto the cumulative weights of the free sites, so all sites are tried in turn
+    for u in np.linspace(0, 1, 201, endpoint=False):
+        index.build()
+        site, = index.load(np.array([[0., u]]), np.zeros(1, dtype=np.int32), np.array([0, index.L]))
+
+        assert site == np.searchsorted(cumulative_weights, u * cumulative_weights[-1], side='right')
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_loading_probability_is_mean_free_site_weight(backend):
+
+    index = make_index(backend)
+
+    weights = expected_weights(index)
+    mean_weight = weights.sum() / (weights > 0).sum()
+
+    ranges = np.zeros(2, dtype=np.int32)
+    rngs = np.array([[mean_weight * 1.001, 0.5], [mean_weight * 0.999, 0.5]])
+
+    sites = index.load(rngs, ranges, np.array([0, index.L]))
+
+    assert sites[0] == -1
+    assert sites[1] >= 0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_loads_stay_in_their_ranges(backend):
+
+    index = make_index(backend)
+
+    range_bounds = np.array([0, 137, 501, 502, index.L])
+    ranges = np.repeat(np.arange(len(range_bounds)-1, dtype=np.int32), 50)
+
+    rng = np.random.default_rng(1)
+    rngs = np.stack([np.zeros(len(ranges)), rng.random(len(ranges))], axis=1)
+
+    weights = expected_weights(index)
+    sites = index.load(rngs, ranges, range_bounds)
+
+    is_loaded = sites >= 0
+
+    assert (sites[is_loaded] >= range_bounds[ranges[is_loaded]]).all()
+    assert (sites[is_loaded] < range_bounds[ranges[is_loaded]+1]).all()
+
+    # Loaded sites are taken out of the index, so that no two LEFs load onto the same site
+    assert len(np.unique(sites[is_loaded])) == is_loaded.sum()
+    assert (weights[sites[is_loaded]] > 0).all()
+
+    # Ranges are exhausted only once all of their free sites are taken
+    for r in range(len(range_bounds)-1):
+        free_sites = (weights[range_bounds[r]:range_bounds[r+1]] > 0).sum()
+        assert (is_loaded * (ranges == r)).sum() == min(free_sites, 50)
+
+    index.occupied[sites[is_loaded]] = True
+
+    assert_index_matches_sites(index)
+    assert_consistent_index(index)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_updates_match_rebuilt_index(backend):
+
+    index = make_index(backend)
+    rng = np.random.default_rng(2)
+
+    for _ in range(20):
+        sites = rng.integers(0, index.L, 30)
+        index.occupied[sites] = rng.random(len(sites)) < 0.5
+
+        index.update(sites)
+        assert_index_matches_sites(index)
+
+    assert_consistent_index(index)
+
+
+def test_large_lattices():
+
+    # Past B*B*B sites, where a fixed number of levels would leave a linear scan at the top
+    index = make_index('numba', lattice_size=64**3 * 3 + 17, block_size=64)
+    cumulative_weights = np.cumsum(expected_weights(index))
+
+    rng = np.random.default_rng(3)
+
+    for u in rng.random(100):
+        index.build()
+        site, = index.load(np.array([[0., u]]), np.zeros(1, dtype=np.int32), np.array([0, index.L]))
+
+        assert site == np.searchsorted(cumulative_weights, u * cumulative_weights[-1], side='right')
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_drifted_sums_do_not_drop_loads(backend):
+
+    index = make_index(backend)
+
+    index.occupied[index.L//2:] = True
+    index.build()
+
+    # Sums that have drifted away from the site weights send the search to an empty block
+    node = index.L // index.B - 1
+
+    while node < len(index.tree_weights):
+        index.tree_weights[node] += 1.
+        node += node & -node
+
+    rngs = np.array([[0., 0.9999]])
+    site, = index.load(rngs, np.zeros(1, dtype=np.int32), np.array([0, index.L]))
+
+    assert site >= 0
+    assert expected_weights(index)[site] > 0
+
+    index.occupied[site] = True
+    assert_consistent_index(index)
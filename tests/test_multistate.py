@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS, DATA_PATH, assert_baseline_statistics, sample_statistics
+
+from discrete_time_extrusion.extruders.EngineFactory import available_backends, load_backend
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+FILENAME = 'extrusion_dict_RN_RB_RP_RW.json'
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def make_multistate(translocator_factory, **kwargs):
+
+    return translocator_factory(MultistateExtruder, filename=FILENAME, **kwargs)
+
+
+def test_transitions_are_grouped_by_initial_state(translocator_factory):
+
+    extruder = make_multistate(translocator_factory).extrusion_engine
+
+    with open(os.path.join(DATA_PATH, FILENAME)) as param_file:
+        rates = json.load(param_file)['LEF_transition_rates']
+
+    offsets = extruder.state_offsets.tolist()
+
+    for state in range(len(offsets)-1):
+        products = extruder.transition_products[offsets[state]:offsets[state+1]].tolist()
+        assert sorted(products) == sorted(int(ids[1]) for ids in rates if int(ids[0]) == state)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba', 'numba_parallel'])
+def test_transitions_follow_cumulative_probabilities(translocator_factory, backend):
+
+    require_backend(backend)
+
+    translocator = make_multistate(translocator_factory, backend=backend)
+    extruder = translocator.extrusion_engine
+
+    # LEFs draw once from each state, with random numbers sweeping past the total transition probability
+    number_of_states = max(extruder.state_dict.values()) + 1
+    rngs = np.linspace(0, 0.06, extruder.number, endpoint=False)
+
+    positions = (100 + 2*np.arange(extruder.number)[:, None] + np.arange(2)).astype(extruder.positions.dtype)
+    stalled = np.zeros_like(extruder.stalled)
+
+    kernel = load_backend(backend)['engines']['transitions']
+
+    for state in range(1, number_of_states):
+        states = np.full(extruder.number, state, dtype=extruder.states.dtype)
+        new_states = np.full(extruder.number, -1, dtype=np.int32)
+
+        kernel(rngs, extruder.number, 0, extruder.death_state_id, states, positions, stalled, extruder.site_types,
+               extruder.state_offsets, extruder.transition_products, extruder.transition_probs, extruder.death_prob,
+               extruder.stalled_death_prob, new_states)
+
+        offsets = extruder.state_offsets
+        probs = extruder.transition_probs[offsets[state]:offsets[state+1], 0].astype(np.float64)
+        products = extruder.transition_products[offsets[state]:offsets[state+1]]
+
+        if state == extruder.death_state_id:
+            probs = np.append(probs, extruder.death_prob[0])
+            products = np.append(products, 0)
+
+        index = np.searchsorted(np.cumsum(probs), rngs, side='right')
+        expected = np.where(index < len(products), products[np.minimum(index, len(products)-1)], -1)
+
+        np.testing.assert_array_equal(new_states, expected)
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numba_parallel'])
+def test_multistate_runs_are_reproducible(translocator_factory, backend):
+
+    require_backend(backend)
+
+    translocators = [make_multistate(translocator_factory, backend=backend, seed=4) for _ in range(2)]
+
+    for translocator in translocators:
+        translocator.run(500)
+
+    reference, translocator = [t.extrusion_engine for t in translocators]
+
+    np.testing.assert_array_equal(translocator.states, reference.states)
+    np.testing.assert_array_equal(translocator.positions, reference.positions)
+
+
+@pytest.mark.parametrize('backend', ['numba', 'numba_parallel'])
+def test_multistate_statistics_match_baseline(translocator_factory, backend):
+
+    require_backend(backend)
+
+    statistics = sample_statistics(make_multistate(translocator_factory, backend=backend))
+
+    assert_baseline_statistics(statistics, BASELINE_STATISTICS['multistate'])
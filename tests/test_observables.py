@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS
+
+from discrete_time_extrusion import Observables
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+OBSERVABLES = [Observables.BoundFraction, Observables.StalledFraction, Observables.CTCFOccupancy,
+               Observables.LoopCoverage, Observables.LoopSizeHistogram]
+
+
+class Snapshot(Observables.Observable):
+
+    def evaluate(self, translocator):
+
+        extruder = translocator.extrusion_engine
+
+        return self.xp.concatenate([extruder.positions, extruder.stalled.astype(extruder.positions.dtype)], axis=1)
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def add_observables(translocator):
+
+    return [translocator.add_observable(observable) for observable in OBSERVABLES]
+
+
+def test_observables_match_the_stored_trajectory(translocator_factory):
+
+    translocator = translocator_factory()
+
+    observers = add_observables(translocator)
+    snapshot = translocator.add_observable(Snapshot)
+
+    translocator.run_trajectory(period=20, steps=50, prune_unbound_LEFs=False)
+
+    bound_fraction, stalled_fraction, ctcf_occupancy, loop_coverage, histogram = observers
+
+    states = np.asarray(translocator.state_trajectory)
+    positions = np.asarray(translocator.lef_trajectory)
+    stalled = snapshot.get_values()[..., 2:]
+
+    np.testing.assert_array_equal(snapshot.get_values()[..., :2], positions)
+
+    is_bound = (positions >= 0).all(axis=2)
+    loop_sizes = (positions[..., 1] - positions[..., 0])[is_bound]
+
+    np.testing.assert_allclose(bound_fraction.get_values(),
+                               [np.bincount(sample, minlength=2) / len(sample) for sample in states])
+    np.testing.assert_allclose(stalled_fraction.get_values(),
+                               (stalled * is_bound[..., None]).sum(axis=1) / is_bound.sum(axis=1)[:, None])
+    np.testing.assert_allclose(ctcf_occupancy.get_values(),
+                               [len(sample) / translocator.barrier_engine.number
+                                for sample in translocator.ctcf_trajectory])
+
+    sites_per_replica = translocator.params['monomers_per_replica'] * translocator.params['sites_per_monomer']
+
+    np.testing.assert_array_equal(histogram.get_values(), np.bincount(loop_sizes, minlength=sites_per_replica+1))
+    assert histogram.samples == 50
+
+    for sample, coverage in zip(positions, loop_coverage.get_values()):
+        is_covered = np.zeros(len(coverage) * sites_per_replica, dtype=bool)
+
+        for start, end in sample[(sample >= 0).all(axis=1)]:
+            is_covered[start:end+1] = True
+
+        np.testing.assert_allclose(coverage, is_covered.reshape(len(coverage), -1).mean(axis=1))
+
+
+def test_observables_run_without_the_trajectory(translocator_factory):
+
+    reference = translocator_factory()
+    translocator = translocator_factory()
+
+    for t, store_trajectory in [(reference, True), (translocator, False)]:
+        add_observables(t)
+        t.run_trajectory(period=20, steps=50, store_trajectory=store_trajectory)
+
+    assert len(translocator.state_trajectory) == 0
+    assert len(translocator.lef_trajectory) == 0
+
+    for observer, expected in zip(translocator.observers, reference.observers):
+        np.testing.assert_array_equal(observer.get_values(), expected.get_values())
+
+
+@pytest.mark.parametrize('extrusion_engine, filename', [(BaseExtruder, 'extrusion_dict.json'),
+                                                        (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json')])
+def test_observables_resume_from_checkpoints(translocator_factory, tmp_path, extrusion_engine, filename):
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+
+    reference = translocator_factory(extrusion_engine, filename=filename)
+    add_observables(reference)
+
+    reference.run_trajectory(period=20, steps=40, store_trajectory=False)
+
+    # Checkpoints are taken after 25 samples, from which a translocator with another seed resumes the run
+    translocator = translocator_factory(extrusion_engine, filename=filename)
+    add_observables(translocator)
+
+    translocator.run_trajectory(period=20, steps=40, store_trajectory=False, checkpoint_path=checkpoint_path,
+                                checkpoint_interval=25)
+
+    restored = translocator_factory(extrusion_engine, filename=filename, seed=7)
+    add_observables(restored)
+
+    restored.load_checkpoint(checkpoint_path)
+    assert restored.sample_count == 25
+
+    restored.run_trajectory(period=20, steps=40, store_trajectory=False, resume=True)
+
+    for observer, expected in zip(restored.observers, reference.observers):
+        np.testing.assert_array_equal(observer.get_values(), expected.get_values())
+        assert observer.samples == expected.samples
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', [(BaseExtruder, 'python'),
+                                                       (BaseExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba_parallel')])
+def test_observables_match_baseline_statistics(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    samples = 2000 if backend != 'python' else 500
+
+    translocator = translocator_factory(extrusion_engine, backend=backend)
+    bound_fraction, _, ctcf_occupancy, _, histogram = add_observables(translocator)
+
+    translocator.run_trajectory(period=20, steps=samples, dummy_steps=100, store_trajectory=False)
+
+    baseline = BASELINE_STATISTICS['symmetric']
+    loop_sizes = histogram.get_values()
+
+    # Shorter python runs scatter more
+    rtol = 0.08 if backend != 'python' else 0.12
+
+    np.testing.assert_allclose(bound_fraction.get_values().mean(axis=0), baseline['states'], atol=0.02)
+    np.testing.assert_allclose(ctcf_occupancy.get_values().mean(), baseline['ctcf_occupancy'], atol=0.005)
+    np.testing.assert_allclose((loop_sizes * np.arange(len(loop_sizes))).sum() / loop_sizes.sum(),
+                               baseline['loop_size'], rtol=rtol)
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, 'extrusion_dict.json'),
+           (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json')]
+
+
+def assert_consistent_occupancy(extruder):
+
+    positions = extruder.positions
+    is_bound = (positions >= 0).all(axis=1)
+
+    assert ((positions >= 0).any(axis=1) == is_bound).all()
+    assert (positions[is_bound, 0] <= positions[is_bound, 1]).all()
+
+    # No site is held by legs of two different LEFs
+    ids = np.repeat(np.arange(extruder.number), 2).reshape(-1, 2)[is_bound]
+    sites, owners = positions[is_bound].ravel(), ids.ravel()
+
+    assert all(len(set(owners[sites == site])) == 1 for site in np.unique(sites))
+
+    # Sites held by a leg name its LEF, and all other sites are unowned and free, bar the chromosome ends
+    expected_owners = np.full(len(extruder.site_owners), -1)
+    expected_owners[sites] = owners
+
+    expected_occupied = expected_owners >= 0
+    expected_occupied[extruder.chromosome_bounds] = True
+
+    np.testing.assert_array_equal(extruder.site_owners, expected_owners)
+    np.testing.assert_array_equal(extruder.occupied, expected_occupied)
+
+    occupied = extruder.occupied.copy()
+    site_owners = extruder.site_owners.copy()
+
+    # Incremental updates leave the same bitmap and owners as a full rebuild
+    extruder.reset_occupancies()
+
+    np.testing.assert_array_equal(occupied, extruder.occupied)
+    np.testing.assert_array_equal(site_owners, extruder.site_owners)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba', 'numba_parallel'])
+@pytest.mark.parametrize('mode', ['symmetric', 'asymmetric'])
+@pytest.mark.parametrize('extrusion_engine, filename', ENGINES)
+def test_occupancy_follows_positions(translocator_factory, backend, mode, extrusion_engine, filename):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    # A dense lattice, so that legs collide often
+    translocator = translocator_factory(extrusion_engine, filename=filename, backend=backend, mode=mode,
+                                        LEF_separation=10)
+
+    for _ in range(10):
+        translocator.run(20)
+        assert_consistent_occupancy(translocator.extrusion_engine)
+
+
+def test_colliding_legs_return_to_previous_sites(translocator_factory):
+
+    translocator = translocator_factory(LEF_separation=250)
+    extruder = translocator.extrusion_engine
+
+    extruder.states[:] = 1
+    extruder.positions[:] = [[100, 110], [112, 120]] + [[-1, -1]] * (extruder.number - 2)
+    extruder.reset_occupancies()
+
+    # Both LEFs step onto site 111
+    extruder.positions[0, 1] = 111
+    extruder.positions[1, 0] = 111
+
+    extruder.update_occupancies()
+
+    assert sorted([extruder.positions[0, 1], extruder.positions[1, 0]]) in [[110, 111], [111, 112]]
+    assert_consistent_occupancy(extruder)
+
+
+def test_unloaded_legs_free_their_sites(translocator_factory):
+
+    translocator = translocator_factory(LEF_separation=250)
+    extruder = translocator.extrusion_engine
+
+    extruder.states[:] = 1
+    extruder.positions[:] = [[100, 110]] + [[-1, -1]] * (extruder.number - 1)
+    extruder.reset_occupancies()
+
+    extruder.unload(np.array([0]))
+    extruder.update_occupancies()
+
+    assert not extruder.occupied[100:111].any()
+    assert (extruder.site_owners[100:111] == -1).all()
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', [(BaseExtruder, 'numba'),
+                                                       (FusedExtruder, 'python'),
+                                                       (FusedExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba_parallel')])
+def test_site_owners_follow_ctcf_releases(translocator_factory, extrusion_engine, backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+    # Fast CTCF turnover on a dense lattice, so that stalled legs are often released through their site owners
+    translocator = translocator_factory(extrusion_engine, backend=backend, LEF_separation=10,
+                                        CTCF_off_rate={'A': 0.02})
+
+    for _ in range(10):
+        translocator.run(20)
+        assert_consistent_occupancy(translocator.extrusion_engine)
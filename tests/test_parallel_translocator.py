@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+from conftest import SITES_PER_REPLICA
+
+from discrete_time_extrusion.Observables import BoundFraction, StalledFraction
+from discrete_time_extrusion.ParallelTranslocator import ParallelTranslocator
+
+
+def make_parallel(translocator_factory, **kwargs):
+
+    return translocator_factory(translocator=ParallelTranslocator, processes=2, **kwargs)
+
+
+def test_blocks_match_standalone_translocators(translocator_factory):
+
+    seeds = np.random.SeedSequence(5).spawn(2)
+
+    with make_parallel(translocator_factory, seed=5) as translocator:
+        translocator.run(100)
+        positions = translocator.extrusion_engine.positions
+
+    # Each worker runs half of the replicas from its own spawned seed, offset to its place on the lattice
+    for block, seed in enumerate(seeds):
+        reference = translocator_factory(seed=seed, number_of_replica=2)
+        reference.run(100)
+
+        expected = reference.extrusion_engine.positions
+        expected = np.where(expected >= 0, expected + 2*block*SITES_PER_REPLICA, -1)
+
+        np.testing.assert_array_equal(positions[len(expected)*block:len(expected)*(block+1)], expected)
+
+
+def test_views_are_cached_between_runs(translocator_factory):
+
+    with make_parallel(translocator_factory, seed=5) as translocator:
+        translocator.run(10)
+
+        extruder = translocator.extrusion_engine
+        barrier = translocator.barrier_engine
+
+        positions = extruder.positions
+        stall_left = barrier.stall_left
+
+        assert extruder.positions is positions
+        assert barrier.stall_left is stall_left
+
+        translocator.run(10)
+
+        assert extruder.positions is not positions
+        assert barrier.stall_left is not stall_left
+
+        np.testing.assert_array_equal(extruder.states, np.concatenate([arrays['states']
+                                                                       for arrays in extruder.block_arrays]))
+
+
+def test_parallel_runs_are_reproducible(translocator_factory):
+
+    trajectories = []
+
+    for _ in range(2):
+        with make_parallel(translocator_factory, steps=20) as translocator:
+            translocator.run_trajectory()
+            trajectories.append(list(translocator.lef_trajectory))
+
+    for sample, expected in zip(*trajectories):
+        np.testing.assert_array_equal(sample, expected)
+
+
+def test_per_group_observables(translocator_factory):
+
+    with make_parallel(translocator_factory, steps=20) as translocator:
+        pooled = translocator.add_observable(BoundFraction)
+        grouped = translocator.add_observable(BoundFraction, per_group=True)
+        stalled = translocator.add_observable(StalledFraction, per_group=True)
+
+        translocator.run_trajectory()
+
+    samples = translocator.sample_count
+
+    assert grouped.get_values().shape == (samples, 1, 2)
+    assert stalled.get_values().shape == (samples, 1, 2)
+
+    np.testing.assert_array_equal(grouped.get_values()[:, 0], pooled.get_values())
+
+
+def test_parallel_checkpoint_resume(translocator_factory, tmp_path):
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+
+    with make_parallel(translocator_factory, seed=3) as reference:
+        reference.run_trajectory(steps=30, path=str(tmp_path / 'reference'))
+        expected = list(reference.lef_trajectory)
+
+    with make_parallel(translocator_factory, seed=3) as interrupted:
+        interrupted.run_trajectory(steps=20, path=str(tmp_path / 'resumed'),
+                                   checkpoint_path=checkpoint_path, checkpoint_interval=10)
+
+    with make_parallel(translocator_factory, seed=4) as resumed:
+        resumed.load_checkpoint(checkpoint_path)
+        resumed.run_trajectory(steps=30, path=str(tmp_path / 'resumed'), resume=True,
+                               checkpoint_path=checkpoint_path, checkpoint_interval=10)
+
+        samples = list(resumed.lef_trajectory)
+
+    assert len(samples) == len(expected) == 30
+
+    for sample, expected_sample in zip(samples, expected):
+        np.testing.assert_array_equal(sample, expected_sample)
+
+
+def test_steady_state_burn_in_is_one_lef_lifetime(translocator_factory):
+
+    reference = translocator_factory()
+
+    with make_parallel(translocator_factory, dummy_steps=1000) as translocator:
+        period = translocator.params['sites_per_monomer']
+
+        assert translocator.get_relaxation_steps() == reference.get_relaxation_steps()
+
+        # Blocks are asked for their relaxation over the worker connections, rather than read through the views
+        translocator.run_trajectory(steps=5, steady_state=True)
+
+        assert translocator.step_count == (reference.get_relaxation_steps(period) + 5) * period
+
+
+def test_close_stops_workers(translocator_factory):
+
+    translocator = make_parallel(translocator_factory)
+    workers = list(translocator.workers)
+
+    translocator.close()
+
+    assert not any(worker.is_alive() for worker in workers)
+    assert translocator.blocks == []
+
+
+def test_failing_workers_raise(translocator_factory):
+
+    with pytest.raises(RuntimeError):
+        make_parallel(translocator_factory, backend='fortran')
@@ -0,0 +1,182 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.ParallelTranslocator import ParallelTranslocator
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, 'extrusion_dict.json', 'python'),
+           (BaseExtruder, 'extrusion_dict.json', 'numba'),
+           (FusedExtruder, 'extrusion_dict.json', 'numba'),
+           (FusedExtruder, 'extrusion_dict.json', 'numba_parallel'),
+           (MultistateExtruder, 'extrusion_dict_RN_RB_RP_RW.json', 'numba')]
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def assert_same_state(translocator, reference):
+
+    for name in ['states', 'positions', 'stalled', 'occupied']:
+        np.testing.assert_array_equal(getattr(translocator.extrusion_engine, name),
+                                      getattr(reference.extrusion_engine, name))
+
+    np.testing.assert_array_equal(translocator.barrier_engine.states_left, reference.barrier_engine.states_left)
+    np.testing.assert_array_equal(translocator.barrier_engine.states_right, reference.barrier_engine.states_right)
+
+
+def count_bound(translocator):
+
+    extruder = translocator.extrusion_engine
+    barrier = translocator.barrier_engine
+
+    return (int(np.count_nonzero(extruder.get_positions(as_array=True)[:, 0] >= 0)),
+            int(np.count_nonzero(barrier.stall_left) + np.count_nonzero(barrier.stall_right)))
+
+
+@pytest.mark.parametrize('extrusion_engine, filename, backend', ENGINES)
+def test_profiling_leaves_runs_unchanged(translocator_factory, extrusion_engine, filename, backend):
+
+    require_backend(backend)
+
+    reference = translocator_factory(extrusion_engine, filename=filename, backend=backend, seed=3)
+    translocator = translocator_factory(extrusion_engine, filename=filename, backend=backend, seed=3)
+
+    extruder, barrier = translocator.extrusion_engine, translocator.barrier_engine
+    attributes = [dict(vars(extruder)), dict(vars(barrier))]
+
+    translocator.enable_profiling()
+
+    for _ in range(5):
+        reference.run(100)
+        translocator.run(100)
+
+    assert_same_state(translocator, reference)
+
+    # Detached engines run on in step with a translocator that was never profiled
+    translocator.disable_profiling()
+
+    assert 'run' not in vars(translocator)
+
+    for target, original in zip([extruder, barrier], attributes):
+        assert vars(target).keys() == original.keys()
+        assert all(vars(target)[name] is value for name, value in original.items() if callable(value))
+
+    reference.run(300)
+    translocator.run(300)
+
+    assert_same_state(translocator, reference)
+
+
+def test_profiled_runs_resume_from_checkpoints(translocator_factory, tmp_path):
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+
+    reference = translocator_factory(seed=5)
+    reference.run(400)
+
+    translocator = translocator_factory(seed=5)
+    translocator.enable_profiling()
+
+    translocator.run(200)
+    translocator.save_checkpoint(checkpoint_path)
+
+    restored = translocator_factory(seed=9)
+    restored.enable_profiling()
+
+    restored.load_checkpoint(checkpoint_path)
+    restored.run(200)
+
+    assert_same_state(restored, reference)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', [(BaseExtruder, 'python'),
+                                                       (BaseExtruder, 'numba'),
+                                                       (FusedExtruder, 'python'),
+                                                       (FusedExtruder, 'numba'),
+                                                       (FusedExtruder, 'numba_parallel')])
+def test_event_counts_balance(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    # Fast CTCF turnover, so that births and deaths of both LEFs and CTCFs happen within a short run
+    translocator = translocator_factory(extrusion_engine, backend=backend,
+                                        CTCF_on_rate={'A': 0.01}, CTCF_off_rate={'A': 0.01})
+    profiler = translocator.enable_profiling()
+
+    bound_lefs, bound_ctcfs = count_bound(translocator)
+
+    translocator.run(2000)
+
+    events = profiler.report()['events']
+    new_bound_lefs, new_bound_ctcfs = count_bound(translocator)
+
+    assert events['loaded'] > 0 and events['unloaded'] > 0
+    assert events['loaded'] - events['unloaded'] == new_bound_lefs - bound_lefs
+
+    assert events['ctcf_births'] > 0 and events['ctcf_deaths'] > 0
+    assert events['ctcf_births'] - events['ctcf_deaths'] == new_bound_ctcfs - bound_ctcfs
+
+    assert events['stalls'] > 0
+    assert events['blocked'] > 0
+    assert events['collisions'] > 0
+
+
+def test_multistate_transitions_are_counted(translocator_factory):
+
+    translocator = translocator_factory(MultistateExtruder, filename='extrusion_dict_RN_RB_RP_RW.json')
+    profiler = translocator.enable_profiling()
+
+    translocator.run(500)
+
+    events = profiler.report()['events']
+
+    # Loading and unloading are state changes too, on top of the transitions between bound states
+    assert events['state_changes'] >= events['loaded'] + events['unloaded'] > 0
+
+
+def test_report_adds_up(translocator_factory):
+
+    translocator = translocator_factory()
+    profiler = translocator.enable_profiling()
+
+    for steps in [100, 50, 150]:
+        translocator.run(steps)
+
+    report = profiler.report()
+
+    assert report['steps'] == 300
+    assert report['seconds'] == pytest.approx(sum(phase['seconds'] for phase in report['phases'].values()))
+    assert sum(phase['fraction'] for phase in report['phases'].values()) == pytest.approx(1.)
+
+    assert report['phases']['other']['calls'] == 3
+    assert report['phases']['boundary']['calls'] > 300
+
+    np.testing.assert_array_equal(report['blocks']['steps'], [100, 50, 150])
+    assert report['blocks']['seconds'].sum() == pytest.approx(report['seconds'])
+
+    for phase in report['phases']:
+        assert report['blocks'][phase].sum() == pytest.approx(report['phases'][phase]['seconds'])
+
+    profiler.reset()
+
+    assert profiler.report()['steps'] == 0
+    assert profiler.report()['events']['loaded'] == 0
+
+
+def test_parallel_translocators_refuse_profiling(translocator_factory):
+
+    translocator = translocator_factory(translocator=ParallelTranslocator, processes=2)
+
+    try:
+        with pytest.raises(RuntimeError):
+            translocator.enable_profiling()
+
+    finally:
+        translocator.close()
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.RandomStream import RandomStream
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+
+
+def draw(stream):
+
+    return np.concatenate([stream.random(3).copy(), stream.random(5, 4).ravel().copy(), stream.random(7, 2).ravel()])
+
+
+def test_streams_are_seeded():
+
+    np.testing.assert_array_equal(draw(RandomStream(np, 1, block_size=64)), draw(RandomStream(np, 1, block_size=64)))
+
+    assert not np.array_equal(draw(RandomStream(np, 1, block_size=64)), draw(RandomStream(np, 2, block_size=64)))
+
+
+def test_draws_are_aligned_to_vector_width():
+
+    stream = RandomStream(np, 0, block_size=64)
+
+    for shape in [(3,), (5, 4), (7, 2), (1,), (6, 3)]:
+        values = stream.random(*shape)
+        start = stream.index - values.size
+
+        assert start % stream.alignment == 0
+        np.testing.assert_array_equal(values.ravel(), stream.block[start:stream.index])
+
+
+def test_draws_are_views_into_the_block():
+
+    stream = RandomStream(np, 0, block_size=64)
+
+    for shape in [(3,), (5, 4), (7, 2)]:
+        assert np.shares_memory(stream.random(*shape), stream.block)
+
+    # Refilling the block reuses it, so that draws stay free of allocations
+    block = stream.block
+    stream.random(60)
+
+    assert stream.block is block
+
+
+def test_get_state_has_no_side_effects():
+
+    reference = RandomStream(np, 0, block_size=64)
+    stream = RandomStream(np, 0, block_size=64)
+
+    for _ in range(5):
+        stream.get_state()
+
+        np.testing.assert_array_equal(draw(stream), draw(reference))
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_set_state_restores_the_unused_block(dtype):
+
+    stream = RandomStream(np, 0, block_size=64, dtype=dtype)
+    stream.random(10)
+    stream.choice(np.arange(100), 5)
+
+    state = stream.get_state()
+    expected = np.concatenate([draw(stream) for _ in range(4)])
+
+    restored = RandomStream(np, 1, block_size=64, dtype=dtype)
+    restored.set_state(state)
+
+    np.testing.assert_array_equal(np.concatenate([draw(restored) for _ in range(4)]), expected)
+
+
+@pytest.mark.parametrize('extrusion_engine', [BaseExtruder, FusedExtruder])
+def test_checkpointing_does_not_change_trajectories(translocator_factory, tmp_path, extrusion_engine):
+
+    make = lambda: translocator_factory(extrusion_engine, steps=30)
+
+    reference = make()
+    reference.run_trajectory()
+
+    checkpointed = make()
+    checkpointed.run_trajectory(checkpoint_path=str(tmp_path / 'checkpoint.npz'), checkpoint_interval=3)
+
+    for name in ['state_trajectory', 'lef_trajectory', 'ctcf_trajectory']:
+        for sample, expected in zip(getattr(checkpointed, name), getattr(reference, name)):
+            np.testing.assert_array_equal(sample, expected)
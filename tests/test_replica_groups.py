@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS, SITES_PER_REPLICA, assert_baseline_statistics, sample_statistics
+
+from discrete_time_extrusion import Observables
+from discrete_time_extrusion.ParallelTranslocator import ParallelTranslocator
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+
+
+ENGINES = [(BaseExtruder, 'python'),
+           (BaseExtruder, 'numba'),
+           (FusedExtruder, 'numba'),
+           (FusedExtruder, 'numba_parallel')]
+
+# A sweep of three groups, over LEF density, LEF lifetime and CTCF stalling
+REPLICA_GROUPS = [{'number_of_replica': 2},
+                  {'number_of_replica': 1, 'LEF_separation': 100},
+                  {'number_of_replica': 2, 'LEF_off_rate': {'A': 0.01}, 'CTCF_facestall': {'A': 0.5}}]
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def assert_lefs_stay_in_their_groups(extruder):
+
+    positions = extruder.get_positions(as_array=True)
+    is_bound = (positions >= 0).all(axis=1)
+
+    group_bounds = extruder.get_array(extruder.group_bounds)
+    groups = extruder.get_array(extruder.LEF_groups)[is_bound]
+
+    assert (positions[is_bound, 0] >= group_bounds[groups]).all()
+    assert (positions[is_bound, 1] < group_bounds[groups+1]).all()
+
+
+def test_groups_get_their_own_lattice_blocks(translocator_factory):
+
+    translocator = translocator_factory(replica_groups=REPLICA_GROUPS)
+    extruder = translocator.extrusion_engine
+
+    assert translocator.params['number_of_replica'] == 5
+    assert extruder.lattice_size == 5 * SITES_PER_REPLICA
+
+    np.testing.assert_array_equal(extruder.group_bounds, np.array([0, 2, 3, 5]) * SITES_PER_REPLICA)
+    np.testing.assert_array_equal(np.bincount(extruder.LEF_groups), [20, 5, 20])
+
+    # Each group looks up its own rates, through its own copy of the site types
+    death_prob = extruder.get_array(extruder.death_prob)[extruder.get_array(extruder.site_types)]
+    groups = np.repeat(np.arange(3), [2*SITES_PER_REPLICA, SITES_PER_REPLICA, 2*SITES_PER_REPLICA])
+
+    time_unit = translocator.params['sites_per_monomer'] * translocator.params['velocity_multiplier']
+    off_rates = [translocator.params['LEF_off_rate']['A']] * 2 + [0.01]
+
+    for group, off_rate in enumerate(off_rates):
+        np.testing.assert_allclose(death_prob[groups == group], off_rate / time_unit)
+
+
+def test_groups_must_share_the_lattice_shape(translocator_factory):
+
+    with pytest.raises(AssertionError):
+        translocator_factory(replica_groups=[{}, {'monomers_per_replica': 2 * SITES_PER_REPLICA}])
+
+    with pytest.raises(AssertionError):
+        translocator_factory(replica_groups=[{}, {'mode': 'asymmetric'}])
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', ENGINES)
+def test_lefs_stay_in_their_groups(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    translocator = translocator_factory(extrusion_engine, backend=backend, replica_groups=REPLICA_GROUPS)
+
+    for _ in range(20):
+        translocator.run(50)
+        assert_lefs_stay_in_their_groups(translocator.extrusion_engine)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', ENGINES)
+def test_grouped_runs_are_reproducible(translocator_factory, tmp_path, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    checkpoint_path = str(tmp_path / 'checkpoint.npz')
+    translocators = [translocator_factory(extrusion_engine, backend=backend, replica_groups=REPLICA_GROUPS, seed=2)
+                     for _ in range(2)]
+
+    for translocator in translocators:
+        translocator.run(300)
+
+    translocators[1].save_checkpoint(checkpoint_path)
+
+    restored = translocator_factory(extrusion_engine, backend=backend, replica_groups=REPLICA_GROUPS, seed=8)
+    restored.load_checkpoint(checkpoint_path)
+
+    for translocator in translocators + [restored]:
+        translocator.run(300)
+
+    reference = translocators[0].extrusion_engine
+
+    for translocator in translocators[1:] + [restored]:
+        np.testing.assert_array_equal(translocator.extrusion_engine.states, reference.states)
+        np.testing.assert_array_equal(translocator.extrusion_engine.positions, reference.positions)
+
+    assert_lefs_stay_in_their_groups(restored.extrusion_engine)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', ENGINES[1:])
+def test_identical_groups_match_baseline_statistics(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    # Walls between groups of two replicas fall where the replica ends already are
+    translocator = translocator_factory(extrusion_engine, backend=backend,
+                                        replica_groups=[{'number_of_replica': 2}, {'number_of_replica': 2}])
+
+    assert_baseline_statistics(sample_statistics(translocator), BASELINE_STATISTICS['symmetric'])
+
+
+@pytest.mark.parametrize('extrusion_engine', [BaseExtruder, FusedExtruder])
+def test_groups_match_separate_runs(translocator_factory, extrusion_engine):
+
+    require_backend('numba')
+
+    groups = [{'number_of_replica': 4}, {'number_of_replica': 4, 'LEF_off_rate': {'A': 0.01}}]
+
+    translocator = translocator_factory(extrusion_engine, backend='numba', replica_groups=groups)
+    bound_fraction = translocator.add_observable(Observables.BoundFraction, per_group=True)
+    histogram = translocator.add_observable(Observables.LoopSizeHistogram, per_group=True)
+
+    translocator.run_trajectory(period=20, steps=1000, dummy_steps=100, store_trajectory=False)
+
+    assert bound_fraction.get_values().shape == (1000, 2, 2)
+    loop_sizes = histogram.get_values()
+
+    for group, params in enumerate(groups):
+        separate = translocator_factory(extrusion_engine, backend='numba', **params)
+        statistics = sample_statistics(separate, samples=1000)
+
+        group_loop_size = (loop_sizes[group] * np.arange(loop_sizes.shape[1])).sum() / loop_sizes[group].sum()
+
+        np.testing.assert_allclose(bound_fraction.get_values()[:, group].mean(axis=0), statistics['states'], atol=0.02)
+        np.testing.assert_allclose(group_loop_size, statistics['loop_size'], rtol=0.1)
+
+
+def test_parallel_translocators_reject_groups(translocator_factory):
+
+    with pytest.raises(RuntimeError):
+        translocator_factory(translocator=ParallelTranslocator, processes=2, replica_groups=REPLICA_GROUPS)
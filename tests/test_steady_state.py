@@ -0,0 +1,314 @@
+import numpy as np
+import pytest
+
+from conftest import BASELINE_STATISTICS, SITES_PER_REPLICA, sample_statistics
+
+from discrete_time_extrusion.boundaries.StaticBoundary import StaticBoundary
+from discrete_time_extrusion.extruders.EngineFactory import available_backends
+from discrete_time_extrusion.extruders.BaseExtruder import BaseExtruder
+from discrete_time_extrusion.extruders.FusedExtruder import FusedExtruder
+from discrete_time_extrusion.extruders.MultistateExtruder import MultistateExtruder
+
+
+ENGINES = [(BaseExtruder, 'python'),
+           (BaseExtruder, 'numba'),
+           (FusedExtruder, 'numba')]
+
+SETUPS = {'symmetric': {},
+          'static': {'barrier_engine': StaticBoundary},
+          'multistate': {'extrusion_engine': MultistateExtruder, 'filename': 'extrusion_dict_RN_RB_RP_RW.json'}}
+
+# About one LEF lifetime, over which legs jammed against each other at barriers pile up as they do in burn-in runs
+RELAXATION_STEPS = 200
+
+
+def require_backend(backend):
+
+    if backend not in available_backends('CPU'):
+        pytest.skip("Backend '%s' is not available" % backend)
+
+
+def sample_steady_states(translocator, samples=100, relaxation_steps=0):
+
+    statistics = []
+
+    for _ in range(samples):
+        translocator.initialize_steady_state()
+        statistics.append(sample_statistics(translocator, samples=1, period=0, burn_in=relaxation_steps))
+
+    return {key: np.nanmean([s[key] for s in statistics], axis=0) for key in statistics[0]}
+
+
+def get_group_probs(extruder, group=0):
+
+    matrix = extruder.get_transition_matrix(extruder.get_type_weights(group))
+
+    return matrix, extruder.get_stationary_distribution(matrix)
+
+
+@pytest.mark.parametrize('setup', list(SETUPS))
+def test_stationary_distributions_solve_the_state_chain(translocator_factory, setup):
+
+    translocator = translocator_factory(**SETUPS[setup])
+    matrix, probs = get_group_probs(translocator.extrusion_engine)
+
+    assert probs.sum() == pytest.approx(1.)
+    np.testing.assert_allclose(probs @ matrix, probs, atol=1e-12)
+
+    # Two-state LEFs are bound with the fraction birth / (birth + death) of their per-step probabilities
+    if setup != 'multistate':
+        birth, death = matrix[0, 1], matrix[1, 0]
+        assert probs[1] == pytest.approx(birth / (birth + death))
+
+
+def test_sampled_states_follow_each_group(translocator_factory):
+
+    groups = [{'number_of_replica': 20}, {'number_of_replica': 20, 'LEF_off_rate': {'A': 0.01}}]
+
+    extruder = translocator_factory(replica_groups=groups).extrusion_engine
+    states = np.concatenate([extruder.sample_states() for _ in range(20)])
+    groups = np.tile(extruder.get_array(extruder.LEF_groups), 20)
+
+    for group in range(2):
+        _, probs = get_group_probs(extruder, group)
+        fractions = np.bincount(states[groups == group], minlength=len(probs)) / np.count_nonzero(groups == group)
+
+        np.testing.assert_allclose(fractions, probs, atol=0.01)
+
+
+@pytest.mark.parametrize('setup', ['symmetric', 'multistate'])
+def test_velocities_are_the_active_share_of_bound_time(translocator_factory, setup):
+
+    translocator = translocator_factory(LEF_pause={'A': 0.25}, **SETUPS[setup])
+    extruder = translocator.extrusion_engine
+
+    active_state_id = extruder.state_dict['RN'] if setup == 'multistate' else 1
+    _, probs = get_group_probs(extruder)
+
+    velocities = extruder.get_velocities(active_state_id=active_state_id)
+    expected = probs[active_state_id] / (1 - probs[0]) * (1 - extruder.get_array(extruder.pause_prob)[0])
+
+    np.testing.assert_allclose(velocities, expected)
+
+
+@pytest.mark.parametrize('mode', ['symmetric', 'asymmetric'])
+def test_leg_steps_follow_the_time_since_binding(translocator_factory, mode):
+
+    extruder = translocator_factory(number_of_replica=40).extrusion_engine
+
+    velocities = extruder.get_velocities()
+    directions = np.arange(extruder.number) % 2
+
+    leg_steps = []
+    states = []
+
+    for _ in range(20):
+        states.append(extruder.sample_states())
+        leg_steps.append(extruder.sample_leg_steps(states[-1], directions, velocities, mode))
+
+    leg_steps = np.concatenate(leg_steps)
+    states = np.concatenate(states)
+
+    assert not leg_steps[states == 0].any()
+
+    if mode == "asymmetric":
+        assert not leg_steps[np.arange(len(leg_steps)), 1 - np.tile(directions, 20)].any()
+
+    else:
+        np.testing.assert_array_equal(leg_steps[:, 0], leg_steps[:, 1])
+
+    # With two states, bound LEFs unbind with the death probability at every step, whatever their age
+    steps = leg_steps[states == 1].max(axis=1)
+    death_prob = extruder.get_array(extruder.death_prob)[0]
+
+    assert steps.mean() == pytest.approx(velocities[0] / death_prob, rel=0.05)
+
+
+def test_barrier_delays_follow_the_release_probability(translocator_factory):
+
+    extruder = translocator_factory(barrier_engine=StaticBoundary).extrusion_engine
+    barrier = extruder.barrier_engine
+
+    delays = [extruder.sample_barrier_delays() for _ in range(100)]
+
+    # Fully stalling barriers stop every leg, for the number of steps until its first outward diffusion move
+    release_prob = extruder.get_array(extruder.diffusion_prob)[0] / 2
+
+    for leg, stall in enumerate([barrier.stall_left, barrier.stall_right]):
+        is_barrier = np.greater(stall, 0)
+        leg_delays = np.stack([delay[leg] for delay in delays])
+
+        assert (leg_delays[:, ~is_barrier] == -1).all()
+        assert (leg_delays[:, is_barrier] >= 0).all()
+
+        assert leg_delays[:, is_barrier].mean() == pytest.approx((1 - release_prob) / release_prob, rel=0.1)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+def test_loops_extrude_their_leg_steps_on_a_free_lattice(translocator_factory, backend):
+
+    require_backend(backend)
+
+    extruder = translocator_factory(barrier_engine=StaticBoundary, backend=backend).extrusion_engine
+
+    extruder.barrier_engine.stall_left = np.zeros_like(extruder.barrier_engine.stall_left)
+    extruder.barrier_engine.stall_right = np.zeros_like(extruder.barrier_engine.stall_right)
+
+    states = np.zeros(extruder.number, dtype=np.int32)
+    states[0] = 1
+
+    leg_steps = np.zeros((extruder.number, 2), dtype=np.int64)
+    leg_steps[0] = [5, 7]
+
+    states, positions, stalled = extruder.place_loops(states, leg_steps, extruder.get_velocities())
+
+    assert states[0] == 1 and not states[1:].any()
+    assert positions[0, 1] - positions[0, 0] == 13
+
+    assert (positions[1:] == -1).all()
+    assert not stalled.any()
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+def test_placed_loops_do_not_overlap(translocator_factory, backend):
+
+    require_backend(backend)
+
+    extruder = translocator_factory(barrier_engine=StaticBoundary, backend=backend).extrusion_engine
+    barrier = extruder.barrier_engine
+
+    states = np.ones(extruder.number, dtype=np.int32)
+    leg_steps = np.full((extruder.number, 2), SITES_PER_REPLICA, dtype=np.int64)
+
+    for _ in range(10):
+        states, positions, stalled = extruder.place_loops(states, leg_steps, extruder.get_velocities())
+        is_bound = states == 1
+
+        # Legs cannot step across each other, so that loops are either nested or side by side
+        left, right = positions[is_bound, 0], positions[is_bound, 1]
+
+        assert (left < right).all()
+        assert not ((left[:, None] < left[None, :]) & (left[None, :] < right[:, None])
+                    & (right[:, None] < right[None, :])).any()
+
+        assert (positions[~is_bound] == -1).all()
+
+        # Legs only stall at the barriers that face them
+        assert (np.asarray(barrier.stall_left)[positions[stalled[:, 0], 0]] > 0).all()
+        assert (np.asarray(barrier.stall_right)[positions[stalled[:, 1], 1]] > 0).all()
+
+
+def test_loops_without_loading_sites_stay_unbound(translocator_factory):
+
+    extruder = translocator_factory().extrusion_engine
+    extruder.birth_prob = np.zeros_like(extruder.birth_prob)
+
+    states = np.ones(extruder.number, dtype=np.int32)
+    leg_steps = np.full((extruder.number, 2), 10, dtype=np.int64)
+
+    states, positions, stalled = extruder.place_loops(states, leg_steps, extruder.get_velocities())
+
+    assert not states.any()
+    assert (positions == -1).all()
+
+
+def test_relaxation_lasts_one_lef_lifetime(translocator_factory):
+
+    groups = [{'number_of_replica': 2}, {'number_of_replica': 2, 'LEF_off_rate': {'A': 0.01}}]
+
+    extruder = translocator_factory(replica_groups=groups).extrusion_engine
+    death_prob = extruder.get_array(extruder.death_prob)[0]
+
+    # Two-state LEFs stay bound for 1 / death_prob steps on average, and the groups wait for the longest-lived one
+    assert extruder.get_unbinding_probs()[0] == pytest.approx(death_prob)
+    assert extruder.get_relaxation_steps() == int(np.ceil(1 / extruder.get_unbinding_probs().min()))
+
+
+@pytest.mark.parametrize('steady_state, dummy_steps', [(True, None), (True, 3), (False, None)])
+def test_steady_state_trajectories_burn_in_briefly(translocator_factory, steady_state, dummy_steps):
+
+    translocator = translocator_factory(dummy_steps=1000)
+    period = translocator.params['sites_per_monomer']
+
+    translocator.run_trajectory(steps=5, dummy_steps=dummy_steps, steady_state=steady_state)
+
+    if dummy_steps is not None:
+        expected = dummy_steps
+
+    elif steady_state:
+        expected = -(-translocator.extrusion_engine.get_relaxation_steps() // period)
+
+    else:
+        expected = translocator.params['dummy_steps']
+
+    assert translocator.step_count == (expected + 5) * period
+
+    # Burn-in from steady state is far shorter than the default one, which starts from an empty lattice
+    if steady_state and (dummy_steps is None):
+        assert translocator.step_count < translocator.params['dummy_steps'] * period
+
+
+@pytest.mark.parametrize('setup', list(SETUPS))
+def test_steady_states_match_burn_in(translocator_factory, setup):
+
+    require_backend('numba')
+
+    translocator = translocator_factory(backend='numba', **SETUPS[setup])
+    statistics = sample_steady_states(translocator)
+
+    # Barriers are not redrawn, and start out at equilibrium already
+    baseline = BASELINE_STATISTICS[setup]
+
+    np.testing.assert_allclose(statistics['states'], baseline['states'], atol=0.02)
+    np.testing.assert_allclose(statistics['loop_size'], baseline['loop_size'], rtol=0.1)
+
+    # Legs pinned against each other at barriers are left for a short relaxation to build up, rather than laid out
+    relaxed = sample_steady_states(translocator, samples=20, relaxation_steps=RELAXATION_STEPS)
+
+    np.testing.assert_allclose(relaxed['loop_size'], baseline['loop_size'], rtol=0.1)
+    np.testing.assert_allclose(relaxed['stalled'], baseline['stalled'], rtol=0.5)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', ENGINES)
+def test_steady_states_are_consistent(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    translocator = translocator_factory(extrusion_engine, backend=backend)
+    extruder = translocator.extrusion_engine
+
+    for _ in range(10):
+        translocator.initialize_steady_state()
+
+        positions = extruder.get_positions(as_array=True)
+        is_bound = (positions >= 0).all(axis=1)
+
+        legs = positions[is_bound].ravel()
+
+        assert len(np.unique(legs)) == len(legs)
+        assert (positions[is_bound, 0] < positions[is_bound, 1]).all()
+
+        np.testing.assert_array_equal(np.flatnonzero(extruder.get_array(extruder.site_owners) >= 0), np.sort(legs))
+
+        # Only legs of bound LEFs can be stalled
+        assert not extruder.get_array(extruder.stalled)[~is_bound].any()
+
+        translocator.run(20)
+
+
+@pytest.mark.parametrize('extrusion_engine, backend', ENGINES)
+def test_steady_states_are_reproducible(translocator_factory, extrusion_engine, backend):
+
+    require_backend(backend)
+
+    translocators = [translocator_factory(extrusion_engine, backend=backend, seed=5) for _ in range(2)]
+
+    for translocator in translocators:
+        translocator.initialize_steady_state()
+        translocator.run(200)
+
+    reference, extruder = [translocator.extrusion_engine for translocator in translocators]
+
+    np.testing.assert_array_equal(extruder.states, reference.states)
+    np.testing.assert_array_equal(extruder.positions, reference.positions)
+    np.testing.assert_array_equal(extruder.stalled, reference.stalled)
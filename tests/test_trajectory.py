@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.Trajectory import Trajectory, RaggedTrajectory
+
+
+def test_trajectory_grows_past_its_preallocated_length():
+
+    trajectory = Trajectory((3,), 'int32', length=2)
+
+    for i in range(5):
+        trajectory.append([i, i+1, i+2])
+
+    assert len(trajectory) == 5
+    assert np.asarray(trajectory).shape == (5, 3)
+
+    np.testing.assert_array_equal(trajectory[4], [4, 5, 6])
+    np.testing.assert_array_equal(np.asarray(trajectory)[:, 0], np.arange(5))
+
+
+def test_ragged_trajectory_keeps_variable_length_samples():
+
+    samples = [np.arange(6).reshape(3, 2), np.zeros((0, 2)), np.ones((1, 2))]
+    trajectory = RaggedTrajectory((2,), 'int32', length=len(samples))
+
+    for sample in samples:
+        trajectory.append(sample)
+
+    assert len(trajectory) == len(samples)
+
+    for sample, stored in zip(samples, trajectory):
+        np.testing.assert_array_equal(stored, sample)
+
+    np.testing.assert_array_equal(trajectory[-1], samples[-1])
+    np.testing.assert_array_equal(trajectory.data, np.concatenate(samples))
+
+    with pytest.raises(IndexError):
+        trajectory[len(samples)]
+
+
+def test_ragged_trajectory_clear():
+
+    trajectory = RaggedTrajectory((), 'int32')
+
+    trajectory.append([1, 2, 3])
+    trajectory.clear()
+    trajectory.append([4])
+
+    assert len(trajectory) == 1
+    np.testing.assert_array_equal(trajectory[0], [4])
+
+
+@pytest.mark.parametrize('prune_unbound_LEFs', [True, False])
+def test_run_trajectory_records_every_sample(translocator_factory, prune_unbound_LEFs):
+
+    translocator = translocator_factory(steps=20)
+    translocator.run_trajectory(prune_unbound_LEFs=prune_unbound_LEFs)
+
+    steps = translocator.params['steps']
+    number_of_LEFs = translocator.extrusion_engine.number
+
+    assert len(translocator.state_trajectory) == steps
+    assert len(translocator.lef_trajectory) == steps
+    assert len(translocator.ctcf_trajectory) == steps
+
+    assert np.asarray(translocator.state_trajectory).shape == (steps, number_of_LEFs)
+
+    # The last sample matches the final state of the engines
+    positions = translocator.extrusion_engine.positions
+
+    if prune_unbound_LEFs:
+        np.testing.assert_array_equal(translocator.lef_trajectory[-1], positions[(positions >= 0).all(axis=1)])
+    else:
+        np.testing.assert_array_equal(translocator.lef_trajectory[-1], positions)
+
+    np.testing.assert_array_equal(translocator.ctcf_trajectory[-1],
+                                  translocator.barrier_engine.get_bound_positions(as_array=True))
@@ -0,0 +1,77 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from discrete_time_extrusion.TrajectoryWriter import TrajectoryWriter, load_trajectory
+
+
+def write_samples(writer, samples, start=0):
+
+    for i in range(start, start+samples):
+        writer.append(np.full(4, i), np.full((i % 3, 2), i), np.arange(i % 2))
+
+
+def test_writer_round_trip(tmp_path):
+
+    writer = TrajectoryWriter(str(tmp_path), 4, chunk_size=3)
+
+    write_samples(writer, 7)
+    writer.close()
+
+    with open(os.path.join(tmp_path, 'manifest.json')) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    assert [chunk['samples'] for chunk in manifest['chunks']] == [3, 3, 1]
+
+    states, lefs, ctcfs = load_trajectory(str(tmp_path))
+
+    assert len(states) == len(lefs) == len(ctcfs) == 7
+
+    for i in range(7):
+        np.testing.assert_array_equal(states[i], np.full(4, i))
+        np.testing.assert_array_equal(lefs[i], np.full((i % 3, 2), i))
+        np.testing.assert_array_equal(ctcfs[i], np.arange(i % 2))
+
+
+def test_writer_resumes_on_chunk_boundaries(tmp_path):
+
+    writer = TrajectoryWriter(str(tmp_path), 4, chunk_size=3)
+
+    write_samples(writer, 6)
+    writer.close()
+
+    # Resuming after the first chunk drops the second one, which gets written again
+    writer = TrajectoryWriter(str(tmp_path), 4, chunk_size=3, samples=3)
+
+    write_samples(writer, 2, start=3)
+    writer.close()
+
+    states, _, _ = load_trajectory(str(tmp_path))
+
+    np.testing.assert_array_equal(np.asarray(states)[:, 0], np.arange(5))
+
+    with pytest.raises(RuntimeError):
+        TrajectoryWriter(str(tmp_path), 4, chunk_size=3, samples=4)
+
+
+@pytest.mark.parametrize('prune_unbound_LEFs', [True, False])
+def test_streamed_trajectory_matches_in_memory_run(translocator_factory, tmp_path, prune_unbound_LEFs):
+
+    in_memory = translocator_factory(steps=25)
+    in_memory.run_trajectory(prune_unbound_LEFs=prune_unbound_LEFs)
+
+    streamed = translocator_factory(steps=25)
+    streamed.run_trajectory(prune_unbound_LEFs=prune_unbound_LEFs, path=str(tmp_path), chunk_size=10)
+
+    assert len(os.listdir(tmp_path)) > 1
+
+    for name in ['state_trajectory', 'lef_trajectory', 'ctcf_trajectory']:
+        expected = getattr(in_memory, name)
+        stored = getattr(streamed, name)
+
+        assert len(stored) == len(expected)
+
+        for sample, expected_sample in zip(stored, expected):
+            np.testing.assert_array_equal(sample, expected_sample)